@@ -1,6 +1,6 @@
 import pandas as pd
 from pathlib import Path
-from scripts.config import RAW_PATH
+from scripts.utils_io import read_raw
 from scripts.logging_conf import get_logger
 log = get_logger(__name__)
 
@@ -9,7 +9,7 @@ REPORTS_DIR = Path(__file__).resolve().parents[1] / "reports"
 
 def bias_checks():
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    ph = pd.read_csv(RAW_PATH / "purchase_history.csv")
+    ph = read_raw("purchase_history")
     issues = []
 
     # Representation: min slice count threshold
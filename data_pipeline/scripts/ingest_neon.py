@@ -1,23 +1,111 @@
-from sqlalchemy import create_engine, text
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from sqlalchemy import create_engine, inspect, text
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from scripts.config import DB_URL, RAW_PATH
 import warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 
-def ingest_table(table_name):
-    engine = create_engine(DB_URL)
+CHUNK_SIZE = 100_000
+TABLES = ["inventory", "purchase_history", "cord_dataset"]
+
+# Arrow types for columns the first chunk leaves untyped (all NULL), by the
+# Python type SQLAlchemy reports; anything else falls back to string
+_ARROW_TYPES = {
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    datetime.datetime: pa.timestamp("ns"),
+    datetime.date: pa.date32(),
+}
+
+@lru_cache(maxsize=None)
+def _get_engine(db_url):
+    """One pooled engine per URL, shared by every table (and rerun) in this process."""
+    # stream_results: psycopg2 opens a server-side cursor instead of buffering the whole result
+    return create_engine(
+        db_url,
+        execution_options={"stream_results": True},
+        pool_pre_ping=True,
+        pool_size=4,
+        pool_recycle=1800,
+    )
+
+def _resolve_null_fields(schema, engine, table_name):
+    """Replace null-typed fields (all-NULL in the first chunk) with the column's declared type.
+
+    The Parquet schema is fixed by the first chunk, so a column that only gets
+    values in later chunks would otherwise be written as type null and fail.
+    """
+    null_fields = [i for i, field in enumerate(schema) if pa.types.is_null(field.type)]
+    if not null_fields:
+        return schema
+
+    declared = {}
+    for column in inspect(engine).get_columns(table_name):
+        try:
+            declared[column["name"]] = _ARROW_TYPES.get(column["type"].python_type, pa.string())
+        except NotImplementedError:
+            declared[column["name"]] = pa.string()
+
+    for i in null_fields:
+        field = schema.field(i)
+        schema = schema.set(i, field.with_type(declared.get(field.name, pa.string())))
+    return schema
+
+def ingest_table(table_name, write_csv=False, chunksize=CHUNK_SIZE):
+    """Stream a table into RAW_PATH/<table>.parquet (and .csv with write_csv).
+
+    Rows come through a server-side cursor in `chunksize` batches and each
+    batch is appended to the Parquet file, so memory stays bounded by one chunk.
+    """
+    engine = _get_engine(DB_URL)
     query = text(f"SELECT * FROM {table_name}")
-    # SQLAlchemy 1.4 compatibility: use connection context manager
-    with engine.begin() as connection:
-        result = connection.execute(query)
-        df = pd.DataFrame(result.fetchall(), columns=result.keys())
     RAW_PATH.mkdir(parents=True, exist_ok=True)
-    out_path = RAW_PATH / f"{table_name}.csv"
-    df.to_csv(out_path, index=False)
-    print(f"[INGEST] {table_name} → {out_path} ({len(df)} rows)")
-    return df
+    out_path = RAW_PATH / f"{table_name}.parquet"
+    csv_path = RAW_PATH / f"{table_name}.csv"
+
+    writer = None
+    rows = 0
+    try:
+        # SQLAlchemy 1.4 compatibility: use connection context manager
+        with engine.begin() as connection:
+            for chunk in pd.read_sql(query, connection, chunksize=chunksize):
+                if writer is None:
+                    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                    schema = _resolve_null_fields(schema, engine, table_name)
+                    writer = pq.ParquetWriter(out_path, schema, compression="snappy")
+                table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+                if write_csv:
+                    chunk.to_csv(csv_path, mode="w" if rows == 0 else "a", header=rows == 0, index=False)
+                rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        # Empty result: still leave a file with the table's columns for downstream steps
+        with engine.connect() as connection:
+            empty = pd.read_sql(text(f"SELECT * FROM {table_name} LIMIT 0"), connection)
+        empty.to_parquet(out_path, index=False)
+        if write_csv:
+            empty.to_csv(csv_path, index=False)
+
+    print(f"[INGEST] {table_name} → {out_path} ({rows} rows)")
+    return rows
 
 if __name__ == "__main__":
-    ingest_table("inventory")
-    ingest_table("purchase_history")
-    ingest_table("cord_dataset")
+    parser = argparse.ArgumentParser(description="Ingest Neon tables into data/raw")
+    parser.add_argument("--csv", action="store_true", help="Also write the legacy CSV export")
+    args = parser.parse_args()
+
+    # Independent, network-bound queries: run them concurrently
+    with ThreadPoolExecutor(max_workers=len(TABLES)) as executor:
+        list(executor.map(partial(ingest_table, write_csv=args.csv), TABLES))
@@ -1,15 +1,13 @@
-import pandas as pd
-from scripts.utils_pint import to_canonical
-from scripts.config import RAW_PATH, PROCESSED_PATH
+from scripts.utils_pint import to_canonical_frame
+from scripts.config import PROCESSED_PATH
+from scripts.utils_io import read_raw
 
 def transform_inventory():
     PROCESSED_PATH.mkdir(parents=True, exist_ok=True)
-    df = pd.read_csv(RAW_PATH / "inventory.csv")
+    df = read_raw("inventory")
 
     # Normalize units
-    df[["qty_canonical", "canonical_unit"]] = df.apply(
-        lambda row: pd.Series(to_canonical(row["quantity"], row["unit"])), axis=1
-    )
+    df["qty_canonical"], df["canonical_unit"] = to_canonical_frame(df["quantity"], df["unit"])
 
     # Compute stock value
     df["stock_value"] = df["qty_canonical"] * df["unit_cost"]
@@ -17,14 +15,14 @@ def transform_inventory():
     # Add flag for low stock
     df["is_low_stock"] = df["qty_canonical"] < df["reorder_threshold"]
 
-    df.to_csv(PROCESSED_PATH / "inventory_cleaned.csv", index=False)
-    print("[TRANSFORM] inventory_cleaned.csv saved.")
+    df.to_parquet(PROCESSED_PATH / "inventory_cleaned.parquet", compression="snappy", index=False)
+    print("[TRANSFORM] inventory_cleaned.parquet saved.")
 
 def transform_purchases():
-    df = pd.read_csv(RAW_PATH / "purchase_history.csv")
+    df = read_raw("purchase_history")
     df["unit_price"] = df["price_total"] / df["quantity_purchased"].replace(0, 1)
-    df.to_csv(PROCESSED_PATH / "purchase_history_cleaned.csv", index=False)
-    print("[TRANSFORM] purchase_history_cleaned.csv saved.")
+    df.to_parquet(PROCESSED_PATH / "purchase_history_cleaned.parquet", compression="snappy", index=False)
+    print("[TRANSFORM] purchase_history_cleaned.parquet saved.")
 
 if __name__ == "__main__":
     transform_inventory()
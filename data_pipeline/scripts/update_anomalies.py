@@ -7,11 +7,12 @@ log = get_logger(__name__)
 
 def detect_anomalies():
     ALERT_PATH.mkdir(parents=True, exist_ok=True)
-    inv_path = PROCESSED_PATH / "inventory_cleaned.csv"
+    inv_path = PROCESSED_PATH / "inventory_cleaned.parquet"
     if not inv_path.exists():
         raise FileNotFoundError("Run transform_data.py first.")
 
-    df = pd.read_csv(inv_path, parse_dates=["expiry_date"], dayfirst=False)
+    df = pd.read_parquet(inv_path)
+    df["expiry_date"] = pd.to_datetime(df["expiry_date"])
     alerts = []
 
     # Low stock
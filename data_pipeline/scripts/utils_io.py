@@ -0,0 +1,16 @@
+import pandas as pd
+from scripts.config import RAW_PATH
+
+def raw_file(table_name):
+    """Path of an ingested table: the Parquet file when present, else the legacy CSV."""
+    parquet_path = RAW_PATH / f"{table_name}.parquet"
+    if parquet_path.exists():
+        return parquet_path
+    return RAW_PATH / f"{table_name}.csv"
+
+def read_raw(table_name):
+    """Load an ingested table written by ingest_neon (Parquet or CSV)."""
+    path = raw_file(table_name)
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -1,8 +1,19 @@
+import numpy as np
+import pandas as pd
 from pint import UnitRegistry
 
 ureg = UnitRegistry()
 ureg.define("pcs = 1 count")
 
+# unit -> (factor to canonical unit, canonical unit), resolved through pint once
+UNIT_TO_CANONICAL = {
+    "g": (ureg("g").to("g").magnitude, "g"),
+    "kg": (ureg("kg").to("g").magnitude, "g"),
+    "ml": (ureg("ml").to("ml").magnitude, "ml"),
+    "L": (ureg("L").to("ml").magnitude, "ml"),
+    "pcs": (1.0, "pcs"),
+}
+
 def to_canonical(qty, unit):
     """Convert quantity and unit to a canonical unit (grams, milliliters, or pieces)."""
     try:
@@ -14,4 +25,20 @@ def to_canonical(qty, unit):
             return qty, "pcs"
     except Exception:
         return qty, unit
-    return qty, unit
\ No newline at end of file
+    return qty, unit
+
+def to_canonical_frame(quantity, unit):
+    """Vectorized to_canonical over whole columns.
+
+    Returns (qty_canonical, canonical_unit) Series; unknown units keep their
+    quantity and unit unchanged, as in to_canonical.
+    """
+    factors = unit.map({u: f for u, (f, _) in UNIT_TO_CANONICAL.items()})
+    canonical_unit = unit.map({u: c for u, (_, c) in UNIT_TO_CANONICAL.items()})
+    known = factors.notna().to_numpy()
+
+    qty = quantity.to_numpy()
+    qty_canonical = pd.Series(
+        np.where(known, qty * factors.fillna(1.0).to_numpy(), qty), index=quantity.index
+    )
+    return qty_canonical, canonical_unit.where(known, unit)
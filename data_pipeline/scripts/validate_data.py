@@ -1,49 +1,58 @@
 import os
 import csv
 from datetime import datetime
-from scripts.config import RAW_PATH
+from scripts.utils_io import raw_file
 from great_expectations.data_context import FileDataContext
 from great_expectations.checkpoint import SimpleCheckpoint
 
-def save_summary(dataset, suite, success):
-    """Append validation results to a CSV summary log."""
-    os.makedirs("reports", exist_ok=True)
-    with open("reports/validation_summary.csv", "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([datetime.now(), dataset, suite, "PASS" if success else "FAIL"])
+SUMMARY_PATH = "reports/validation_summary.csv"
+
+def save_summary(writer, dataset, suite, success):
+    """Append a validation result to the CSV summary log through an open csv.writer."""
+    writer.writerow([datetime.now(), dataset, suite, "PASS" if success else "FAIL"])
 
 def run_validation():
     context = FileDataContext(context_root_dir="great_expectations")
 
     datasets = [
-        ("inventory.csv", "inventory_suite"),
-        ("purchase_history.csv", "purchase_history_suite"),
+        ("inventory", "inventory_suite"),
+        ("purchase_history", "purchase_history_suite"),
     ]
 
-    for filename, suite_name in datasets:
-        checkpoint = SimpleCheckpoint(
-            name=f"{suite_name}_checkpoint",
-            data_context=context,
-            validations=[
-                {
-                    "batch_request": {
-                        "runtime_parameters": {"path": str(RAW_PATH / filename)},
-                        "batch_identifiers": {"default_identifier_name": "default_id"},
-                        "datasource_name": "data_dir",
-                        "data_connector_name": "default_runtime_data_connector_name",
-                        "data_asset_name": filename,
-                    },
-                    "expectation_suite_name": suite_name,
-                }
-            ],
-        )
-
-        print(f"[VALIDATION] Running suite '{suite_name}' on {filename} ...")
-        result = checkpoint.run()
-        print(f"[VALIDATION] {filename} → {'PASS' if result['success'] else 'FAIL'}")
-
-        # Log the result
-        save_summary(filename, suite_name, result["success"])
+    os.makedirs(os.path.dirname(SUMMARY_PATH), exist_ok=True)
+    # One buffered append handle for the whole run instead of an open/close per suite
+    with open(SUMMARY_PATH, "a", newline="", buffering=8192) as summary_file:
+        summary_writer = csv.writer(summary_file)
+        for table_name, suite_name in datasets:
+            path = raw_file(table_name)
+            filename = path.name
+            checkpoint = SimpleCheckpoint(
+                name=f"{suite_name}_checkpoint",
+                data_context=context,
+                validations=[
+                    {
+                        "batch_request": {
+                            "runtime_parameters": {"path": str(path)},
+                            "batch_identifiers": {"default_identifier_name": "default_id"},
+                            "datasource_name": "data_dir",
+                            "data_connector_name": "default_runtime_data_connector_name",
+                            "data_asset_name": filename,
+                            # Raw snapshots are Parquet; CSV only for legacy exports
+                            "batch_spec_passthrough": {
+                                "reader_method": "read_parquet" if path.suffix == ".parquet" else "read_csv"
+                            },
+                        },
+                        "expectation_suite_name": suite_name,
+                    }
+                ],
+            )
+
+            print(f"[VALIDATION] Running suite '{suite_name}' on {filename} ...")
+            result = checkpoint.run()
+            print(f"[VALIDATION] {filename} → {'PASS' if result['success'] else 'FAIL'}")
+
+            # Log the result
+            save_summary(summary_writer, filename, suite_name, result["success"])
 
 if __name__ == "__main__":
     run_validation()
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+pytest.importorskip("pyarrow")
+
+from scripts import ingest_neon, utils_io
+
+def test_ingest_table_streams_chunks_to_parquet(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'neon.db'}"
+    rows = pd.DataFrame({"item": [f"item{i}" for i in range(25)], "quantity": range(25)})
+    rows.to_sql("inventory", create_engine(db_url), index=False)
+
+    raw_path = tmp_path / "raw"
+    monkeypatch.setattr(ingest_neon, "DB_URL", db_url)
+    monkeypatch.setattr(ingest_neon, "RAW_PATH", raw_path)
+    monkeypatch.setattr(utils_io, "RAW_PATH", raw_path)
+
+    assert ingest_neon.ingest_table("inventory", write_csv=True, chunksize=10) == 25
+    pd.testing.assert_frame_equal(pd.read_parquet(raw_path / "inventory.parquet"), rows)
+    pd.testing.assert_frame_equal(pd.read_csv(raw_path / "inventory.csv"), rows)
+    assert utils_io.raw_file("inventory").suffix == ".parquet"
+
+def test_ingest_empty_table_keeps_columns(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'neon.db'}"
+    with create_engine(db_url).begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE inventory (item TEXT, quantity INTEGER)")
+
+    raw_path = tmp_path / "raw"
+    monkeypatch.setattr(ingest_neon, "DB_URL", db_url)
+    monkeypatch.setattr(ingest_neon, "RAW_PATH", raw_path)
+
+    assert ingest_neon.ingest_table("inventory", write_csv=True) == 0
+    assert list(pd.read_parquet(raw_path / "inventory.parquet").columns) == ["item", "quantity"]
+    assert list(pd.read_csv(raw_path / "inventory.csv").columns) == ["item", "quantity"]
+
+def test_ingest_all_null_first_chunk_uses_declared_type(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'neon.db'}"
+    engine = create_engine(db_url)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE inventory (item TEXT, quantity INTEGER, note TEXT)")
+    rows = pd.DataFrame({
+        "item": [f"item{i}" for i in range(25)],
+        "quantity": [None] * 10 + list(range(15)),
+        "note": [None] * 20 + ["fresh"] * 5,
+    })
+    rows.to_sql("inventory", engine, index=False, if_exists="append")
+
+    raw_path = tmp_path / "raw"
+    monkeypatch.setattr(ingest_neon, "DB_URL", db_url)
+    monkeypatch.setattr(ingest_neon, "RAW_PATH", raw_path)
+
+    assert ingest_neon.ingest_table("inventory", chunksize=10) == 25
+    result = pd.read_parquet(raw_path / "inventory.parquet")
+    assert result["quantity"].tolist()[10:] == list(range(15))
+    assert result["quantity"].isna().sum() == 10
+    assert result["note"].isna().sum() == 20
+    assert result["note"].tolist()[20:] == ["fresh"] * 5
@@ -1,4 +1,5 @@
-from scripts.utils_pint import to_canonical
+import pandas as pd
+from scripts.utils_pint import to_canonical, to_canonical_frame
 
 def test_to_canonical_mass():
     val, unit = to_canonical(1, "kg")
@@ -10,4 +11,11 @@ def test_to_canonical_volume():
 
 def test_to_canonical_pcs():
     val, unit = to_canonical(5, "pcs")
-    assert unit == "pcs" and val == 5
\ No newline at end of file
+    assert unit == "pcs" and val == 5
+
+def test_to_canonical_frame_matches_scalar():
+    df = pd.DataFrame({"quantity": [0.5, 2, 3, 250, 7], "unit": ["kg", "L", "pcs", "g", "box"]})
+    qty, unit = to_canonical_frame(df["quantity"], df["unit"])
+    for i, row in df.iterrows():
+        expected_qty, expected_unit = to_canonical(row["quantity"], row["unit"])
+        assert unit[i] == expected_unit and abs(qty[i] - expected_qty) < 1e-6
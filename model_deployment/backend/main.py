@@ -25,6 +25,21 @@ from observability import (  # noqa: E402
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+
+def _create_missing_indexes(bind):
+    """Create model indexes absent from existing tables (CREATE INDEX only if missing).
+
+    create_all skips tables that already exist, so an index added to a model
+    later (e.g. ix_recipe_preferences_user_answered) would never reach a
+    deployed database without this.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+
+_create_missing_indexes(engine)
+
 # Configure structured logging early
 configure_logging(service_name="pantrypilot-backend")
 
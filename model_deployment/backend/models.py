@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Float, DateTime, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -83,3 +83,9 @@ class RecipePreference(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="preferences")
+
+    # Covers the per-user "answered preferences" count (user_id + skipped/chosen_variant
+    # filters) without touching the table; the leading column also serves plain user_id lookups
+    __table_args__ = (
+        Index("ix_recipe_preferences_user_answered", "user_id", "skipped", "chosen_variant"),
+    )
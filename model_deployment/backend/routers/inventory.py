@@ -180,71 +180,79 @@ def update_inventory_item(
         "category": db_item.category,
     }}
 
+# External OCR API URL
+OCR_API_URL = "https://ocr-api-739616330518.us-east1.run.app/extract"
+
+class OCRAPIError(Exception):
+    """The OCR API answered with a non-200 status."""
+
+def ocr_extract(content: bytes, content_type: str):
+    """Send a receipt image to the OCR API and return its decoded JSON payload."""
+    import requests
+    files = {"file": ("receipt.jpg", content, content_type)}
+    response = requests.post(OCR_API_URL, files=files)
+    if response.status_code != 200:
+        raise OCRAPIError(response.text)
+    return response.json()
+
 @router.post("/upload")
 async def upload_receipt(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
     # OCR Logic using external API
     try:
         content = await file.read()
         
-        # External OCR API URL
-        url = "https://ocr-api-739616330518.us-east1.run.app/extract"
-        files = {"file": ("receipt.jpg", content, file.content_type)}
+        try:
+            items_data = ocr_extract(content, file.content_type)
+        except OCRAPIError as e:
+            return {"status": "error", "message": f"OCR API failed: {e}"}
         
-        import requests
-        response = requests.post(url, files=files)
+        # Handle different response formats
+        if isinstance(items_data, str):
+            # If response is a string, try to parse as JSON
+            try:
+                import json as json_lib
+                items_data = json_lib.loads(items_data)
+            except:
+                return {"status": "error", "message": "OCR returned invalid format"}
         
-        if response.status_code == 200:
-            items_data = response.json()
-            
-            # Handle different response formats
-            if isinstance(items_data, str):
-                # If response is a string, try to parse as JSON
-                try:
-                    import json as json_lib
-                    items_data = json_lib.loads(items_data)
-                except:
-                    return {"status": "error", "message": "OCR returned invalid format"}
-            
-            # Ensure items_data is a list
-            if isinstance(items_data, dict):
-                # If it's a dict, try to extract items array
-                items = items_data.get('items', items_data.get('detected_items', [items_data]))
-            elif isinstance(items_data, list):
-                items = items_data
+        # Ensure items_data is a list
+        if isinstance(items_data, dict):
+            # If it's a dict, try to extract items array
+            items = items_data.get('items', items_data.get('detected_items', [items_data]))
+        elif isinstance(items_data, list):
+            items = items_data
+        else:
+            return {"status": "error", "message": f"Unexpected OCR response format: {type(items_data)}"}
+        
+        # The API returns [{"item": "name", "quantity": "qty"}] or similar
+        # We need to map it to our schema: item_name, quantity, unit, category
+        detected_items = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+                
+            # Simple parsing logic
+            qty_str = item.get("quantity", item.get("qty", "1 pcs"))
+            # Try to extract number and unit
+            import re
+            match = re.match(r"([\d\.]+)\s*(.*)", str(qty_str))
+            if match:
+                qty = float(match.group(1))
+                unit = match.group(2).strip() or "pcs"
             else:
-                return {"status": "error", "message": f"Unexpected OCR response format: {type(items_data)}"}
+                qty = 1.0
+                unit = "pcs"
             
-            # The API returns [{"item": "name", "quantity": "qty"}] or similar
-            # We need to map it to our schema: item_name, quantity, unit, category
-            detected_items = []
-            for item in items:
-                if not isinstance(item, dict):
-                    continue
-                    
-                # Simple parsing logic
-                qty_str = item.get("quantity", item.get("qty", "1 pcs"))
-                # Try to extract number and unit
-                import re
-                match = re.match(r"([\d\.]+)\s*(.*)", str(qty_str))
-                if match:
-                    qty = float(match.group(1))
-                    unit = match.group(2).strip() or "pcs"
-                else:
-                    qty = 1.0
-                    unit = "pcs"
-                
-                item_name = item.get("item", item.get("name", item.get("item_name", "Unknown Item")))
-                
-                detected_items.append({
-                    "item_name": item_name,
-                    "quantity": qty,
-                    "unit": unit if unit else "pcs",
-                    "category": detect_category(item_name)  # Smart category detection
-                })
+            item_name = item.get("item", item.get("name", item.get("item_name", "Unknown Item")))
             
-            return {"status": "success", "detected_items": detected_items}
-        else:
-            return {"status": "error", "message": f"OCR API failed: {response.text}"}
+            detected_items.append({
+                "item_name": item_name,
+                "quantity": qty,
+                "unit": unit if unit else "pcs",
+                "category": detect_category(item_name)  # Smart category detection
+            })
+        
+        return {"status": "success", "detected_items": detected_items}
         
     except Exception as e:
         import traceback
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
@@ -11,7 +11,7 @@ import base64
 from database import get_db
 from models import RecipeHistory, User, InventoryItem, UserProfile, RecipePreference
 from routers.inventory import get_current_user
-from utils.smart_inventory import find_best_inventory_match, convert_unit, parse_ingredient, normalize_unit
+from utils.smart_inventory import find_best_inventory_matches, convert_unit, parse_ingredient, normalize_unit
 
 class GenerateRecipeRequest(BaseModel):
     user_request: str
@@ -264,6 +264,7 @@ async def generate_recipe_endpoint(
 def choose_preference(
     preference_id: int,
     body: PreferenceChoiceRequest,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -308,7 +309,7 @@ def choose_preference(
         RecipePreference.chosen_variant != None
     ).count()
     
-    # Send notification if threshold reached (50 preferences)
+    # Send notification if threshold reached (50 preferences), after the response goes out
     from services.notification_service import check_and_notify_threshold
     import os
     base_url = os.getenv("BACKEND_URL", "http://localhost:8000")
@@ -316,7 +317,8 @@ def choose_preference(
         user_id=current_user.id,
         username=current_user.username,
         preference_count=total_preferences,
-        base_url=base_url
+        base_url=base_url,
+        background=background_tasks
     )
 
     return {
@@ -438,6 +440,7 @@ def mark_recipe_cooked(recipe_id: int, db: Session = Depends(get_db), current_us
             user_inventory = db.query(InventoryItem).filter(InventoryItem.user_id == current_user.id).all()
             print(f"🔍 Checking inventory for User {current_user.id}. Found {len(user_inventory)} items.")
 
+            parsed = []
             for ing in recipe_data["main_ingredients"]:
                 ingredient_text = ing if isinstance(ing, str) else ing.get("name", "")
                 if not ingredient_text:
@@ -445,8 +448,12 @@ def mark_recipe_cooked(recipe_id: int, db: Session = Depends(get_db), current_us
 
                 req_qty, req_unit, req_name = parse_ingredient(ingredient_text)
                 print(f"  Parsed Ingredient: {req_qty} {req_unit} '{req_name}'")
+                parsed.append((req_qty, req_unit, req_name))
 
-                match_item, score = find_best_inventory_match(user_inventory, req_name)
+            # Score every ingredient against the whole inventory in one batch
+            matches = find_best_inventory_matches(user_inventory, [req_name for _, _, req_name in parsed])
+
+            for (req_qty, req_unit, req_name), (match_item, score) in zip(parsed, matches):
                 if not match_item:
                     print(f"  ⚠️ No inventory match for '{req_name}'")
                     continue
@@ -30,29 +30,30 @@ def get_pending_retraining_requests(
     
     from sqlalchemy import func
     
+    # Count and user details in one query (no per-user lookup)
     results = db.query(
-        RecipePreference.user_id,
+        User.id,
+        User.username,
+        User.email,
         func.count(RecipePreference.id).label('count')
+    ).join(
+        RecipePreference, RecipePreference.user_id == User.id
     ).filter(
         RecipePreference.skipped == False,
         RecipePreference.chosen_variant.isnot(None)
     ).group_by(
-        RecipePreference.user_id
+        User.id, User.username, User.email
     ).having(
         func.count(RecipePreference.id) >= MIN_PREFERENCES_FOR_TRAINING
     ).all()
     
-    pending_users = []
-    for user_id, count in results:
-        user = db.query(User).filter(User.id == user_id).first()
-        if user:
-            pending_users.append({
-                "user_id": user_id,
-                "username": user.username,
-                "email": user.email,
-                "preference_count": count,
-                "status": "pending"
-            })
+    pending_users = [{
+        "user_id": user_id,
+        "username": username,
+        "email": email,
+        "preference_count": count,
+        "status": "pending"
+    } for user_id, username, email, count in results]
     
     return {
         "threshold": MIN_PREFERENCES_FOR_TRAINING,
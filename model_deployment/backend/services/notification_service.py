@@ -5,12 +5,18 @@ Sends Slack alerts when users reach preference thresholds.
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 from typing import Optional
+from fastapi import BackgroundTasks
 
 # Configuration
 PREFERENCE_THRESHOLD = 50
 
+# Shared session: keeps the TLS connection to the webhook host alive between alerts
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 
 def send_slack_alert(
     user_id: int,
@@ -88,7 +94,7 @@ def send_slack_alert(
     }
     
     try:
-        response = requests.post(webhook_url, json=message, timeout=10)
+        response = _session.post(webhook_url, json=message, timeout=10)
         
         if response.status_code == 200:
             print(f"[SLACK] Alert sent for user {username} (ID: {user_id})")
@@ -106,13 +112,17 @@ def check_and_notify_threshold(
     user_id: int,
     username: str,
     preference_count: int,
-    base_url: str = "http://localhost:8000"
+    base_url: str = "http://localhost:8000",
+    background: Optional[BackgroundTasks] = None
 ) -> Optional[bool]:
     """
     Check if user has reached the threshold and send Slack notification.
     
+    With background set, the alert is queued to run after the response is sent
+    instead of blocking the request on the webhook call.
+    
     Returns:
-        True if notification sent, False if failed, None if threshold not reached
+        True if notification sent (or queued), False if failed, None if threshold not reached
     """
     if preference_count != PREFERENCE_THRESHOLD:
         return None
@@ -121,6 +131,16 @@ def check_and_notify_threshold(
     
     approval_url = f"{base_url}/training/approve/{user_id}"
     
+    if background is not None:
+        background.add_task(
+            send_slack_alert,
+            user_id=user_id,
+            username=username,
+            preference_count=preference_count,
+            approval_url=approval_url
+        )
+        return True
+    
     return send_slack_alert(
         user_id=user_id,
         username=username,
@@ -1,5 +1,7 @@
 import re
-from difflib import SequenceMatcher
+from functools import lru_cache
+import numpy as np
+from rapidfuzz import fuzz, process
 
 # Standard Unit Mappings
 UNIT_MAPPINGS = {
@@ -45,37 +47,55 @@ VOLUME_TO_ML = {
     "fl oz": 29.5735
 }
 
+# (from_unit, to_unit) -> multiplier, for every pair within the same dimension
+CONVERSION_FACTORS = {
+    (from_u, to_u): from_factor / to_factor
+    for table in (WEIGHT_TO_G, VOLUME_TO_ML)
+    for from_u, from_factor in table.items()
+    for to_u, to_factor in table.items()
+}
+
+# Patterns used by parse_ingredient / norm_text, compiled once at import
+_PREFIX_RE = re.compile(r"^\s*([\d\.\/]+)\s*([a-zA-Z]+)?\s+(.*)")
+_PAREN_RE = re.compile(r"^(?P<name>[^()]+)\(\s*(?P<qty>[\d\.\/]+)\s*(?P<unit>[a-zA-Z]+)")
+_INLINE_RE = re.compile(r"([\d\.\/]+)\s*([a-zA-Z]+)")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+
 def normalize_unit(unit_str):
     """Normalize unit string to standard key (e.g. 'pounds' -> 'lb')"""
     if not unit_str:
         return None
-    return UNIT_MAPPINGS.get(unit_str.lower().strip(), unit_str.lower().strip())
+    key = unit_str.lower().strip()
+    return UNIT_MAPPINGS.get(key, key)
+
+def _parse_qty(qs):
+    try:
+        if "/" in qs:
+            num, den = map(float, qs.split("/"))
+            return num / den
+        return float(qs)
+    except Exception:
+        return 1.0
 
 def parse_ingredient(ingredient_text):
     """
     Parse ingredient string into (quantity, unit, name)
     Handles prefixes, parentheticals, and inline numbers.
     """
-    text = str(ingredient_text).strip()
+    return _parse_ingredient_text(str(ingredient_text).strip())
 
+@lru_cache(maxsize=4096)
+def _parse_ingredient_text(text):
+    # Memoized: the same ingredient lines repeat across recipes and requests
     qty = 1.0
     unit = "pcs"
     name_str = text
 
-    def parse_qty(qs):
-        try:
-            if "/" in qs:
-                num, den = map(float, qs.split("/"))
-                return num / den
-            return float(qs)
-        except Exception:
-            return 1.0
-
     # Leading qty/unit: "2 lbs chicken breast"
-    prefix = re.search(r"^\s*([\d\.\/]+)\s*([a-zA-Z]+)?\s+(.*)", text)
+    prefix = _PREFIX_RE.search(text)
     if prefix:
         qty_str, unit_str, name_str = prefix.groups()
-        qty = parse_qty(qty_str)
+        qty = _parse_qty(qty_str)
         unit = normalize_unit(unit_str) or unit
         if unit_str and normalize_unit(unit_str) is None:
             name_str = f"{unit_str} {name_str}"
@@ -83,17 +103,17 @@ def parse_ingredient(ingredient_text):
         return qty, unit, name_str.strip()
 
     # Parenthetical qty/unit after name: "Chicken Breast (4 oz, sliced)"
-    paren = re.search(r"^(?P<name>[^()]+)\(\s*(?P<qty>[\d\.\/]+)\s*(?P<unit>[a-zA-Z]+)", text)
+    paren = _PAREN_RE.search(text)
     if paren:
         name_str = paren.group("name").strip()
-        qty = parse_qty(paren.group("qty"))
+        qty = _parse_qty(paren.group("qty"))
         unit = normalize_unit(paren.group("unit")) or unit
         return qty, unit, name_str.strip()
 
     # Inline number/unit anywhere: "Chicken Breast 4 oz cut"
-    inline = re.search(r"([\d\.\/]+)\s*([a-zA-Z]+)", text)
+    inline = _INLINE_RE.search(text)
     if inline:
-        qty = parse_qty(inline.group(1))
+        qty = _parse_qty(inline.group(1))
         unit = normalize_unit(inline.group(2)) or unit
 
     return qty, unit, name_str.strip()
@@ -111,21 +131,27 @@ def convert_unit(qty, from_unit, to_unit):
         
     if from_u == to_u:
         return qty
-        
-    # Weight Conversion
-    if from_u in WEIGHT_TO_G and to_u in WEIGHT_TO_G:
-        g_val = qty * WEIGHT_TO_G[from_u]
-        return g_val / WEIGHT_TO_G[to_u]
-        
-    # Volume Conversion
-    if from_u in VOLUME_TO_ML and to_u in VOLUME_TO_ML:
-        ml_val = qty * VOLUME_TO_ML[from_u]
-        return ml_val / VOLUME_TO_ML[to_u]
-        
-    return None
+
+    # Weight/volume conversion; a missing pair means different dimensions
+    factor = CONVERSION_FACTORS.get((from_u, to_u))
+    if factor is None:
+        return None
+    return qty * factor
 
 def norm_text(s: str):
-    return re.sub(r"[^a-z0-9\s]", " ", str(s).lower()).strip()
+    return _norm_str(str(s))
+
+
+@lru_cache(maxsize=8192)
+def _norm_str(s: str):
+    # Memoized like parse_ingredient: inventory names and ingredients are re-normalized on every request
+    return _NON_ALNUM_RE.sub(" ", s.lower()).strip()
+
+
+@lru_cache(maxsize=8192)
+def _name_tokens(norm_name: str) -> frozenset:
+    # Tokenized once per normalized name, like norm_text's cache
+    return frozenset(norm_name.split())
 
 
 def similarity(a: str, b: str) -> float:
@@ -133,7 +159,8 @@ def similarity(a: str, b: str) -> float:
     b_norm = norm_text(b)
     if not a_norm or not b_norm:
         return 0.0
-    return SequenceMatcher(None, a_norm, b_norm).ratio()
+    # Normalized Indel similarity (2*LCS / total length), computed in C++ by RapidFuzz
+    return fuzz.ratio(a_norm, b_norm) / 100.0
 
 
 def is_match(inventory_name, ingredient_name, token_threshold: float = 0.45) -> bool:
@@ -146,25 +173,85 @@ def is_match(inventory_name, ingredient_name, token_threshold: float = 0.45) ->
         return False
 
     # Token overlap
-    a_tokens = set(a_norm.split())
-    b_tokens = set(b_norm.split())
-    overlap = a_tokens.intersection(b_tokens)
-    if overlap:
+    if not _name_tokens(a_norm).isdisjoint(_name_tokens(b_norm)):
         return True
 
-    # Similarity score
-    return similarity(a_norm, b_norm) >= token_threshold
+    # Similarity score (inputs are already normalized, so skip similarity()'s norm_text pass)
+    return fuzz.ratio(a_norm, b_norm) / 100.0 >= token_threshold
+
+
+class InventoryIndex:
+    """
+    Inventory items with their names normalized once.
+    Build one per request and reuse it for every ingredient lookup.
+    """
+
+    def __init__(self, inventory_items):
+        self.items = list(inventory_items)
+        self.names = [norm_text(item.item_name) for item in self.items]
+        # Normalized name -> first position, for the exact-match fast path
+        self.positions = {}
+        for position, name in enumerate(self.names):
+            self.positions.setdefault(name, position)
+
+    def __len__(self):
+        return len(self.items)
 
 
 def find_best_inventory_match(inventory_items, ingredient_name, min_score: float = 0.45):
-    best = None
-    best_score = 0.0
+    """
+    Best fuzzy match for an ingredient, as (item, score) or (None, 0.0).
+    inventory_items may be a list of items or a prebuilt InventoryIndex.
+    """
     ing_norm = norm_text(ingredient_name)
-    for item in inventory_items:
-        score = similarity(item.item_name, ing_norm)
-        if score > best_score:
-            best_score = score
-            best = item
-    if best_score >= min_score:
-        return best, best_score
+    if not ing_norm or not inventory_items:
+        return None, 0.0
+    index = inventory_items if isinstance(inventory_items, InventoryIndex) else InventoryIndex(inventory_items)
+
+    # Exact name (after normalization) can't be beaten; skip the fuzzy scan
+    position = index.positions.get(ing_norm)
+    if position is not None:
+        return index.items[position], 1.0
+
+    # One native scan over all names instead of a Python-level similarity() per item.
+    # With score_cutoff RapidFuzz skips names whose length difference alone rules them
+    # out and raises the cutoff to the best score found so far.
+    result = process.extractOne(
+        ing_norm,
+        index.names,
+        scorer=fuzz.ratio,
+        score_cutoff=min_score * 100,
+    )
+    if result is None:
+        return None, 0.0
+    _, score, position = result
+    best_score = score / 100.0
+    if best_score > 0.0:
+        return index.items[position], best_score
     return None, 0.0
+
+
+def find_best_inventory_matches(inventory_items, ingredient_names, min_score: float = 0.45):
+    """
+    find_best_inventory_match for many ingredients at once: one (item, score) or (None, 0.0) per name.
+    Scores every ingredient against every item in a single RapidFuzz cdist call.
+    """
+    if not ingredient_names:
+        return []
+    index = inventory_items if isinstance(inventory_items, InventoryIndex) else InventoryIndex(inventory_items)
+    if not index:
+        return [(None, 0.0)] * len(ingredient_names)
+
+    scores = process.cdist(
+        [norm_text(name) for name in ingredient_names],
+        index.names,
+        scorer=fuzz.ratio,
+        dtype=np.float64,  # same scores as the single-ingredient path
+        score_cutoff=min_score * 100,
+    )
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(best)), best] / 100.0
+    return [
+        (index.items[position], float(score)) if score > 0.0 else (None, 0.0)
+        for position, score in zip(best, best_scores)
+    ]
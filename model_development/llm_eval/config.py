@@ -15,7 +15,7 @@ RECIPES_TEST_PATH = RECIPES_DIR / "recipes_test.jsonl"
 RECIPES_VAL_CHAT_PATH = RECIPES_DIR / "recipes_val_chat.jsonl"
 
 # From your existing transform scripts
-INVENTORY_PROCESSED_PATH = DATA_PIPELINE_ROOT / "data" / "processed" / "inventory_cleaned.csv"
+INVENTORY_PROCESSED_PATH = DATA_PIPELINE_ROOT / "data" / "processed" / "inventory_cleaned.parquet"
 
 # Models
 BASE_MODEL_NAME = "meta-llama/Llama-3.2-3B-Instruct"
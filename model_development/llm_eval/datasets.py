@@ -87,4 +87,4 @@ def load_inventory_processed(path: Path = INVENTORY_PROCESSED_PATH) -> pd.DataFr
     Later we can sample real user inventories from this to build
     evaluation prompts that mirror the actual product.
     """
-    return pd.read_csv(path)
\ No newline at end of file
+    return pd.read_parquet(path)
\ No newline at end of file
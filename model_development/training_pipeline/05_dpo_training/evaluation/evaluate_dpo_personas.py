@@ -11,6 +11,7 @@ Usage:
 """
 
 import argparse
+import asyncio
 import json
 import yaml
 from pathlib import Path
@@ -22,7 +23,7 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent))
 
-from vertexai_evaluator import VertexAIEvaluator, MultiModelEvaluator
+from vertexai_evaluator import DEFAULT_CACHE_PATH, VertexAIEvaluator, MultiModelEvaluator
 from model_loader import SequentialModelLoader
 from report_generator import ReportGenerator
 
@@ -39,7 +40,8 @@ class DPOEvaluationRunner:
         dpo_models_dir: str,
         personas_file: str,
         test_cases_file: str,
-        output_dir: str = "evaluation/reports"
+        output_dir: str = "evaluation/reports",
+        use_response_cache: bool = False
     ):
         """
         Initialize evaluation runner
@@ -51,8 +53,10 @@ class DPOEvaluationRunner:
             personas_file: Path to personas.yaml
             test_cases_file: Path to test_cases.yaml
             output_dir: Output directory for results
+            use_response_cache: Reuse cached Vertex AI responses for identical prompts
         """
         self.project_id = project_id
+        self.response_cache_path = DEFAULT_CACHE_PATH if use_response_cache else None
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -89,7 +93,8 @@ class DPOEvaluationRunner:
         evaluator = VertexAIEvaluator(
             project_id=self.project_id,
             location="us-central1",
-            evaluator_model=model
+            evaluator_model=model,
+            cache_path=self.response_cache_path
         )
         self.evaluators[name] = evaluator
         return evaluator
@@ -167,29 +172,11 @@ class DPOEvaluationRunner:
             persona_generated = generated_recipes[persona_id]
             persona_config = self.personas[persona_id]
 
-            # Evaluate with each evaluator
-            evaluations = {}
-            for eval_name in evaluator_names:
-                print(f"\n🔍 Evaluator: {eval_name}")
-                evaluator = self.evaluators[eval_name]
-
-                eval_results = []
-                for i, test_data in enumerate(tqdm(persona_generated, desc=f"  {eval_name}")):
-                    evaluation = evaluator.evaluate_recipe_pair(
-                        persona_config=persona_config,
-                        recipe_sft=test_data['sft_recipe'],
-                        recipe_dpo=test_data['dpo_recipe'],
-                        inventory=test_data['inventory'],
-                        user_request=test_data['user_request']
-                    )
-
-                    eval_results.append({
-                        "test_case_id": test_data['test_case_id'],
-                        "category": test_data['category'],
-                        "evaluation": evaluation
-                    })
-
-                evaluations[eval_name] = eval_results
+            # Evaluate with all evaluators concurrently (batched, async requests)
+            print(f"\n🔍 Evaluators: {', '.join(evaluator_names)}")
+            evaluations = asyncio.run(
+                self._evaluate_persona(persona_config, persona_generated, evaluator_names)
+            )
 
             # Compute consensus across evaluators
             consensus = self._compute_consensus(evaluations)
@@ -214,10 +201,56 @@ class DPOEvaluationRunner:
 
         return all_results
 
+    async def _evaluate_persona(
+        self,
+        persona_config: Dict,
+        persona_generated: List[Dict],
+        evaluator_names: List[str]
+    ) -> Dict[str, List[Dict]]:
+        """Run every evaluator's batch_evaluate for one persona, results keyed by evaluator"""
+        test_cases = [
+            {
+                "recipe_sft": test_data['sft_recipe'],
+                "recipe_dpo": test_data['dpo_recipe'],
+                "inventory": test_data['inventory'],
+                "user_request": test_data['user_request'],
+                "metadata": {
+                    "test_case_id": test_data['test_case_id'],
+                    "category": test_data['category']
+                }
+            }
+            for test_data in persona_generated
+        ]
+
+        batch_results = await asyncio.gather(*(
+            self.evaluators[eval_name].abatch_evaluate(test_cases, persona_config, verbose=False)
+            for eval_name in evaluator_names
+        ))
+
+        evaluations = {}
+        for eval_name, results in zip(evaluator_names, batch_results):
+            # batch_evaluate numbers cases by position; restore the test case identity
+            evaluations[eval_name] = [
+                {
+                    "test_case_id": result["metadata"]["test_case_id"],
+                    "category": result["metadata"]["category"],
+                    "evaluation": result["evaluation"]
+                }
+                for result in results
+            ]
+            print(f"  ✅ {eval_name}: {len(results)} test cases evaluated")
+
+        return evaluations
+
     def _generate_all_recipes(self, persona_ids: List[str], test_count: int) -> Dict:
         """Generate recipes for all personas and test cases"""
         generated_recipes = {}
 
+        # Capture compiled decode graphs once before the sweep (PP_COMPILE=1 only)
+        sft_model = self.model_loader.load_sft_model()
+        if self.model_loader.compiled:
+            self.model_loader.warmup(sft_model, max_new_tokens=16)
+
         for persona_id in persona_ids:
             print(f"\n{'='*70}")
             print(f"Generating recipes for: {self.personas[persona_id]['name']}")
@@ -396,6 +429,8 @@ def main():
     parser.add_argument("--output_dir", default="evaluation/reports", help="Output directory")
     parser.add_argument("--skip_generation", action="store_true", help="Skip recipe generation, use cache")
     parser.add_argument("--generation_cache", default="generation_cache.json", help="Cache file name")
+    parser.add_argument("--cache", dest="use_response_cache", action="store_true",
+                        help="Reuse cached evaluator responses for identical prompts (off by default)")
 
     args = parser.parse_args()
 
@@ -413,7 +448,8 @@ def main():
         dpo_models_dir=str(dpo_path),
         personas_file=str(personas_file),
         test_cases_file=str(test_cases_file),
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        use_response_cache=args.use_response_cache
     )
 
     # Add evaluators
@@ -454,14 +490,13 @@ def main():
     print(f"\n💾 Saved detailed results to: {output_path}")
 
     # Save summary
+    report_gen = ReportGenerator(results, runner.personas)
     summary_path = runner.output_dir / "summary_stats.json"
-    with open(summary_path, 'w', encoding='utf-8') as f:
-        json.dump(results["summary"], f, indent=2, ensure_ascii=False)
+    report_gen.generate_json_summary(str(summary_path))
     print(f"💾 Saved summary to: {summary_path}")
 
     # Generate HTML report
     print(f"\n📄 Generating HTML report...")
-    report_gen = ReportGenerator(results, runner.personas)
     html_path = runner.output_dir / "evaluation_report.html"
     report_gen.generate_html_report(str(html_path))
     print(f"💾 Saved HTML report to: {html_path}")
@@ -6,13 +6,124 @@ Supports efficient loading and inference with LoRA adapters.
 """
 
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    PreTrainedTokenizerFast,
+    StoppingCriteria,
+    StoppingCriteriaList
+)
 from peft import PeftModel
 import json
+import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 import gc
 
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # libyaml not available
+    from yaml import SafeLoader
+
+
+# Fenced ```json ... ``` block inside the assistant response. The closing fence is
+# optional: JsonBraceStoppingCriteria stops at the closing brace, before the model emits it.
+_JSON_FENCE_RE = re.compile(r"```json(.*?)(?:```|\Z)", re.DOTALL)
+
+# Prompt length buckets for the compiled decode graph (left-padded)
+_PROMPT_BUCKETS = (128, 256, 512, 1024)
+
+
+def _bucket_length(length: int) -> int:
+    """Smallest prompt bucket that fits `length` tokens"""
+    for bucket in _PROMPT_BUCKETS:
+        if length <= bucket:
+            return bucket
+    return length
+
+
+@lru_cache(maxsize=128)
+def _join_tuple(items: Tuple[str, ...]) -> str:
+    """Comma-join a tuple of strings (memoized across prompt builds)"""
+    return ", ".join(items)
+
+
+@lru_cache(maxsize=8)
+def _load_personas(path: str, mtime: float) -> Dict:
+    """Parse personas YAML once per (path, mtime) within this process"""
+    with open(path) as f:
+        return yaml.load(f, Loader=SafeLoader)["personas"]
+
+
+def load_personas(personas_file) -> Dict:
+    """Load persona configs from personas.yaml (cached by file mtime)"""
+    personas_file = Path(personas_file)
+    return _load_personas(str(personas_file), personas_file.stat().st_mtime)
+
+
+class JsonBraceStoppingCriteria(StoppingCriteria):
+    """
+    Stop generation once the first top-level JSON object is closed
+
+    Tracks brace depth incrementally over newly generated tokens only,
+    ignoring braces inside JSON strings. With batched inputs, generation
+    stops when every row has closed its object.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int):
+        self.tokenizer = tokenizer
+        self._start = prompt_length
+        self._seen = None
+        self._depth = None
+        self._opened = None
+        self._in_string = None
+        self._escaped = None
+        self._done = None
+
+    def _init_state(self, batch_size: int):
+        self._seen = [self._start] * batch_size
+        self._depth = [0] * batch_size
+        self._opened = [False] * batch_size
+        self._in_string = [False] * batch_size
+        self._escaped = [False] * batch_size
+        self._done = [False] * batch_size
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        if self._done is None:
+            self._init_state(input_ids.shape[0])
+
+        for row in range(input_ids.shape[0]):
+            if self._done[row]:
+                continue
+
+            text = self.tokenizer.decode(input_ids[row, self._seen[row]:])
+            self._seen[row] = input_ids.shape[-1]
+
+            for ch in text:
+                if self._in_string[row]:
+                    if self._escaped[row]:
+                        self._escaped[row] = False
+                    elif ch == "\\":
+                        self._escaped[row] = True
+                    elif ch == '"':
+                        self._in_string[row] = False
+                elif ch == '"' and self._opened[row]:
+                    self._in_string[row] = True
+                elif ch == "{":
+                    self._depth[row] += 1
+                    self._opened[row] = True
+                elif ch == "}" and self._opened[row]:
+                    self._depth[row] -= 1
+                    if self._depth[row] == 0:
+                        self._done[row] = True
+                        break
+
+        return all(self._done)
+
 
 class RecipeModelLoader:
     """
@@ -48,6 +159,12 @@ class RecipeModelLoader:
         self.base_model = None
         self.sft_model = None
         self.dpo_models = {}
+        self.compiled = False
+        # "static" only with SDPA: Llama's FlashAttention-2 path rejects StaticCache
+        self.cache_implementation = None
+
+        # Baked persona system prompts, keyed by persona_id or id(persona_config)
+        self._system_cache: Dict = {}
 
         print(f"📦 Model Loader initialized")
         print(f"   Base: {base_model_id}")
@@ -58,12 +175,17 @@ class RecipeModelLoader:
         """Load tokenizer (shared across all models)"""
         if self.tokenizer is None:
             print(f"\n🔤 Loading tokenizer from {self.base_model_id}...")
-            self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id)
+            self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, use_fast=True)
+            if not isinstance(self.tokenizer, PreTrainedTokenizerFast):
+                print(f"   ⚠️  Fast tokenizer unavailable, using {type(self.tokenizer).__name__}")
 
             # Ensure pad token is set
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
 
+            # Decoder-only generation pads on the left
+            self.tokenizer.padding_side = "left"
+
             print(f"   ✅ Tokenizer loaded (vocab size: {len(self.tokenizer)})")
 
         return self.tokenizer
@@ -72,19 +194,61 @@ class RecipeModelLoader:
         """Load base model (without any adapters)"""
         if self.base_model is None:
             print(f"\n🤖 Loading base model: {self.base_model_id}...")
-            self.base_model = AutoModelForCausalLM.from_pretrained(
-                self.base_model_id,
-                torch_dtype=self.torch_dtype,
-                device_map=self.device_map,
-                low_cpu_mem_usage=True
-            )
+            device_map = self._resolve_device_map()
+            try:
+                # Fused attention kernel (needs flash-attn and fp16/bf16)
+                self.base_model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_id,
+                    torch_dtype=self.torch_dtype,
+                    device_map=device_map,
+                    low_cpu_mem_usage=True,
+                    attn_implementation="flash_attention_2"
+                )
+            except (ImportError, ValueError) as e:
+                print(f"   ⚠️  FlashAttention-2 unavailable ({e}), using SDPA")
+                self.base_model = AutoModelForCausalLM.from_pretrained(
+                    self.base_model_id,
+                    torch_dtype=self.torch_dtype,
+                    device_map=device_map,
+                    low_cpu_mem_usage=True,
+                    attn_implementation="sdpa"
+                )
             self.base_model.eval()
+            if self.base_model.config._attn_implementation == "sdpa":
+                self.cache_implementation = "static"
+
+            # Fuse the per-token decode step into CUDA graphs (needs the fixed-shape
+            # static cache). Opt-in with PP_COMPILE=1: graph capture only pays off
+            # on long sweeps
+            if (self.cache_implementation == "static" and torch.cuda.is_available()
+                    and os.getenv("PP_COMPILE", "0") == "1"):
+                self.base_model.forward = torch.compile(
+                    self.base_model.forward,
+                    mode="reduce-overhead",
+                    fullgraph=False
+                )
+                self.compiled = True
+                print(f"   ⚡ Compiled forward (reduce-overhead)")
+
             print(f"   ✅ Base model loaded")
             print(f"   Device: {next(self.base_model.parameters()).device}")
             print(f"   Dtype: {next(self.base_model.parameters()).dtype}")
 
         return self.base_model
 
+    def _resolve_device_map(self):
+        """
+        Resolve "auto" to a direct placement on single-GPU hosts
+
+        Skips Accelerate's module-size planning (and any CPU/disk offload
+        it might decide on) when the whole model goes to one device.
+        """
+        if self.device_map != "auto":
+            return self.device_map
+        if torch.cuda.device_count() == 1:
+            return {"": 0}
+        return "auto"
+
     def load_sft_model(self, force_reload: bool = False):
         """
         Load SFT model (base + LoRA adapter)
@@ -183,7 +347,8 @@ class RecipeModelLoader:
         user_request: str,
         persona_config: Optional[Dict] = None,
         max_new_tokens: int = 512,
-        temperature: float = 0.7
+        temperature: float = 0.7,
+        persona_id: Optional[str] = None
     ) -> str:
         """
         Generate recipe with a model
@@ -195,19 +360,71 @@ class RecipeModelLoader:
             persona_config: Optional persona configuration for system prompt
             max_new_tokens: Max tokens to generate
             temperature: Sampling temperature
+            persona_id: Optional key for the cached persona system prompt
 
         Returns:
             Generated recipe (JSON string)
         """
+        inputs = self._prepare_inputs(
+            model, inventory, user_request, persona_config, persona_id=persona_id
+        )
+        return self._generate_from_inputs(model, inputs, max_new_tokens, temperature)
+
+    def _prepare_inputs(
+        self,
+        model,
+        inventory: List[str],
+        user_request: str,
+        persona_config: Optional[Dict] = None,
+        stream=None,
+        persona_id: Optional[str] = None
+    ):
+        """
+        Build, tokenize and move a prompt to the model's device
+
+        Args:
+            model: Target model (inputs are placed on its device)
+            inventory: Available ingredients
+            user_request: User's request
+            persona_config: Optional persona configuration
+            stream: Optional CUDA stream to issue the host-to-device copy on
+            persona_id: Optional key for the cached persona system prompt
+
+        Returns:
+            Tokenized inputs on the model's device
+        """
         # Ensure tokenizer is loaded
         if self.tokenizer is None:
             self.load_tokenizer()
 
         # Build prompt
-        prompt = self._build_prompt(inventory, user_request, persona_config)
+        prompt = self._build_prompt(inventory, user_request, persona_config, persona_id)
 
         # Tokenize
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(model.device)
+        inputs = self._tokenize(prompt)
+
+        if not torch.cuda.is_available():
+            return inputs.to(model.device)
+
+        # Pinned host memory lets the copy run asynchronously; ops queued
+        # later on the same stream are ordered after it
+        with torch.cuda.stream(stream or torch.cuda.current_stream()):
+            for key in inputs.keys():
+                inputs[key] = inputs[key].pin_memory().to(model.device, non_blocking=True)
+        return inputs
+
+    def _generate_from_inputs(
+        self,
+        model,
+        inputs,
+        max_new_tokens: int = 512,
+        temperature: float = 0.7
+    ) -> str:
+        """Run generation on already tokenized inputs and extract the recipe"""
+        # Stop as soon as the recipe JSON object is complete
+        stopping_criteria = StoppingCriteriaList([
+            JsonBraceStoppingCriteria(self.tokenizer, inputs.input_ids.shape[-1])
+        ])
 
         # Generate
         with torch.no_grad():
@@ -217,22 +434,73 @@ class RecipeModelLoader:
                 temperature=temperature,
                 top_p=0.9,
                 do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
+                pad_token_id=self.tokenizer.eos_token_id,
+                stopping_criteria=stopping_criteria,
+                cache_implementation=self.cache_implementation
             )
 
-        # Decode
-        full_output = self.tokenizer.decode(outputs[0], skip_special_tokens=False)
+        # Decode only the newly generated tokens (the prompt is not re-detokenized)
+        input_len = inputs.input_ids.shape[-1]
+        response = self.tokenizer.decode(outputs[0, input_len:], skip_special_tokens=True)
 
         # Extract assistant response
-        recipe_output = self._extract_assistant_response(full_output)
+        recipe_output = self._extract_assistant_response(response)
 
         return recipe_output
 
+    def _tokenize(self, prompt: str):
+        """
+        Tokenize a prompt, left-padding to a fixed bucket when compiled
+
+        Bucketing keeps input shapes stable so the compiled graph is only
+        captured once per bucket instead of once per prompt length.
+        """
+        if not self.compiled:
+            return self.tokenizer(prompt, return_tensors="pt")
+
+        length = len(self.tokenizer(prompt).input_ids)
+        return self.tokenizer(
+            prompt,
+            return_tensors="pt",
+            padding="max_length",
+            max_length=_bucket_length(length)
+        )
+
+    def warmup(self, model, max_new_tokens: int = 16):
+        """
+        Run one dummy generation per prompt bucket
+
+        Pays the CUDA graph capture cost up front so it is not charged to
+        the first evaluation in each bucket. No-op when not compiled.
+        """
+        if not self.compiled:
+            return
+
+        if self.tokenizer is None:
+            self.load_tokenizer()
+
+        print(f"\n🔥 Warming up compiled model ({len(_PROMPT_BUCKETS)} buckets)...")
+        for bucket in _PROMPT_BUCKETS:
+            input_ids = torch.full(
+                (1, bucket), self.tokenizer.pad_token_id, device=model.device
+            )
+            with torch.no_grad():
+                model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    pad_token_id=self.tokenizer.eos_token_id,
+                    cache_implementation=self.cache_implementation
+                )
+        print(f"   ✅ Warmup complete")
+
     def _build_prompt(
         self,
         inventory: List[str],
         user_request: str,
-        persona_config: Optional[Dict] = None
+        persona_config: Optional[Dict] = None,
+        persona_id: Optional[str] = None
     ) -> str:
         """
         Build ChatML format prompt
@@ -241,27 +509,20 @@ class RecipeModelLoader:
             inventory: Available ingredients
             user_request: User's request
             persona_config: Optional persona configuration
+            persona_id: Optional key for the cached persona system prompt
 
         Returns:
             Formatted prompt string
         """
         # System message
         if persona_config:
-            # DPO persona-specific system prompt
-            cuisines = ", ".join(persona_config.get("preferences", {}).get("cuisine", []))
-            flavors = ", ".join(persona_config.get("preferences", {}).get("flavor_profile", []))
-            preferences = ", ".join(persona_config.get("preference_keywords", []))
-
-            system_content = f"""You are a recipe generation AI specializing in {cuisines} cuisine.
-You prefer {flavors} flavors and {persona_config.get('preferences', {}).get('cooking_style', 'any')} cooking style.
-Try to incorporate ingredients like: {preferences}.
-Generate recipes in valid JSON format matching the exact structure you were trained on."""
+            system_content = self._persona_system_content(persona_config, persona_id)
         else:
             # Generic SFT system prompt
             system_content = "You are a helpful recipe generation AI. Generate recipes in valid JSON format based on the user's available ingredients and preferences."
 
         # User message
-        user_content = f"""Generate a recipe using these available ingredients: {', '.join(inventory)}
+        user_content = f"""Generate a recipe using these available ingredients: {_join_tuple(tuple(inventory))}
 
 User request: {user_request}
 
@@ -277,47 +538,64 @@ Generate a complete recipe in JSON format."""
 """
         return prompt
 
-    def _extract_assistant_response(self, full_output: str) -> str:
+    def _persona_system_content(
+        self,
+        persona_config: Dict,
+        persona_id: Optional[str] = None
+    ) -> str:
         """
-        Extract assistant's response from full output
+        Persona-specific system prompt, baked once per persona
 
         Args:
-            full_output: Full model output with special tokens
+            persona_config: Persona configuration
+            persona_id: Optional cache key (defaults to id(persona_config))
+
+        Returns:
+            System message content
+        """
+        key = persona_id if persona_id is not None else id(persona_config)
+        cached = self._system_cache.get(key)
+        if cached is not None and cached[0] is persona_config:
+            return cached[1]
+
+        # DPO persona-specific system prompt
+        cuisines = _join_tuple(tuple(persona_config.get("preferences", {}).get("cuisine", [])))
+        flavors = _join_tuple(tuple(persona_config.get("preferences", {}).get("flavor_profile", [])))
+        preferences = _join_tuple(tuple(persona_config.get("preference_keywords", [])))
+
+        system_content = f"""You are a recipe generation AI specializing in {cuisines} cuisine.
+You prefer {flavors} flavors and {persona_config.get('preferences', {}).get('cooking_style', 'any')} cooking style.
+Try to incorporate ingredients like: {preferences}.
+Generate recipes in valid JSON format matching the exact structure you were trained on."""
+
+        # Keep a reference to the config so an id() key is never reused
+        self._system_cache[key] = (persona_config, system_content)
+        return system_content
+
+    def _extract_assistant_response(self, response: str) -> str:
+        """
+        Extract the recipe JSON from the assistant's response
+
+        Args:
+            response: Decoded generated tokens (prompt and special tokens excluded)
 
         Returns:
             Cleaned assistant response
         """
-        # Find assistant response
-        if "<|start_header_id|>assistant<|end_header_id|>" in full_output:
-            # Split and get assistant part
-            parts = full_output.split("<|start_header_id|>assistant<|end_header_id|>")
-            if len(parts) > 1:
-                assistant_part = parts[1]
-
-                # Remove end tokens
-                if "<|eot_id|>" in assistant_part:
-                    assistant_part = assistant_part.split("<|eot_id|>")[0]
-
-                # Clean up
-                response = assistant_part.strip()
-
-                # Extract JSON if embedded in text
-                if "```json" in response:
-                    # Find JSON block
-                    json_start = response.find("```json") + 7
-                    json_end = response.find("```", json_start)
-                    if json_end > json_start:
-                        response = response[json_start:json_end].strip()
-                elif "{" in response and "}" in response:
-                    # Extract JSON object
-                    json_start = response.find("{")
-                    json_end = response.rfind("}") + 1
-                    response = response[json_start:json_end]
-
-                return response
-
-        # Fallback: return as-is
-        return full_output.strip()
+        response = response.strip()
+
+        # Extract JSON if embedded in text (fence may be unterminated)
+        match = _JSON_FENCE_RE.search(response)
+        if match:
+            response = match.group(1).strip()
+
+        # Extract JSON object
+        json_start = response.find("{")
+        json_end = response.rfind("}") + 1
+        if json_start >= 0 and json_end > 0:
+            response = response[json_start:json_end]
+
+        return response
 
     def get_memory_usage(self) -> Dict:
         """Get current GPU memory usage"""
@@ -359,6 +637,7 @@ class SequentialModelLoader(RecipeModelLoader):
             inventory,
             user_request,
             persona_config=persona_config,
+            persona_id=persona_id,
             **kwargs
         )
         return recipe
@@ -374,30 +653,51 @@ class SequentialModelLoader(RecipeModelLoader):
         """
         Generate recipes with both SFT and DPO, managing memory efficiently
 
+        The DPO prompt is tokenized and copied to the GPU on a side CUDA
+        stream before SFT decoding starts, so its input staging overlaps
+        with SFT generation. The DPO adapter itself is only loaded after the
+        SFT recipe is generated, because PeftModel injects its layers into
+        the shared base model.
+
         Returns:
             (sft_recipe, dpo_recipe)
         """
+        sft_model = self.load_sft_model()
+
+        # Stage only the DPO inputs on a side stream while SFT decodes
+        # (SFT and DPO share the base model, hence the same device)
+        side_stream = torch.cuda.Stream() if torch.cuda.is_available() else None
+        sft_inputs = self._prepare_inputs(sft_model, inventory, user_request)
+        dpo_inputs = self._prepare_inputs(
+            sft_model,
+            inventory,
+            user_request,
+            persona_config=persona_config,
+            stream=side_stream,
+            persona_id=persona_id
+        )
+
         # Generate with SFT
         print(f"   📝 Generating with SFT model...")
-        sft_recipe = self.generate_sft_recipe(inventory, user_request, **kwargs)
+        sft_recipe = self._generate_from_inputs(sft_model, sft_inputs, **kwargs)
 
         # Generate with DPO
         print(f"   📝 Generating with DPO model ({persona_id})...")
-        dpo_recipe = self.generate_dpo_recipe(
-            persona_id,
-            persona_config,
-            inventory,
-            user_request,
-            **kwargs
-        )
+        dpo_model = self.load_dpo_model(persona_id)
+        if side_stream is not None:
+            current_stream = torch.cuda.current_stream()
+            current_stream.wait_stream(side_stream)
+            # Tensors were allocated on the side stream; keep the allocator
+            # from reusing their memory while the current stream reads them
+            for key in dpo_inputs.keys():
+                dpo_inputs[key].record_stream(current_stream)
+        dpo_recipe = self._generate_from_inputs(dpo_model, dpo_inputs, **kwargs)
 
         return sft_recipe, dpo_recipe
 
 
 if __name__ == "__main__":
     # Test the model loader
-    import yaml
-
     # Paths
     project_root = Path(__file__).parent.parent
     sft_path = project_root / "models/llama3b_lambda_lora"
@@ -405,8 +705,7 @@ if __name__ == "__main__":
     personas_file = project_root / "data_pipeline/05_dpo_training/personas.yaml"
 
     # Load personas
-    with open(personas_file) as f:
-        personas = yaml.safe_load(f)['personas']
+    personas = load_personas(personas_file)
 
     # Initialize loader
     loader = SequentialModelLoader(
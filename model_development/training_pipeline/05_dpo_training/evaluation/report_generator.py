@@ -4,71 +4,18 @@ Report Generator for DPO Evaluation Results
 Generates HTML reports with visualizations and JSON summaries.
 """
 
-import json
-from typing import Dict, List
+from collections import Counter
+from typing import Dict, Iterator, List
 from pathlib import Path
 from datetime import datetime
+from html import escape
+from operator import itemgetter
 
+import orjson
+from jinja2 import Environment
 
-class ReportGenerator:
-    """
-    Generate evaluation reports in HTML and JSON formats
-    """
-
-    def __init__(self, evaluation_results: Dict, personas: Dict):
-        """
-        Initialize report generator
-
-        Args:
-            evaluation_results: Results from DPOEvaluationRunner
-            personas: Personas configuration dictionary
-        """
-        self.results = evaluation_results
-        self.personas = personas
-        self.metadata = evaluation_results.get("metadata", {})
-        self.summary = evaluation_results.get("summary", {})
-        self.persona_results = evaluation_results.get("persona_results", {})
-
-    def generate_html_report(self, output_path: str):
-        """
-        Generate HTML report with visualizations
-
-        Args:
-            output_path: Path to save HTML file
-        """
-        html = self._build_html()
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html)
-
-        print(f"✅ Generated HTML report: {output_path}")
-
-    def _build_html(self) -> str:
-        """Build complete HTML report"""
-        return f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DPO Persona Evaluation Report</title>
-    <style>
-        {self._get_css()}
-    </style>
-</head>
-<body>
-    <div class="container">
-        {self._build_header()}
-        {self._build_overall_summary()}
-        {self._build_per_persona_results()}
-        {self._build_detailed_evaluations()}
-        {self._build_footer()}
-    </div>
-</body>
-</html>"""
-
-    def _get_css(self) -> str:
-        """Get CSS styles"""
-        return """
+# Static report stylesheet
+_CSS = """
         * {
             margin: 0;
             padding: 0;
@@ -335,14 +282,154 @@ class ReportGenerator:
         }
         """
 
-    def _build_header(self) -> str:
+_JINJA_ENV = Environment(autoescape=True, trim_blocks=True, lstrip_blocks=True)
+
+_DETAILED_EVALUATIONS_TEMPLATE = """
+        <section id="detailed-evaluations">
+            <h2>🔍 Detailed Evaluations by Persona</h2>
+{% for persona_id, persona_data in personas %}
+{% set consensus = persona_data.consensus.overall %}
+            <div class="persona-section">
+                <h3>{{ persona_data.persona_name }} ({{ persona_id }})</h3>
+                <p><strong>DPO Win Rate:</strong> {{ '%.1f'|format(consensus.dpo_win_rate * 100) }}%
+                   ({{ consensus.dpo_wins }}/{{ consensus.total_tests }} tests)</p>
+
+                <h4>Evaluator Breakdown:</h4>
+{% for eval_name, wins in tallies[persona_id].items() %}
+                <div class="evaluator-results">
+                    <strong>{{ eval_name }}</strong>:
+                    DPO {{ wins.dpo }} | SFT {{ wins.sft }} | Tie {{ wins.tie }}
+                </div>
+{% endfor %}
+                <button class="collapsible">Show Test Case Details</button>
+                <div class="collapsible-content">
+{% for test_case_id, category, user_request, inventory, winner, confidence, votes in test_cases[persona_id] %}
+                <div class="test-case-detail">
+                    <p><strong>Test {{ test_case_id }}</strong> ({{ category }})</p>
+                    <p><strong>Request:</strong> {{ user_request }}</p>
+                    <p><strong>Inventory:</strong> {{ inventory }}</p>
+                    <p><strong>Winner:</strong> <span class="badge badge-{{ winner }}">{{ winner|upper }}</span>
+                       <span class="badge badge-{{ confidence }}">{{ confidence }}</span></p>
+                    <p><strong>Votes:</strong> DPO: {{ votes.dpo }}, SFT: {{ votes.sft }}</p>
+                </div>
+{% endfor %}
+                </div> <!-- collapsible-content -->
+            </div> <!-- persona-section -->
+{% endfor %}
+        </section>
+
+        <script>
+        // Collapsible sections
+        var coll = document.getElementsByClassName("collapsible");
+        for (var i = 0; i < coll.length; i++) {
+            coll[i].addEventListener("click", function() {
+                this.classList.toggle("active");
+                var content = this.nextElementSibling;
+                if (content.style.display === "block") {
+                    content.style.display = "none";
+                } else {
+                    content.style.display = "block";
+                }
+            });
+        }
+        </script>
+"""
+
+
+class ReportGenerator:
+    """
+    Generate evaluation reports in HTML and JSON formats
+    """
+
+    # Compiled once and shared by every report
+    detailed_template = _JINJA_ENV.from_string(_DETAILED_EVALUATIONS_TEMPLATE)
+
+    def __init__(self, evaluation_results: Dict, personas: Dict):
+        """
+        Initialize report generator
+
+        Args:
+            evaluation_results: Results from DPOEvaluationRunner
+            personas: Personas configuration dictionary
+        """
+        self.results = evaluation_results
+        self.personas = personas
+        self.metadata = evaluation_results.get("metadata", {})
+        self.summary = evaluation_results.get("summary", {})
+        self.persona_results = evaluation_results.get("persona_results", {})
+        self._generated_at = datetime.now()
+
+    def generate_html_report(self, output_path: str):
+        """
+        Generate HTML report with visualizations
+
+        Args:
+            output_path: Path to save HTML file
+        """
+        # Sections are encoded and written as they are produced, never joined in memory
+        with open(output_path, 'wb', buffering=1 << 20) as f:
+            f.writelines(chunk.encode('utf-8') for chunk in self._build_html())
+
+        print(f"✅ Generated HTML report: {output_path}")
+
+    def generate_json_summary(self, output_path: str):
+        """
+        Write summary statistics as JSON
+
+        Args:
+            output_path: Path to save JSON file
+        """
+        data = orjson.dumps(
+            self.summary,
+            default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+        with open(output_path, 'wb') as f:
+            f.write(data)
+
+        print(f"✅ Generated JSON summary: {output_path}")
+
+    def _build_html(self) -> Iterator[str]:
+        """Build complete HTML report, yielding it chunk by chunk"""
+        yield f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>DPO Persona Evaluation Report</title>
+    <style>
+        {_CSS}
+    </style>
+</head>
+<body>
+    <div class="container">
+        """
+        sections = (
+            self._build_header,
+            self._build_overall_summary,
+            self._build_per_persona_results,
+            self._build_detailed_evaluations,
+            self._build_footer,
+        )
+        for i, build_section in enumerate(sections):
+            if i:
+                yield "\n        "
+            yield from build_section()
+        yield """
+    </div>
+</body>
+</html>"""
+
+    def _build_header(self) -> Iterator[str]:
         """Build report header"""
-        timestamp = self.metadata.get("timestamp", "Unknown")
-        project_id = self.metadata.get("project_id", "Unknown")
-        total_tests = self.metadata.get("total_tests", 0)
-        evaluators = ", ".join(self.metadata.get("evaluators_used", []))
+        metadata = self.metadata
+        timestamp = escape(str(metadata.get("timestamp", "Unknown")))
+        project_id = escape(str(metadata.get("project_id", "Unknown")))
+        total_tests = metadata.get("total_tests", 0)
+        evaluators = escape(", ".join(metadata.get("evaluators_used", [])))
 
-        return f"""
+        yield f"""
         <header>
             <h1>🎭 DPO Persona Model Evaluation Report</h1>
             <div class="metadata">
@@ -354,19 +441,20 @@ class ReportGenerator:
         </header>
         """
 
-    def _build_overall_summary(self) -> str:
+    def _build_overall_summary(self) -> Iterator[str]:
         """Build overall summary section"""
-        total_tests = self.summary.get("total_tests", 0)
-        dpo_wins = self.summary.get("dpo_wins", 0)
-        sft_wins = self.summary.get("sft_wins", 0)
-        ties = self.summary.get("ties", 0)
-        dpo_win_rate = self.summary.get("dpo_win_rate", 0) * 100
+        summary = self.summary
+        total_tests = summary.get("total_tests", 0)
+        dpo_wins = summary.get("dpo_wins", 0)
+        sft_wins = summary.get("sft_wins", 0)
+        ties = summary.get("ties", 0)
+        dpo_win_rate = summary.get("dpo_win_rate", 0) * 100
 
         dpo_pct = (dpo_wins / total_tests * 100) if total_tests > 0 else 0
         sft_pct = (sft_wins / total_tests * 100) if total_tests > 0 else 0
         tie_pct = (ties / total_tests * 100) if total_tests > 0 else 0
 
-        return f"""
+        yield f"""
         <section id="overall-summary">
             <h2>📊 Overall Summary</h2>
 
@@ -407,11 +495,11 @@ class ReportGenerator:
         </section>
         """
 
-    def _build_per_persona_results(self) -> str:
+    def _build_per_persona_results(self) -> Iterator[str]:
         """Build per-persona results section"""
         per_persona = self.summary.get("per_persona", {})
 
-        html = """
+        yield """
         <section id="per-persona-results">
             <h2>🎭 Per-Persona Results</h2>
             <table>
@@ -428,17 +516,16 @@ class ReportGenerator:
                 <tbody>
         """
 
+        get_stats = itemgetter('name', 'total_tests', 'dpo_wins', 'sft_wins', 'ties', 'dpo_win_rate')
+
         for persona_id, stats in per_persona.items():
-            name = stats['name']
-            total = stats['total_tests']
-            dpo = stats['dpo_wins']
-            sft = stats['sft_wins']
-            ties = stats['ties']
-            win_rate = stats['dpo_win_rate'] * 100
-
-            html += f"""
+            name, total, dpo, sft, ties, win_rate = get_stats(stats)
+            name = escape(name)
+            win_rate *= 100
+
+            yield f"""
                     <tr>
-                        <td><strong>{name}</strong><br><small>{persona_id}</small></td>
+                        <td><strong>{name}</strong><br><small>{escape(persona_id)}</small></td>
                         <td>{total}</td>
                         <td><span class="badge badge-dpo">{dpo}</span></td>
                         <td><span class="badge badge-sft">{sft}</span></td>
@@ -447,114 +534,58 @@ class ReportGenerator:
                     </tr>
             """
 
-        html += """
+        yield """
                 </tbody>
             </table>
         </section>
         """
 
-        return html
-
-    def _build_detailed_evaluations(self) -> str:
+    def _build_detailed_evaluations(self) -> Iterator[str]:
         """Build detailed evaluations section"""
-        html = """
-        <section id="detailed-evaluations">
-            <h2>🔍 Detailed Evaluations by Persona</h2>
-        """
-
-        for persona_id, persona_data in self.persona_results.items():
-            persona_name = persona_data['persona_name']
-            consensus = persona_data['consensus']['overall']
-            evaluations = persona_data['evaluations']
-
-            html += f"""
-            <div class="persona-section">
-                <h3>{persona_name} ({persona_id})</h3>
-                <p><strong>DPO Win Rate:</strong> {consensus['dpo_win_rate']*100:.1f}%
-                   ({consensus['dpo_wins']}/{consensus['total_tests']} tests)</p>
-
-                <h4>Evaluator Breakdown:</h4>
-            """
-
-            # Show results from each evaluator
-            for eval_name, eval_results in evaluations.items():
-                # Count wins per evaluator
-                dpo_wins = sum(1 for r in eval_results if r['evaluation']['winner'] == 'dpo')
-                sft_wins = sum(1 for r in eval_results if r['evaluation']['winner'] == 'sft')
-                ties = sum(1 for r in eval_results if r['evaluation']['winner'] == 'tie')
-
-                html += f"""
-                <div class="evaluator-results">
-                    <strong>{eval_name}</strong>:
-                    DPO {dpo_wins} | SFT {sft_wins} | Tie {ties}
-                </div>
-                """
-
-            # Sample test cases
-            html += """
-                <button class="collapsible">Show Test Case Details</button>
-                <div class="collapsible-content">
-            """
+        tallies = {}
+        test_cases = {}
+        get_gen = itemgetter('test_case_id', 'category', 'user_request', 'inventory')
+        get_result = itemgetter('winner', 'confidence', 'votes')
+
+        persona_results = self.persona_results
+
+        for persona_id, persona_data in persona_results.items():
+            # Count wins per evaluator in a single pass over its results
+            tallies[persona_id] = {
+                eval_name: Counter(r['evaluation']['winner'] for r in eval_results)
+                for eval_name, eval_results in persona_data['evaluations'].items()
+            }
 
-            # Show first 5 test cases
+            # Show first 5 test cases, flattened to the fields the template needs
             generated_recipes = persona_data.get('generated_recipes', [])[:5]
             test_results = persona_data['consensus']['test_results'][:5]
-
-            for i, (gen, test_result) in enumerate(zip(generated_recipes, test_results)):
-                winner = test_result['winner']
-                confidence = test_result['confidence']
-                votes = test_result['votes']
-
-                html += f"""
-                <div class="test-case-detail">
-                    <p><strong>Test {gen['test_case_id']}</strong> ({gen['category']})</p>
-                    <p><strong>Request:</strong> {gen['user_request']}</p>
-                    <p><strong>Inventory:</strong> {', '.join(gen['inventory'])}</p>
-                    <p><strong>Winner:</strong> <span class="badge badge-{winner}">{winner.upper()}</span>
-                       <span class="badge badge-{confidence}">{confidence}</span></p>
-                    <p><strong>Votes:</strong> DPO: {votes['sft']}, SFT: {votes['dpo']}</p>
-                </div>
-                """
-
-            html += """
-                </div> <!-- collapsible-content -->
-            </div> <!-- persona-section -->
-            """
-
-        html += """
-        </section>
-
-        <script>
-        // Collapsible sections
-        var coll = document.getElementsByClassName("collapsible");
-        for (var i = 0; i < coll.length; i++) {
-            coll[i].addEventListener("click", function() {
-                this.classList.toggle("active");
-                var content = this.nextElementSibling;
-                if (content.style.display === "block") {
-                    content.style.display = "none";
-                } else {
-                    content.style.display = "block";
-                }
-            });
-        }
-        </script>
-        """
-
-        return html
-
-    def _build_footer(self) -> str:
+            rows = []
+            for gen, test_result in zip(generated_recipes, test_results):
+                test_case_id, category, user_request, inventory = get_gen(gen)
+                rows.append(
+                    (test_case_id, category, user_request, ", ".join(inventory))
+                    + get_result(test_result)
+                )
+            test_cases[persona_id] = rows
+
+        yield from self.detailed_template.generate(
+            personas=persona_results.items(),
+            tallies=tallies,
+            test_cases=test_cases
+        )
+
+    def _build_footer(self) -> Iterator[str]:
         """Build report footer"""
-        return f"""
+        yield f"""
         <footer class="footer">
             <p>Generated by DPO Persona Evaluation System</p>
-            <p>RecipeGen-LLM | {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+            <p>RecipeGen-LLM | {self._generated_at:%Y-%m-%d %H:%M:%S}</p>
         </footer>
         """
 
 
-if __name__ == "__main__":
-    # Test with mock data
+def _smoke_test():
+    """Render a report from mock data (run only when executed as a script)"""
     mock_results = {
         "metadata": {
             "timestamp": datetime.now().isoformat(),
@@ -588,4 +619,9 @@ if __name__ == "__main__":
 
     gen = ReportGenerator(mock_results, mock_personas)
     gen.generate_html_report("test_report.html")
+    gen.generate_json_summary("test_summary.json")
     print("✅ Test report generated")
+
+
+if __name__ == "__main__":
+    _smoke_test()
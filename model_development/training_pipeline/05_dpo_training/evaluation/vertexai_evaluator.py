@@ -11,13 +11,328 @@ Provides unified interface for multi-model evaluation and comparison.
 
 import vertexai
 from vertexai.generative_models import GenerativeModel, GenerationConfig
+from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+import asyncio
+import atexit
+import hashlib
 import json
+import os
+import orjson
 import re
+import shelve
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import time
 
 
+# Static sections of the evaluation prompt
+_EVALUATION_TASK = """**Evaluation Task:**
+
+Rate each recipe on the following criteria (0-10 scale):
+
+1. **Persona Alignment** (0-10): Does the recipe match the persona's cuisine and style preferences?
+2. **Constraint Compliance** (0-10): Does it avoid forbidden ingredients and respect dietary restrictions?
+3. **Preferred Ingredients** (0-10): Does it use ingredients the persona prefers?
+4. **Recipe Quality** (0-10): Is it practical, well-structured, and coherent?
+5. **Overall Fit** (0-10): How well does this recipe represent the persona?
+
+**Important Evaluation Guidelines:**
+- Forbidden ingredients are CRITICAL violations (deduct heavily)
+- Dietary restrictions must be respected (vegetarian, vegan, gluten-free, etc.)
+- Preferred cuisine match is important but not required if inventory doesn't support it
+- Recipe quality matters: clear steps, reasonable ingredient amounts, coherent instructions"""
+
+_OUTPUT_SCHEMA = """{
+  "recipe_a_scores": {
+    "persona_alignment": <0-10>,
+    "constraint_compliance": <0-10>,
+    "preferred_ingredients": <0-10>,
+    "recipe_quality": <0-10>,
+    "overall_fit": <0-10>
+  },
+  "recipe_b_scores": {
+    "persona_alignment": <0-10>,
+    "constraint_compliance": <0-10>,
+    "preferred_ingredients": <0-10>,
+    "recipe_quality": <0-10>,
+    "overall_fit": <0-10>
+  },
+  "winner": "A" or "B",
+  "confidence": "high" or "medium" or "low",
+  "reasoning": "Brief explanation of why the winner is better (2-3 sentences)",
+  "violations_found": {
+    "recipe_a": ["list of forbidden ingredients found, if any"],
+    "recipe_b": ["list of forbidden ingredients found, if any"]
+  }
+}"""
+
+_CONFIDENCE_GUIDELINES = """**Confidence Guidelines:**
+- "high": Clear winner, score difference > 3 points
+- "medium": Noticeable difference, score difference 2-3 points
+- "low": Very similar, score difference < 2 points"""
+
+
+# Fixed prompt text around the variable persona/pair sections, assembled
+# once at import so building a prompt is a single join
+_PROMPT_HEADER = "You are evaluating two recipe generation models for persona alignment.\n\n"
+
+_BATCH_PROMPT_HEADER = (
+    "You are evaluating two recipe generation models for persona alignment.\n"
+    "There are {num_pairs} independent recipe pairs below; evaluate each pair on its own.\n\n"
+)
+
+_RESPONSE_ONLY = "\n\nIMPORTANT: Respond with ONLY valid JSON. No additional text before or after."
+
+_PROMPT_FOOTER = "".join((
+    "\n\n", _EVALUATION_TASK,
+    "\n\n**Output Format (JSON only):**\n```json\n", _OUTPUT_SCHEMA, "\n```\n\n",
+    _CONFIDENCE_GUIDELINES,
+    _RESPONSE_ONLY,
+))
+
+_BATCH_PROMPT_FOOTER = "".join((
+    "\n\n", _EVALUATION_TASK,
+    "\n\n**Output Format (JSON only):**\n",
+    'Return {"results": [...]} with exactly one object per pair, in pair order.\n',
+    'Each object has a "pair_id" field (the pair number) plus these fields:\n',
+    "```json\n", _OUTPUT_SCHEMA, "\n```\n\n",
+    _CONFIDENCE_GUIDELINES,
+    _RESPONSE_ONLY,
+))
+
+# (context, recipe A, recipe B, end) segments of a pair section
+_PAIR_SEGMENTS = (
+    "**Context:**\nAvailable Inventory: ",
+    "\n\n**Recipe A (SFT Baseline Model):**\n```json\n",
+    "\n```\n\n**Recipe B (DPO Persona Model):**\n```json\n",
+    "\n```",
+)
+
+# Recipe fields the evaluator never needs, and caps on the long ones
+_UNUSED_RECIPE_KEYS = frozenset({"image_url", "source"})
+_MAX_INGREDIENTS = 40
+_MAX_STEPS = 20
+_MAX_STEP_CHARS = 400
+
+
+def _shrink_recipe(value):
+    """Drop unused keys and cap ingredient/step lists before prompting"""
+    if isinstance(value, list):
+        return [_shrink_recipe(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    shrunk = {}
+    for key, item in value.items():
+        if key in _UNUSED_RECIPE_KEYS:
+            continue
+        if key in ("ingredients", "main_ingredients") and isinstance(item, list):
+            item = item[:_MAX_INGREDIENTS]
+        elif key == "steps":
+            if isinstance(item, list):
+                item = [
+                    step[:_MAX_STEP_CHARS] if isinstance(step, str) else step
+                    for step in item[:_MAX_STEPS]
+                ]
+            elif isinstance(item, str):
+                item = item[:_MAX_STEPS * _MAX_STEP_CHARS]
+        shrunk[key] = _shrink_recipe(item)
+    return shrunk
+
+
+# Tokens that matter for brace matching: whole string literals (so braces
+# inside them are skipped) and the braces themselves
+_JSON_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]', re.DOTALL)
+
+
+def _extract_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced {...} object in `text`, or None
+
+    Single linear pass tracking brace depth; braces inside string literals
+    (including escaped quotes) are ignored. The scan jumps between tokens
+    with a precompiled regex rather than stepping through every character.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    for match in _JSON_TOKEN_RE.finditer(text, start):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:match.end()]
+
+    return None
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter usable from both sync and async code
+
+    Tokens refill continuously at `rate_per_sec` up to `capacity`, so short
+    bursts go out immediately while the long-run rate stays bounded. Each
+    acquire reserves a token up front (possibly driving the balance
+    negative) and then sleeps for its share of the deficit.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire_blocking(self):
+        """Wait (blocking) until a request may be sent"""
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire(self):
+        """Wait (without blocking the event loop) until a request may be sent"""
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Pause all callers after a run of consecutive quota errors
+
+    Retrying each request independently turns a burst of 429s into a retry
+    storm. Once `threshold` quota errors arrive back to back, the breaker
+    opens for `cooldown` seconds and every caller waits it out before its
+    next attempt; any success closes it again.
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.open_until = time.monotonic() + self.cooldown
+                self.failures = 0
+
+    def _remaining(self) -> float:
+        with self._lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+    def wait_blocking(self):
+        """Block while the breaker is open"""
+        delay = self._remaining()
+        if delay:
+            time.sleep(delay)
+
+    async def wait(self):
+        """Wait (without blocking the event loop) while the breaker is open"""
+        delay = self._remaining()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# Transient Vertex AI errors worth retrying
+_RETRYABLE_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded)
+
+_retry_transient = retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+    reraise=True,
+)
+
+
+def _cache_key(prompt: str, evaluator_name: str, model_id: str) -> str:
+    """Content address for a prompt sent to a given judge model"""
+    payload = "\x00".join((evaluator_name, model_id, prompt))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw Vertex AI response text, keyed by _cache_key
+
+    Re-running an evaluation over the same cases (or after a crash) reuses
+    the stored responses instead of paying for identical completions. Backed
+    by shelve; a lock guards the handle since evaluators may share it
+    across threads.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._shelf = shelve.open(path)
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._shelf.get(key)
+
+    def set(self, key: str, response_text: str) -> None:
+        with self._lock:
+            self._shelf[key] = response_text
+            self._shelf.sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._shelf.close()
+
+
+DEFAULT_CACHE_PATH = ".vertex_cache"
+
+
+@lru_cache(maxsize=None)
+def _get_response_cache(path: str) -> ResponseCache:
+    """Shared ResponseCache per path (one shelve handle per file)"""
+    return ResponseCache(path)
+
+
+# (project, location) pairs vertexai.init has already been called for
+_initialized_locations = set()
+
+
+@lru_cache(maxsize=32)
+def _get_model(project_id: str, location: str, model_id: str) -> GenerativeModel:
+    """
+    Shared GenerativeModel per (project, location, model)
+
+    Evaluators for the same model reuse one client (and its channel and
+    credentials) instead of re-initializing Vertex AI on every construction.
+    """
+    if (project_id, location) not in _initialized_locations:
+        vertexai.init(project=project_id, location=location)
+        _initialized_locations.add((project_id, location))
+    return GenerativeModel(model_id)
+
+
 class VertexAIEvaluator:
     """
     Evaluate SFT vs DPO recipes using Vertex AI models
@@ -37,11 +352,15 @@ class VertexAIEvaluator:
         "claude-sonnet": "claude-3-5-sonnet@20241022",
     }
 
+    # Shared by every evaluator so a quota storm pauses the whole run
+    circuit_breaker = CircuitBreaker()
+
     def __init__(
         self,
         project_id: str,
         location: str = "us-central1",
-        evaluator_model: str = "claude-haiku"
+        evaluator_model: str = "claude-haiku",
+        cache_path: Optional[str] = None
     ):
         """
         Initialize Vertex AI evaluator
@@ -50,10 +369,8 @@ class VertexAIEvaluator:
             project_id: GCP project ID
             location: GCP region (default: us-central1)
             evaluator_model: Model to use (gemini-flash, claude-haiku, etc.)
+            cache_path: Response cache file, e.g. DEFAULT_CACHE_PATH (None disables caching)
         """
-        # Initialize Vertex AI
-        vertexai.init(project=project_id, location=location)
-
         # Get model identifier
         if evaluator_model not in self.MODELS:
             raise ValueError(
@@ -62,22 +379,21 @@ class VertexAIEvaluator:
             )
 
         model_id = self.MODELS[evaluator_model]
-        self.model = GenerativeModel(model_id)
+        self.model = _get_model(project_id, location, model_id)
         self.evaluator_name = evaluator_model
         self.model_id = model_id
 
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 0.1  # 100ms between requests
+        # Rate limiting (requests per minute, bursts up to ~10s worth)
+        rpm = float(os.getenv("VERTEX_AI_RPM", "60"))
+        self.rate_limiter = TokenBucket(rate_per_sec=rpm / 60, capacity=max(1.0, rpm / 6))
 
-        print(f"✅ Initialized {evaluator_model} ({model_id})")
+        # Rendered persona sections, keyed by id(persona) -> (persona, block)
+        self._persona_blocks: Dict = {}
 
-    def _rate_limit(self):
-        """Ensure minimum time between requests"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_request_interval:
-            time.sleep(self.min_request_interval - elapsed)
-        self.last_request_time = time.time()
+        # Raw responses keyed by (judge, model, prompt) hash
+        self.response_cache = _get_response_cache(cache_path) if cache_path else None
+
+        print(f"✅ Initialized {evaluator_model} ({model_id})")
 
     def evaluate_recipe_pair(
         self,
@@ -121,38 +437,203 @@ class VertexAIEvaluator:
         )
 
         try:
-            # Rate limiting
-            self._rate_limit()
+            # Call Vertex AI (or reuse a cached response)
+            response_text = self._generate(prompt)
 
-            # Generation config
-            generation_config = GenerationConfig(
-                temperature=0.2,  # Low temp for consistent evaluation
-                max_output_tokens=1000,
-            )
+            # Parse response
+            evaluation = self._parse_evaluation(response_text)
+            evaluation["evaluator"] = self.evaluator_name
 
-            # Call Vertex AI
-            response = self.model.generate_content(
-                prompt,
-                generation_config=generation_config
-            )
+            return evaluation
+
+        except Exception as e:
+            return self._failed_evaluation(e)
+
+    async def aevaluate_recipe_pair(
+        self,
+        persona_config: Dict,
+        recipe_sft: str,
+        recipe_dpo: str,
+        inventory: List[str],
+        user_request: str
+    ) -> Dict:
+        """
+        Async variant of evaluate_recipe_pair (same arguments and result)
+
+        Uses generate_content_async so many evaluations can be in flight at
+        once; concurrency is bounded by the caller.
+        """
+        prompt = self._build_evaluation_prompt(
+            persona_config,
+            recipe_sft,
+            recipe_dpo,
+            inventory,
+            user_request
+        )
+
+        try:
+            # Call Vertex AI (or reuse a cached response)
+            response_text = await self._agenerate(prompt)
 
             # Parse response
-            evaluation = self._parse_evaluation(response.text)
+            evaluation = self._parse_evaluation(response_text)
             evaluation["evaluator"] = self.evaluator_name
 
             return evaluation
 
         except Exception as e:
-            print(f"\n⚠️  Vertex AI Error ({self.evaluator_name}): {e}")
-            return {
-                "error": str(e),
-                "winner": "unknown",
-                "sft_score": 0,
-                "dpo_score": 0,
-                "confidence": "none",
-                "reasoning": f"Evaluation failed: {e}",
-                "evaluator": self.evaluator_name
-            }
+            return self._failed_evaluation(e)
+
+    def evaluate_recipe_pairs_batch(
+        self,
+        persona_config: Dict,
+        cases: List[Dict]
+    ) -> List[Dict]:
+        """
+        Evaluate several recipe pairs for one persona in a single request
+
+        Args:
+            persona_config: Persona definition from personas.yaml
+            cases: Test case dictionaries (recipe_sft, recipe_dpo, inventory,
+                user_request)
+
+        Returns:
+            One evaluation per case, in order (same format as
+            evaluate_recipe_pair)
+        """
+        if len(cases) == 1:
+            return [self.evaluate_recipe_pair(persona_config, **self._pair_args(cases[0]))]
+
+        prompt = self._build_batch_evaluation_prompt(persona_config, cases)
+
+        try:
+            # Call Vertex AI (or reuse a cached response)
+            response_text = self._generate(prompt, len(cases))
+
+            return self._parse_batch_evaluation(response_text, len(cases))
+
+        except Exception as e:
+            return [self._failed_evaluation(e) for _ in cases]
+
+    async def aevaluate_recipe_pairs_batch(
+        self,
+        persona_config: Dict,
+        cases: List[Dict]
+    ) -> List[Dict]:
+        """Async variant of evaluate_recipe_pairs_batch"""
+        if len(cases) == 1:
+            return [await self.aevaluate_recipe_pair(persona_config, **self._pair_args(cases[0]))]
+
+        prompt = self._build_batch_evaluation_prompt(persona_config, cases)
+
+        try:
+            # Call Vertex AI (or reuse a cached response)
+            response_text = await self._agenerate(prompt, len(cases))
+
+            return self._parse_batch_evaluation(response_text, len(cases))
+
+        except Exception as e:
+            return [self._failed_evaluation(e) for _ in cases]
+
+    @staticmethod
+    def _pair_args(case: Dict) -> Dict:
+        """evaluate_recipe_pair keyword arguments for a test case"""
+        return {
+            "recipe_sft": case["recipe_sft"],
+            "recipe_dpo": case["recipe_dpo"],
+            "inventory": case["inventory"],
+            "user_request": case["user_request"]
+        }
+
+    def _generate(self, prompt: str, num_pairs: int = 1) -> str:
+        """Rate-limited generate_content call, served from the cache when possible"""
+        key = _cache_key(prompt, self.evaluator_name, self.model_id)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        response_text = self._call_model(prompt, num_pairs)
+        self._store_response(key, response_text)
+        return response_text
+
+    async def _agenerate(self, prompt: str, num_pairs: int = 1) -> str:
+        """Async variant of _generate"""
+        key = _cache_key(prompt, self.evaluator_name, self.model_id)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        response_text = await self._acall_model(prompt, num_pairs)
+        self._store_response(key, response_text)
+        return response_text
+
+    @_retry_transient
+    def _call_model(self, prompt: str, num_pairs: int) -> str:
+        """One generate_content attempt (retried on transient errors)"""
+        self.circuit_breaker.wait_blocking()
+
+        # Rate limiting
+        self.rate_limiter.acquire_blocking()
+
+        try:
+            response = self.model.generate_content(
+                prompt,
+                generation_config=self._generation_config(num_pairs)
+            )
+        except ResourceExhausted:
+            self.circuit_breaker.record_failure()
+            raise
+
+        self.circuit_breaker.record_success()
+        return response.text
+
+    @_retry_transient
+    async def _acall_model(self, prompt: str, num_pairs: int) -> str:
+        """Async variant of _call_model"""
+        await self.circuit_breaker.wait()
+
+        # Rate limiting
+        await self.rate_limiter.acquire()
+
+        try:
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=self._generation_config(num_pairs)
+            )
+        except ResourceExhausted:
+            self.circuit_breaker.record_failure()
+            raise
+
+        self.circuit_breaker.record_success()
+        return response.text
+
+    def _store_response(self, key: str, response_text: str) -> None:
+        """Cache a response unless it obviously contains no JSON to parse"""
+        if self.response_cache is not None and _extract_json_object(response_text):
+            self.response_cache.set(key, response_text)
+
+    def _generation_config(self, num_pairs: int = 1) -> GenerationConfig:
+        """Generation config shared by all evaluation calls"""
+        return GenerationConfig(
+            temperature=0.2,  # Low temp for consistent evaluation
+            # ~600 tokens of JSON per pair when several pairs share a request
+            max_output_tokens=1000 if num_pairs == 1 else 600 * num_pairs,
+        )
+
+    def _failed_evaluation(self, error: Exception) -> Dict:
+        """Evaluation result recorded when the Vertex AI call fails"""
+        print(f"\n⚠️  Vertex AI Error ({self.evaluator_name}): {error}")
+        return {
+            "error": str(error),
+            "winner": "unknown",
+            "sft_score": 0,
+            "dpo_score": 0,
+            "confidence": "none",
+            "reasoning": f"Evaluation failed: {error}",
+            "evaluator": self.evaluator_name
+        }
 
     def _build_evaluation_prompt(
         self,
@@ -163,25 +644,36 @@ class VertexAIEvaluator:
         user_request: str
     ) -> str:
         """Build evaluation prompt for Vertex AI"""
+        return "".join((
+            _PROMPT_HEADER,
+            self._persona_block(persona),
+            "\n\n",
+            self._pair_block(recipe_sft, recipe_dpo, inventory, user_request),
+            _PROMPT_FOOTER,
+        ))
+
+    def _build_batch_evaluation_prompt(self, persona: Dict, cases: List[Dict]) -> str:
+        """Build one evaluation prompt covering several recipe pairs"""
+        parts = [
+            _BATCH_PROMPT_HEADER.format(num_pairs=len(cases)),
+            self._persona_block(persona),
+        ]
+        for i, case in enumerate(cases, start=1):
+            parts += ("\n\n### Pair ", str(i), "\n\n", self._pair_block(**self._pair_args(case)))
+        parts.append(_BATCH_PROMPT_FOOTER)
+
+        return "".join(parts)
+
+    def _persona_block(self, persona: Dict) -> str:
+        """
+        Persona profile section of the evaluation prompt
 
-        # Parse recipes if they're JSON strings
-        try:
-            if isinstance(recipe_sft, str):
-                recipe_sft_obj = json.loads(recipe_sft)
-            else:
-                recipe_sft_obj = recipe_sft
-                recipe_sft = json.dumps(recipe_sft, indent=2, ensure_ascii=False)
-        except:
-            recipe_sft_obj = None
-
-        try:
-            if isinstance(recipe_dpo, str):
-                recipe_dpo_obj = json.loads(recipe_dpo)
-            else:
-                recipe_dpo_obj = recipe_dpo
-                recipe_dpo = json.dumps(recipe_dpo, indent=2, ensure_ascii=False)
-        except:
-            recipe_dpo_obj = None
+        The persona is constant across a batch, so the rendered block is
+        cached per persona dict (identity-checked, as ids can be reused).
+        """
+        cached = self._persona_blocks.get(id(persona))
+        if cached is not None and cached[0] is persona:
+            return cached[1]
 
         forbidden = ", ".join(persona.get("forbidden_keywords", []))
         preferences = ", ".join(persona.get("preference_keywords", []))
@@ -189,134 +681,151 @@ class VertexAIEvaluator:
         flavors = ", ".join(persona.get("preferences", {}).get("flavor_profile", []))
         restrictions = ", ".join(persona.get("dietary_restrictions", []))
 
-        return f"""You are evaluating two recipe generation models for persona alignment.
-
-**Persona Profile:**
+        persona_block = f"""**Persona Profile:**
 Name: {persona['name']}
 Preferred Cuisines: {cuisines}
 Flavor Profile: {flavors}
 Cooking Style: {persona.get('preferences', {}).get('cooking_style', 'any')}
 Dietary Restrictions: {restrictions or 'None'}
 Forbidden Ingredients: {forbidden or 'None'}
-Preferred Keywords: {preferences}
-
-**Context:**
-Available Inventory: {', '.join(inventory)}
-User Request: {user_request}
-
-**Recipe A (SFT Baseline Model):**
-```json
-{recipe_sft}
-```
-
-**Recipe B (DPO Persona Model):**
-```json
-{recipe_dpo}
-```
+Preferred Keywords: {preferences}"""
 
-**Evaluation Task:**
+        self._persona_blocks[id(persona)] = (persona, persona_block)
+        return persona_block
 
-Rate each recipe on the following criteria (0-10 scale):
-
-1. **Persona Alignment** (0-10): Does the recipe match the persona's cuisine and style preferences?
-2. **Constraint Compliance** (0-10): Does it avoid forbidden ingredients and respect dietary restrictions?
-3. **Preferred Ingredients** (0-10): Does it use ingredients the persona prefers?
-4. **Recipe Quality** (0-10): Is it practical, well-structured, and coherent?
-5. **Overall Fit** (0-10): How well does this recipe represent the persona?
-
-**Important Evaluation Guidelines:**
-- Forbidden ingredients are CRITICAL violations (deduct heavily)
-- Dietary restrictions must be respected (vegetarian, vegan, gluten-free, etc.)
-- Preferred cuisine match is important but not required if inventory doesn't support it
-- Recipe quality matters: clear steps, reasonable ingredient amounts, coherent instructions
-
-**Output Format (JSON only):**
-```json
-{{
-  "recipe_a_scores": {{
-    "persona_alignment": <0-10>,
-    "constraint_compliance": <0-10>,
-    "preferred_ingredients": <0-10>,
-    "recipe_quality": <0-10>,
-    "overall_fit": <0-10>
-  }},
-  "recipe_b_scores": {{
-    "persona_alignment": <0-10>,
-    "constraint_compliance": <0-10>,
-    "preferred_ingredients": <0-10>,
-    "recipe_quality": <0-10>,
-    "overall_fit": <0-10>
-  }},
-  "winner": "A" or "B",
-  "confidence": "high" or "medium" or "low",
-  "reasoning": "Brief explanation of why the winner is better (2-3 sentences)",
-  "violations_found": {{
-    "recipe_a": ["list of forbidden ingredients found, if any"],
-    "recipe_b": ["list of forbidden ingredients found, if any"]
-  }}
-}}
-```
-
-**Confidence Guidelines:**
-- "high": Clear winner, score difference > 3 points
-- "medium": Noticeable difference, score difference 2-3 points
-- "low": Very similar, score difference < 2 points
+    def _pair_block(
+        self,
+        recipe_sft: str,
+        recipe_dpo: str,
+        inventory: List[str],
+        user_request: str
+    ) -> str:
+        """Context and recipe sections for one SFT/DPO pair"""
+        context, recipe_a, recipe_b, end = _PAIR_SEGMENTS
+        return "".join((
+            context, ", ".join(inventory),
+            "\nUser Request: ", user_request,
+            recipe_a, self._recipe_text(recipe_sft),
+            recipe_b, self._recipe_text(recipe_dpo),
+            end,
+        ))
+
+    @staticmethod
+    def _recipe_text(recipe) -> str:
+        """
+        Recipe as compact prompt text
 
-IMPORTANT: Respond with ONLY valid JSON. No additional text before or after."""
+        Indentation only costs input tokens, so recipes are re-emitted as
+        minimal JSON after _shrink_recipe; strings that are not valid JSON
+        are used as-is.
+        """
+        if isinstance(recipe, str):
+            try:
+                recipe = orjson.loads(recipe)
+            except orjson.JSONDecodeError:
+                return recipe
+        try:
+            return orjson.dumps(_shrink_recipe(recipe)).decode()
+        except TypeError:
+            return str(recipe)
 
     def _parse_evaluation(self, response_text: str) -> Dict:
         """Parse evaluation response from Vertex AI"""
         try:
             # Extract JSON from response
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                evaluation_data = json.loads(json_match.group(0))
-
-                # Calculate average scores
-                recipe_a_scores = evaluation_data.get("recipe_a_scores", {})
-                recipe_b_scores = evaluation_data.get("recipe_b_scores", {})
-
-                sft_avg = sum(recipe_a_scores.values()) / len(recipe_a_scores) if recipe_a_scores else 0
-                dpo_avg = sum(recipe_b_scores.values()) / len(recipe_b_scores) if recipe_b_scores else 0
-
-                # Determine winner
-                winner_letter = evaluation_data.get("winner", "").upper()
-                winner = "sft" if winner_letter == "A" else "dpo" if winner_letter == "B" else "unknown"
-
-                return {
-                    "winner": winner,
-                    "sft_score": round(sft_avg, 2),
-                    "dpo_score": round(dpo_avg, 2),
-                    "sft_scores_detail": recipe_a_scores,
-                    "dpo_scores_detail": recipe_b_scores,
-                    "confidence": evaluation_data.get("confidence", "unknown"),
-                    "reasoning": evaluation_data.get("reasoning", ""),
-                    "violations": evaluation_data.get("violations_found", {"recipe_a": [], "recipe_b": []}),
-                    "raw_evaluation": evaluation_data
-                }
+            json_text = _extract_json_object(response_text)
+            if json_text:
+                return self._evaluation_from_data(orjson.loads(json_text))
             else:
                 raise ValueError("No JSON found in response")
 
         except Exception as e:
-            print(f"⚠️  Parse error: {e}")
-            print(f"Response text: {response_text[:200]}...")
-
-            return {
-                "winner": "unknown",
-                "sft_score": 0,
-                "dpo_score": 0,
-                "confidence": "none",
-                "reasoning": f"Failed to parse response: {e}",
-                "violations": {"recipe_a": [], "recipe_b": []},
-                "parse_error": str(e),
-                "raw_response": response_text[:500]
-            }
+            return self._parse_failure(e, response_text)
+
+    def _parse_batch_evaluation(self, response_text: str, num_pairs: int) -> List[Dict]:
+        """Parse a batched response and dispatch results back by pair_id"""
+        try:
+            json_text = _extract_json_object(response_text)
+            if not json_text:
+                raise ValueError("No JSON found in response")
+            results = orjson.loads(json_text).get("results", [])
+        except Exception as e:
+            failure = self._parse_failure(e, response_text)
+            return [dict(failure, evaluator=self.evaluator_name) for _ in range(num_pairs)]
+
+        by_pair = {}
+        for position, item in enumerate(results, start=1):
+            if isinstance(item, dict):
+                # Models sometimes echo the id as a string ("1")
+                try:
+                    pair_id = int(item.get("pair_id", position))
+                except (TypeError, ValueError):
+                    pair_id = position
+                by_pair[pair_id] = item
+
+        evaluations = []
+        for pair_id in range(1, num_pairs + 1):
+            try:
+                if pair_id not in by_pair:
+                    raise ValueError(f"No result for pair {pair_id}")
+                evaluation = self._evaluation_from_data(by_pair[pair_id])
+            except Exception as e:
+                evaluation = self._parse_failure(e, response_text)
+            evaluation["evaluator"] = self.evaluator_name
+            evaluations.append(evaluation)
+
+        return evaluations
+
+    @staticmethod
+    def _evaluation_from_data(evaluation_data: Dict) -> Dict:
+        """Convert one evaluator JSON object into an evaluation result"""
+        # Calculate average scores
+        recipe_a_scores = evaluation_data.get("recipe_a_scores", {})
+        recipe_b_scores = evaluation_data.get("recipe_b_scores", {})
+
+        sft_avg = sum(recipe_a_scores.values()) / len(recipe_a_scores) if recipe_a_scores else 0
+        dpo_avg = sum(recipe_b_scores.values()) / len(recipe_b_scores) if recipe_b_scores else 0
+
+        # Determine winner
+        winner_letter = evaluation_data.get("winner", "").upper()
+        winner = "sft" if winner_letter == "A" else "dpo" if winner_letter == "B" else "unknown"
+
+        return {
+            "winner": winner,
+            "sft_score": round(sft_avg, 2),
+            "dpo_score": round(dpo_avg, 2),
+            "sft_scores_detail": recipe_a_scores,
+            "dpo_scores_detail": recipe_b_scores,
+            "confidence": evaluation_data.get("confidence", "unknown"),
+            "reasoning": evaluation_data.get("reasoning", ""),
+            "violations": evaluation_data.get("violations_found", {"recipe_a": [], "recipe_b": []}),
+            "raw_evaluation": evaluation_data
+        }
+
+    @staticmethod
+    def _parse_failure(error: Exception, response_text: str) -> Dict:
+        """Evaluation result recorded when a response cannot be parsed"""
+        print(f"⚠️  Parse error: {error}")
+        print(f"Response text: {response_text[:200]}...")
+
+        return {
+            "winner": "unknown",
+            "sft_score": 0,
+            "dpo_score": 0,
+            "confidence": "none",
+            "reasoning": f"Failed to parse response: {error}",
+            "violations": {"recipe_a": [], "recipe_b": []},
+            "parse_error": str(error),
+            "raw_response": response_text[:500]
+        }
 
     def batch_evaluate(
         self,
         test_cases: List[Dict],
         persona_config: Dict,
-        verbose: bool = True
+        verbose: bool = True,
+        max_concurrency: int = 16,
+        pairs_per_request: int = 1
     ) -> List[Dict]:
         """
         Evaluate multiple test cases for a persona
@@ -329,33 +838,82 @@ IMPORTANT: Respond with ONLY valid JSON. No additional text before or after."""
                 - user_request: user's request
             persona_config: Persona definition
             verbose: Print progress
+            max_concurrency: Maximum Vertex AI requests in flight at once
+            pairs_per_request: Test cases evaluated per Vertex AI request
+                (1 keeps one judgment per prompt; larger values trade some
+                judging independence for fewer requests)
 
         Returns:
-            List of evaluation results
+            List of evaluation results (in test case order)
+
+        Raises:
+            RuntimeError: If called from inside a running event loop
+                (await abatch_evaluate there instead)
         """
-        results = []
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError(
+                "batch_evaluate() cannot run inside an active event loop; "
+                "use 'await evaluator.abatch_evaluate(...)' instead"
+            )
 
-        for i, case in enumerate(test_cases):
-            if verbose:
-                print(f"  [{i+1}/{len(test_cases)}] Evaluating with {self.evaluator_name}...", end="\r")
-
-            evaluation = self.evaluate_recipe_pair(
-                persona_config=persona_config,
-                recipe_sft=case["recipe_sft"],
-                recipe_dpo=case["recipe_dpo"],
-                inventory=case["inventory"],
-                user_request=case["user_request"]
+        return asyncio.run(
+            self.abatch_evaluate(
+                test_cases, persona_config, verbose, max_concurrency, pairs_per_request
             )
+        )
 
+    async def abatch_evaluate(
+        self,
+        test_cases: List[Dict],
+        persona_config: Dict,
+        verbose: bool = True,
+        max_concurrency: int = 16,
+        pairs_per_request: int = 1
+    ) -> List[Dict]:
+        """Async variant of batch_evaluate, issuing requests concurrently"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        pairs_per_request = max(1, pairs_per_request)
+        chunks = [
+            test_cases[start:start + pairs_per_request]
+            for start in range(0, len(test_cases), pairs_per_request)
+        ]
+        completed = 0
+
+        async def evaluate_chunk(chunk: List[Dict]) -> List[Dict]:
+            nonlocal completed
+            async with semaphore:
+                evaluations = await self.aevaluate_recipe_pairs_batch(persona_config, chunk)
+            completed += len(chunk)
+            if verbose:
+                print(f"  [{completed}/{len(test_cases)}] Evaluated with {self.evaluator_name}...", end="\r")
+            return evaluations
+
+        chunk_evaluations = await asyncio.gather(
+            *(evaluate_chunk(chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+
+        if verbose:
+            print()  # New line after progress
+
+        evaluations = []
+        for chunk, chunk_result in zip(chunks, chunk_evaluations):
+            if isinstance(chunk_result, Exception):
+                chunk_result = [self._failed_evaluation(chunk_result) for _ in chunk]
+            evaluations.extend(chunk_result)
+
+        results = []
+        for i, (case, evaluation) in enumerate(zip(test_cases, evaluations)):
             results.append({
                 "test_case_id": i + 1,
                 "evaluation": evaluation,
                 "metadata": case.get("metadata", {})
             })
 
-        if verbose:
-            print()  # New line after progress
-
         return results
 
 
@@ -364,16 +922,24 @@ class MultiModelEvaluator:
     Run evaluation across multiple Vertex AI models for cross-validation
     """
 
-    def __init__(self, project_id: str, location: str = "us-central1"):
+    def __init__(
+        self,
+        project_id: str,
+        location: str = "us-central1",
+        cache_path: Optional[str] = None
+    ):
         """
         Initialize multi-model evaluator
 
         Args:
             project_id: GCP project ID
             location: GCP region
+            cache_path: Response cache file shared by all evaluators, e.g.
+                DEFAULT_CACHE_PATH (None disables caching)
         """
         self.project_id = project_id
         self.location = location
+        self.cache_path = cache_path
         self.evaluators = {}
 
     def add_evaluator(self, name: str, model: str):
@@ -387,7 +953,8 @@ class MultiModelEvaluator:
         evaluator = VertexAIEvaluator(
             project_id=self.project_id,
             location=self.location,
-            evaluator_model=model
+            evaluator_model=model,
+            cache_path=self.cache_path
         )
         self.evaluators[name] = evaluator
         return evaluator
@@ -410,45 +977,99 @@ class MultiModelEvaluator:
                 "agreement": {...}
             }
         """
-        evaluations = {}
+        if not self.evaluators:
+            return self._summarize({})
+
+        pair_args = {
+            "persona_config": persona_config,
+            "recipe_sft": recipe_sft,
+            "recipe_dpo": recipe_dpo,
+            "inventory": inventory,
+            "user_request": user_request
+        }
 
-        for name, evaluator in self.evaluators.items():
-            evaluation = evaluator.evaluate_recipe_pair(
-                persona_config=persona_config,
-                recipe_sft=recipe_sft,
-                recipe_dpo=recipe_dpo,
-                inventory=inventory,
-                user_request=user_request
-            )
+        # Evaluators are independent endpoints, so run them side by side
+        with ThreadPoolExecutor(max_workers=len(self.evaluators)) as executor:
+            futures = {
+                name: executor.submit(evaluator.evaluate_recipe_pair, **pair_args)
+                for name, evaluator in self.evaluators.items()
+            }
+            evaluations = {name: future.result() for name, future in futures.items()}
+
+        return self._summarize(evaluations)
+
+    async def aevaluate_with_all(
+        self,
+        persona_config: Dict,
+        recipe_sft: str,
+        recipe_dpo: str,
+        inventory: List[str],
+        user_request: str
+    ) -> Dict:
+        """Async variant of evaluate_with_all (evaluators queried concurrently)"""
+        names = list(self.evaluators)
+        results = await asyncio.gather(
+            *(
+                self.evaluators[name].aevaluate_recipe_pair(
+                    persona_config=persona_config,
+                    recipe_sft=recipe_sft,
+                    recipe_dpo=recipe_dpo,
+                    inventory=inventory,
+                    user_request=user_request
+                )
+                for name in names
+            ),
+            return_exceptions=True
+        )
+
+        evaluations = {}
+        for name, evaluation in zip(names, results):
+            if isinstance(evaluation, Exception):
+                evaluation = self.evaluators[name]._failed_evaluation(evaluation)
             evaluations[name] = evaluation
 
-        # Compute consensus
-        consensus = self._compute_consensus(evaluations)
+        return self._summarize(evaluations)
+
+    def _summarize(self, evaluations: Dict) -> Dict:
+        """Bundle per-evaluator results with consensus and agreement"""
+        # One pass over the evaluations feeds both metrics
+        tally = self._aggregate(evaluations)
 
         return {
             "evaluations": evaluations,
-            "consensus": consensus,
-            "agreement": self._compute_agreement(evaluations)
+            "consensus": self._compute_consensus(tally),
+            "agreement": self._compute_agreement(tally)
         }
 
-    def _compute_consensus(self, evaluations: Dict) -> Dict:
+    @staticmethod
+    def _aggregate(evaluations: Dict) -> Dict:
+        """Count winner votes (ignoring "unknown") in a single pass"""
+        counts = {}
+        for evaluation in evaluations.values():
+            winner = evaluation["winner"]
+            if winner != "unknown":
+                counts[winner] = counts.get(winner, 0) + 1
+
+        return {"counts": counts, "total": sum(counts.values())}
+
+    def _compute_consensus(self, tally: Dict) -> Dict:
         """Compute consensus across evaluators"""
-        winners = [e["winner"] for e in evaluations.values() if e["winner"] != "unknown"]
+        total = tally["total"]
 
-        if not winners:
+        if not total:
             return {"winner": "unknown", "confidence": "none"}
 
         # Count votes
-        sft_votes = winners.count("sft")
-        dpo_votes = winners.count("dpo")
+        sft_votes = tally["counts"].get("sft", 0)
+        dpo_votes = tally["counts"].get("dpo", 0)
 
         # Determine consensus
         if sft_votes > dpo_votes:
             consensus_winner = "sft"
-            confidence = "high" if sft_votes == len(winners) else "medium"
+            confidence = "high" if sft_votes == total else "medium"
         elif dpo_votes > sft_votes:
             consensus_winner = "dpo"
-            confidence = "high" if dpo_votes == len(winners) else "medium"
+            confidence = "high" if dpo_votes == total else "medium"
         else:
             consensus_winner = "tie"
             confidence = "low"
@@ -457,33 +1078,27 @@ class MultiModelEvaluator:
             "winner": consensus_winner,
             "confidence": confidence,
             "votes": {"sft": sft_votes, "dpo": dpo_votes},
-            "agreement_rate": max(sft_votes, dpo_votes) / len(winners) if winners else 0
+            "agreement_rate": max(sft_votes, dpo_votes) / total
         }
 
-    def _compute_agreement(self, evaluations: Dict) -> Dict:
+    def _compute_agreement(self, tally: Dict) -> Dict:
         """Compute agreement metrics across evaluators"""
-        winners = [e["winner"] for e in evaluations.values() if e["winner"] != "unknown"]
+        total = tally["total"]
 
-        if len(winners) < 2:
+        if total < 2:
             return {"agreement": "insufficient_data"}
 
-        # Check if all agree
-        all_agree = len(set(winners)) == 1
-
-        # Check if majority agrees
-        from collections import Counter
-        counts = Counter(winners)
-        majority_winner, majority_count = counts.most_common(1)[0]
+        # Majority is the first winner seen among those with the top count
+        majority_winner, majority_count = max(tally["counts"].items(), key=itemgetter(1))
 
         return {
-            "all_agree": all_agree,
+            "all_agree": len(tally["counts"]) == 1,
             "majority_winner": majority_winner,
             "majority_count": majority_count,
-            "total_evaluators": len(winners),
-            "agreement_rate": majority_count / len(winners) if winners else 0
+            "total_evaluators": total,
+            "agreement_rate": majority_count / total
         }
 
-
 if __name__ == "__main__":
     # Test the evaluator
     import yaml
@@ -1,6 +1,7 @@
 import os
 import argparse
 import subprocess
+from datetime import datetime, timezone
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -46,7 +47,7 @@ def redeploy_service():
     
     # We update a dummy env var to force a fresh revision
     # The container startup command handles the model download
-    timestamp = subprocess.check_output(["date"]).decode().strip()
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     
     cmd = [
         "gcloud", "run", "services", "update", CLOUD_RUN_SERVICE,
@@ -1,8 +1,10 @@
 import os
-import json
+import orjson
 import shutil
 import subprocess
 from datetime import datetime
+from functools import lru_cache
+from google.cloud.storage import Client, transfer_manager
 from sqlalchemy import create_engine, text
 from pathlib import Path
 
@@ -20,6 +22,92 @@ DATA_DIR = Path("/tmp/dpo_data")
 OUTPUT_DIR = Path("/tmp/dpo_model")
 ADAPTER_DIR = Path("/tmp/base_adapter")
 
+# Rows marked as exported per UPDATE statement
+UPDATE_CHUNK_SIZE = 1000
+
+# Trainer output lines that mean the run is lost; the job stops right away
+FATAL_TRAINING_MARKERS = ("CUDA out of memory", "OutOfMemoryError")
+
+# Parallel GCS transfers (I/O bound, so threads rather than processes)
+TRANSFER_WORKERS = int(os.getenv("GCS_TRANSFER_WORKERS", (os.cpu_count() or 1) * 4))
+# Objects at least this large (e.g. merged weight shards) are fetched as
+# concurrent byte ranges instead of a single stream
+LARGE_OBJECT_BYTES = int(os.getenv("GCS_LARGE_OBJECT_MB", "64")) * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 32 * 1024 * 1024
+
+@lru_cache(maxsize=1)
+def _engine():
+    """Single engine (and connection pool) shared by the fetch and update steps."""
+    return create_engine(DB_URL, pool_pre_ping=True, pool_size=2, max_overflow=0)
+
+@lru_cache(maxsize=1)
+def _gcs_client():
+    """Shared storage client so every transfer reuses one authenticated session."""
+    return Client()
+
+def _split_gcs_uri(uri):
+    """Split gs://bucket/some/prefix into ("bucket", "some/prefix")."""
+    bucket_name, _, prefix = uri.removeprefix("gs://").partition("/")
+    return bucket_name, prefix.strip("/")
+
+def _download_dir(source_uri, dest_dir):
+    """Download every object under source_uri into dest_dir (like `cp -r source/* dest`)."""
+    bucket_name, prefix = _split_gcs_uri(source_uri)
+    blob_prefix = f"{prefix}/" if prefix else ""
+    client = _gcs_client()
+
+    blobs = [
+        blob for blob in client.list_blobs(bucket_name, prefix=blob_prefix)
+        if not blob.name.endswith("/")
+    ]
+    if not blobs:
+        raise FileNotFoundError(f"No objects found under {source_uri}")
+
+    small = [blob.name[len(blob_prefix):] for blob in blobs if (blob.size or 0) < LARGE_OBJECT_BYTES]
+    large = [blob for blob in blobs if (blob.size or 0) >= LARGE_OBJECT_BYTES]
+
+    if small:
+        transfer_manager.download_many_to_path(
+            client.bucket(bucket_name),
+            small,
+            destination_directory=str(dest_dir),
+            blob_name_prefix=blob_prefix,
+            max_workers=TRANSFER_WORKERS,
+            worker_type=transfer_manager.THREAD,
+            raise_exception=True,
+        )
+
+    for blob in large:
+        filename = Path(dest_dir) / blob.name[len(blob_prefix):]
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        transfer_manager.download_chunks_concurrently(
+            blob,
+            str(filename),
+            chunk_size=DOWNLOAD_CHUNK_BYTES,
+            max_workers=TRANSFER_WORKERS,
+            worker_type=transfer_manager.THREAD,
+        )
+
+def _upload_dir(source_dir, dest_uri):
+    """Upload every file under source_dir to dest_uri (like `cp -r source/* dest`)."""
+    bucket_name, prefix = _split_gcs_uri(dest_uri)
+    source_dir = Path(source_dir)
+    filenames = [
+        str(path.relative_to(source_dir))
+        for path in source_dir.rglob("*")
+        if path.is_file()
+    ]
+
+    transfer_manager.upload_many_from_filenames(
+        _gcs_client().bucket(bucket_name),
+        filenames,
+        source_directory=str(source_dir),
+        blob_name_prefix=f"{prefix}/" if prefix else "",
+        max_workers=TRANSFER_WORKERS,
+        worker_type=transfer_manager.THREAD,
+        raise_exception=True,
+    )
+
 def fetch_data_from_db():
     print(" [1/5] Fetching training data from DB...")
     
@@ -28,7 +116,7 @@ def fetch_data_from_db():
         print("   Checking env for DB_URL... Not found.")
         return None, []
 
-    engine = create_engine(DB_URL)
+    engine = _engine()
     query = text("""
         SELECT id, prompt, chosen_variant, rejected_variant, variant_a_raw, variant_b_raw 
         FROM recipe_preferences 
@@ -36,57 +124,57 @@ def fetch_data_from_db():
         AND chosen_variant IS NOT NULL
     """)
 
-    with engine.begin() as conn:
-        result = conn.execute(query)
-        rows = result.fetchall()
-
-    if not rows:
-        print("   No new data found in DB.")
-        return None, []
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    train_file = DATA_DIR / f"{PERSONA_ID}_dpo_train.jsonl"
 
-    # Format data
-    dpo_data = []
+    # Stream rows from a server-side cursor and filter + write them in one
+    # pass, so memory stays flat however large the table grows
     ids = []
+    total = 0
     skipped = 0
-    for row in rows:
-        # Simplified logic assuming A/B structure matches
-        if row.chosen_variant == "A":
-            chosen = row.variant_a_raw
-            rejected = row.variant_b_raw
-        else:
-            chosen = row.variant_b_raw
-            rejected = row.variant_a_raw
-        
-        # Skip records with missing or empty data (None, empty string, or whitespace)
-        if not chosen or not chosen.strip():
-            skipped += 1
-            continue
-        if not rejected or not rejected.strip():
-            skipped += 1
-            continue
-        if not row.prompt or not row.prompt.strip():
-            skipped += 1
-            continue
+    with engine.connect() as conn, open(train_file, 'wb', buffering=1 << 20) as f:
+        result = conn.execution_options(stream_results=True, yield_per=1000).execute(query)
+        for row in result:
+            total += 1
+
+            # Simplified logic assuming A/B structure matches
+            if row.chosen_variant == "A":
+                chosen = row.variant_a_raw
+                rejected = row.variant_b_raw
+            else:
+                chosen = row.variant_b_raw
+                rejected = row.variant_a_raw
             
-        ids.append(row.id)
-        dpo_data.append({"prompt": row.prompt.strip(), "chosen": chosen.strip(), "rejected": rejected.strip()})
+            # Skip records with missing or empty data (None, empty string, or whitespace)
+            if not chosen or not chosen.strip():
+                skipped += 1
+                continue
+            if not rejected or not rejected.strip():
+                skipped += 1
+                continue
+            if not row.prompt or not row.prompt.strip():
+                skipped += 1
+                continue
+                
+            ids.append(row.id)
+            item = {"prompt": row.prompt.strip(), "chosen": chosen.strip(), "rejected": rejected.strip()}
+            f.write(orjson.dumps(item))
+            f.write(b"\n")
+
+    if not total:
+        train_file.unlink()
+        print("   No new data found in DB.")
+        return None, []
 
     if skipped > 0:
         print(f"   Skipped {skipped} records with missing data.")
     
-    if not dpo_data:
+    if not ids:
+        train_file.unlink()
         print("   No valid training data after filtering.")
         return None, []
-
-    # Save to JSONL
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    train_file = DATA_DIR / f"{PERSONA_ID}_dpo_train.jsonl"
-    
-    with open(train_file, 'w') as f:
-        for item in dpo_data:
-            f.write(json.dumps(item) + "\n")
             
-    print(f"   Fetched {len(dpo_data)} valid records.")
+    print(f"   Fetched {len(ids)} valid records.")
     return train_file, ids
 
 def get_latest_trained_model():
@@ -94,25 +182,36 @@ def get_latest_trained_model():
     print("   Checking for existing trained models...")
     
     try:
-        # List all versions in the model bucket
-        result = subprocess.run(
-            ["gcloud", "storage", "ls", GCS_MODEL_BUCKET],
-            capture_output=True, text=True, check=True
+        # List all versions in the model bucket (top-level "directories").
+        # Only prefixes are requested, so this is one small metadata call
+        bucket_name, prefix = _split_gcs_uri(GCS_MODEL_BUCKET)
+        blobs = _gcs_client().list_blobs(
+            bucket_name,
+            prefix=f"{prefix}/" if prefix else "",
+            delimiter="/",
+            fields="prefixes,nextPageToken",
         )
-        
-        versions = [line.strip().rstrip('/') for line in result.stdout.strip().split('\n') if line.strip()]
+        for _ in blobs.pages:
+            pass  # prefixes are collected while paging
+
+        # Versions are uploaded as v{MODEL_VERSION}/, e.g. v20241211_123456/;
+        # anything else under the bucket root is not a trained model
+        versions = [
+            p.rstrip('/') for p in blobs.prefixes
+            if p.rstrip('/').rsplit('/', 1)[-1].startswith('v')
+        ]
         
         if not versions:
+            print("   No existing trained models found.")
             return None
         
-        # Sort to get latest (versions are like gs://bucket/v20241211_123456)
-        versions.sort(reverse=True)
-        latest = versions[0]
+        # Timestamped names sort chronologically, so the max is the latest
+        latest = f"gs://{bucket_name}/{max(versions)}"
         print(f"   Found latest trained model: {latest}")
         return latest
         
-    except subprocess.CalledProcessError:
-        print("   No existing trained models found.")
+    except Exception as e:
+        print(f"   Could not list existing trained models: {e}")
         return None
 
 def download_base_adapter():
@@ -132,13 +231,12 @@ def download_base_adapter():
         print(f"   No previous training found. Using original: {source}")
     
     print(f"   Downloading from {source}...")
-    cmd = ["gcloud", "storage", "cp", "-r", f"{source}/*", str(ADAPTER_DIR)]
     
     try:
-        subprocess.run(cmd, check=True)
+        _download_dir(source, ADAPTER_DIR)
         print(f"   Adapter downloaded to {ADAPTER_DIR}")
         return ADAPTER_DIR
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"   Failed to download adapter: {e}")
         raise
 
@@ -161,11 +259,25 @@ def run_training(train_file, adapter_path):
     ]
     
     try:
-        subprocess.run(cmd, check=True)
+        # Stream the trainer's output as it runs so progress shows up in the
+        # job logs, and stop early on failures that cannot recover
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+        )
+        with proc:
+            for line in proc.stdout:
+                print(line, end="", flush=True)
+                if any(marker in line for marker in FATAL_TRAINING_MARKERS):
+                    proc.terminate()
+                    raise RuntimeError(f"Training aborted: {line.strip()}")
+
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+
         print("   Training successful.")
         # The script creates a subdir {persona}_v1.0
         return OUTPUT_DIR / f"{PERSONA_ID}_v1.0"
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, RuntimeError) as e:
         print(f"   Training failed: {e}")
         raise
 
@@ -175,12 +287,10 @@ def upload_model(model_path):
     print(f" [3/5] Uploading model to {versioned_model_path}...")
     
     # Upload model
-    cmd = ["gcloud", "storage", "cp", "-r", f"{model_path}/*", versioned_model_path]
-    
     try:
-        subprocess.run(cmd, check=True)
+        _upload_dir(model_path, versioned_model_path)
         print(f"   Model uploaded to {versioned_model_path}")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"   Model upload failed: {e}")
         raise
 
@@ -189,23 +299,24 @@ def backup_training_data():
     versioned_data_path = f"{GCS_DATA_BUCKET}/training_data/v{MODEL_VERSION}"
     print(f" [4/5] Backing up training data to {versioned_data_path}...")
     
-    cmd = ["gcloud", "storage", "cp", "-r", f"{DATA_DIR}/*", versioned_data_path]
-    
     try:
-        subprocess.run(cmd, check=True)
+        _upload_dir(DATA_DIR, versioned_data_path)
         print(f"   Data backed up to {versioned_data_path}")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"   Data backup failed: {e}")
         # Don't fail the job for data backup issues
         pass
 
 def update_db_status(ids):
     print(" [5/6] Updating DB status...")
-    engine = create_engine(DB_URL)
+    engine = _engine()
     
-    query = text("UPDATE recipe_preferences SET exported_for_training = TRUE WHERE id IN :ids")
+    # Array parameter per chunk keeps each statement small and well under
+    # Postgres' bind-parameter limit; all chunks commit together
+    query = text("UPDATE recipe_preferences SET exported_for_training = TRUE WHERE id = ANY(:ids)")
     with engine.begin() as conn:
-        conn.execute(query, {"ids": tuple(ids)})
+        for start in range(0, len(ids), UPDATE_CHUNK_SIZE):
+            conn.execute(query, {"ids": list(ids[start:start + UPDATE_CHUNK_SIZE])})
     print("   DB Updated.")
 
 def main():
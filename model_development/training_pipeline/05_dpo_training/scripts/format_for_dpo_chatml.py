@@ -2,9 +2,64 @@
 ChatML DPO 페어를 학습 데이터로 변환
 """
 
-import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 import argparse
+import os
+import shutil
+import tempfile
+
+import orjson
+
+
+def _format_persona_file(input_file: Path, tmp_dir: Path) -> dict:
+    """
+    페르소나 파일 하나를 DPO 학습 형식으로 변환해서 페르소나별 임시 파일로 저장 (worker 프로세스에서 실행)
+
+    페어를 메모리에 모으지 않고 읽는 즉시 기록. 같은 페르소나가 여러 입력 파일에 있을 수 있으므로
+    최종 파일은 부모 프로세스가 임시 파일들을 이어붙여서 만듦
+
+    Returns:
+        {persona_id: (pair 수, 임시 파일 경로)}
+    """
+    with open(input_file, 'rb') as f:
+        lines = f.read().split(b"\n")
+
+    writers = {}
+    counts = Counter()
+    try:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            pair = orjson.loads(line)
+
+            # DPO 학습 형식 (간단하게)
+            out_line = orjson.dumps({
+                "prompt": pair['prompt'],  # ChatML prompt (system + user + <|im_start|>assistant)
+                "chosen": pair['chosen'],  # JSON recipe string
+                "rejected": pair['rejected'],  # JSON recipe string
+                # Metadata는 선택사항 (학습에 직접 사용 안 함)
+            }) + b"\n"
+
+            # 페르소나별 분류
+            persona_id = pair['metadata']['persona']
+            writer = writers.get(persona_id)
+            if writer is None:
+                writer = open(tmp_dir / f"{input_file.stem}.{persona_id}.jsonl", 'wb', buffering=1 << 20)
+                writers[persona_id] = writer
+            writer.write(out_line)
+            counts[persona_id] += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return {
+        persona_id: (counts[persona_id], Path(writer.name))
+        for persona_id, writer in writers.items()
+    }
 
 
 def format_for_dpo_training(input_dir: Path, output_dir: Path):
@@ -28,62 +83,67 @@ def format_for_dpo_training(input_dir: Path, output_dir: Path):
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    all_pairs = []
-    persona_pairs = {}
-
-    # 모든 페르소나의 final pairs 로드
-    for input_file in input_dir.glob("*_dpo_pairs.jsonl"):
+    # 모든 페르소나의 final pairs 로드 (파일마다 독립적이므로 프로세스 병렬 처리)
+    with os.scandir(input_dir) as entries:
+        input_files = sorted(
+            Path(entry.path) for entry in entries
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith("_dpo_pairs.jsonl")
+        )
+    for input_file in input_files:
         print(f"\nLoading {input_file.name}...")
 
-        with open(input_file, encoding='utf-8') as f:
-            for line in f:
-                pair = json.loads(line)
-
-                # DPO 학습 형식 (간단하게)
-                dpo_pair = {
-                    "prompt": pair['prompt'],  # ChatML prompt (system + user + <|im_start|>assistant)
-                    "chosen": pair['chosen'],  # JSON recipe string
-                    "rejected": pair['rejected'],  # JSON recipe string
-                    # Metadata는 선택사항 (학습에 직접 사용 안 함)
-                }
-
-                all_pairs.append(dpo_pair)
-
-                # 페르소나별 분류
-                persona = pair['metadata']['persona']
-                if persona not in persona_pairs:
-                    persona_pairs[persona] = []
-                persona_pairs[persona].append(dpo_pair)
-
-    if not all_pairs:
-        print("\nWarning: No DPO pairs found in input directory")
-        return
-
-    # 페르소나별 저장
-    for persona_id, pairs in persona_pairs.items():
-        output_file = output_dir / f"{persona_id}_dpo_train.jsonl"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for pair in pairs:
-                f.write(json.dumps(pair, ensure_ascii=False) + '\n')
-
-        print(f"✅ {persona_id}: {len(pairs)} pairs → {output_file.name}")
-
-    # 전체 통합 (all personas)
-    all_output = output_dir / "all_personas_dpo_train.jsonl"
-    with open(all_output, 'w', encoding='utf-8') as f:
-        for pair in all_pairs:
-            f.write(json.dumps(pair, ensure_ascii=False) + '\n')
-
-    print(f"\n✅ Total: {len(all_pairs)} pairs → {all_output.name}")
+    tmp_dir = Path(tempfile.mkdtemp(dir=output_dir, prefix=".dpo_format_"))
+    try:
+        # 입력 파일 순서대로 {persona_id: (pair 수, 임시 파일)}
+        file_outputs = []
+        if input_files:
+            with ProcessPoolExecutor(max_workers=min(len(input_files), os.cpu_count() or 1)) as executor:
+                file_outputs = list(executor.map(_format_persona_file, input_files, repeat(tmp_dir)))
+
+        # 같은 페르소나가 여러 파일에 있으면 합침 (파일 순서 유지)
+        persona_parts = {}
+        for outputs in file_outputs:
+            for persona_id, (count, tmp_file) in outputs.items():
+                persona_parts.setdefault(persona_id, []).append((count, tmp_file))
+        persona_counts = {
+            persona_id: sum(count for count, _ in parts)
+            for persona_id, parts in persona_parts.items()
+        }
+
+        total = sum(persona_counts.values())
+        if not total:
+            print("\nWarning: No DPO pairs found in input directory")
+            return
+
+        # 페르소나별 저장: 임시 파일을 바이트 그대로 이어붙임 (재직렬화 없음)
+        for persona_id, parts in persona_parts.items():
+            output_file = output_dir / f"{persona_id}_dpo_train.jsonl"
+            with open(output_file, 'wb') as out_f:
+                for _, tmp_file in parts:
+                    with open(tmp_file, 'rb') as in_f:
+                        shutil.copyfileobj(in_f, out_f, 1 << 20)
+            print(f"✅ {persona_id}: {persona_counts[persona_id]} pairs → {output_file.name}")
+
+        # 전체 통합 (all personas): 입력 파일 순서대로 이어붙임
+        all_output = output_dir / "all_personas_dpo_train.jsonl"
+        with open(all_output, 'wb') as out_f:
+            for outputs in file_outputs:
+                for _, tmp_file in outputs.values():
+                    with open(tmp_file, 'rb') as in_f:
+                        shutil.copyfileobj(in_f, out_f, 1 << 20)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"\n✅ Total: {total} pairs → {all_output.name}")
 
     # 통계
     print(f"\n{'='*60}")
     print("Dataset Statistics:")
     print(f"{'='*60}")
-    for persona_id, pairs in persona_pairs.items():
-        print(f"  {persona_id}: {len(pairs)} pairs")
+    for persona_id, count in persona_counts.items():
+        print(f"  {persona_id}: {count} pairs")
     print(f"{'='*60}")
-    print(f"  Total: {len(all_pairs)} pairs")
+    print(f"  Total: {total} pairs")
     print(f"{'='*60}\n")
 
 
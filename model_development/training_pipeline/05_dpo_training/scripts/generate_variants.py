@@ -3,21 +3,42 @@
 GPT-4가 나중에 chosen/rejected 결정
 """
 
+import numpy as np
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, GenerationConfig
 from peft import PeftModel
 import yaml
 import json
 from typing import Dict, List
 from tqdm import tqdm
-import random
 from pathlib import Path
 import argparse
+import copy
+import queue
+import threading
+import importlib.util
+
+
+# 인벤토리 샘플링용 재료 풀 (모두 소문자)
+ALL_INGREDIENTS = (
+    "tofu", "chicken", "beef", "pork", "salmon", "shrimp", "eggs",
+    "rice", "pasta", "bread", "quinoa", "couscous", "flour", "noodles",
+    "onion", "garlic", "tomato", "bell pepper", "broccoli", "carrot",
+    "spinach", "mushroom", "lettuce", "cucumber", "potato", "corn",
+    "olive oil", "butter", "cheese", "milk", "yogurt",
+    "soy sauce", "salt", "pepper", "ginger", "basil", "oregano",
+    "beans", "lentils", "chickpeas", "avocado", "lime", "cilantro",
+    "eggplant", "zucchini", "cabbage", "kale", "cauliflower",
+    "green beans", "peas", "celery", "leek", "scallion"
+)
+ALL_INGREDIENTS_SET = frozenset(ALL_INGREDIENTS)
 
 
 class VariantGenerator:
-    def __init__(self, base_model_path: str, adapter_path: str, personas_config: str):
+    def __init__(self, base_model_path: str, adapter_path: str, personas_config: str,
+                 backend: str = "hf", load_in_4bit: bool = False, compile_model: bool = False):
         print(f"Loading model from {base_model_path} with adapter {adapter_path}...")
+        self.backend = backend
 
         # Device 설정 (MPS for M1/M2 Mac)
         if torch.backends.mps.is_available():
@@ -33,15 +54,67 @@ class VariantGenerator:
         # 모델 로드
         self.tokenizer = AutoTokenizer.from_pretrained(base_model_path)
         self.tokenizer.pad_token = self.tokenizer.eos_token
+        # Left padding so batched prompts all end where generation starts
+        self.tokenizer.padding_side = "left"
+        self._im_end_id = self.tokenizer.convert_tokens_to_ids("<|im_end|>")
+        # Producer thread 전용 tokenizer: fast tokenizer는 thread-safe하지 않아서
+        # main thread의 decode와 동시에 쓰면 "Already borrowed" 에러가 남
+        self._producer_tokenizer = copy.deepcopy(self.tokenizer)
+        self._generation_configs = {}
+
+        # bf16 where supported (numerically safer for sampling), fp16 otherwise
+        # (MPS bf16 depends on the macOS version); weights load straight onto
+        # the device instead of via a full CPU copy
+        if self.device.type == "cuda" and torch.cuda.is_bf16_supported():
+            dtype = torch.bfloat16
+        else:
+            dtype = torch.float16
 
-        self.base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_path,
-            torch_dtype=torch.float16,
-            low_cpu_mem_usage=True
-        )
-        self.model = PeftModel.from_pretrained(self.base_model, adapter_path)
-        self.model = self.model.to(self.device)
-        self.model.eval()
+        # Fused attention kernels: FlashAttention-2 on CUDA when installed, PyTorch SDPA otherwise.
+        # --compile needs the static KV cache, which Llama's FlashAttention-2 path rejects -> SDPA
+        if (not compile_model and self.device.type == "cuda"
+                and importlib.util.find_spec("flash_attn") is not None):
+            attn_implementation = "flash_attention_2"
+        else:
+            attn_implementation = "sdpa"
+
+        # NF4 4-bit 양자화 (bitsandbytes, CUDA 전용): decode가 weight 읽기에 묶여 있으므로
+        # weight 크기를 ~1/4로 줄이면 속도/메모리 모두 이득. LoRA adapter는 그 위에 적용
+        quantization_config = None
+        if load_in_4bit and backend == "hf":
+            if self.device.type != "cuda":
+                raise RuntimeError("--load_in_4bit requires a CUDA GPU (bitsandbytes)")
+            quantization_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=dtype,
+                bnb_4bit_use_double_quant=True
+            )
+            print("🚀 Loading base model in 4-bit NF4")
+
+        if backend == "vllm":
+            self._load_vllm(base_model_path, adapter_path)
+        else:
+            self.base_model = AutoModelForCausalLM.from_pretrained(
+                base_model_path,
+                torch_dtype=dtype,
+                device_map={"": self.device},
+                attn_implementation=attn_implementation,
+                quantization_config=quantization_config,
+                low_cpu_mem_usage=True
+            )
+            self.model = PeftModel.from_pretrained(self.base_model, adapter_path, is_trainable=False)
+            self.model.eval()
+
+        # torch.compile + StaticCache: 고정 shape의 decode step을 CUDA graph로 캡처해서
+        # 토큰마다의 kernel launch 오버헤드 제거 (MPS는 CUDA graph가 없으므로 aot_eager)
+        self.compiled = compile_model and backend == "hf"
+        if self.compiled:
+            if self.device.type == "cuda":
+                self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", fullgraph=False)
+            else:
+                self.model.forward = torch.compile(self.model.forward, backend="aot_eager")
+            print("🚀 Compiled model forward (static KV cache)")
 
         print("✅ Model loaded successfully")
 
@@ -51,29 +124,85 @@ class VariantGenerator:
 
         print(f"✅ Loaded {len(self.personas)} personas")
 
+        self.rng = np.random.default_rng()
+
+        # 페르소나별 호환 재료 풀 미리 계산
+        self._inventory_pools = {
+            persona['name']: self._build_inventory_pool(persona)
+            for persona in self.personas.values()
+        }
+
+        # (persona name, enforce_constraints)별 system prompt / system 블록 토큰 + KV cache
+        self._system_prompts = {}
+        self._system_prefixes = {}
+
+    def _load_vllm(self, base_model_path: str, adapter_path: str):
+        """
+        vLLM backend (CUDA only): paged KV cache, continuous batching and
+        prefix caching, so the A/B prompts of a batch share their common
+        ChatML prefix. The SFT adapter is applied per request via LoRA.
+        """
+        if self.device.type != "cuda":
+            raise RuntimeError("The vllm backend requires a CUDA GPU; use --backend hf")
+        try:
+            from vllm import LLM, SamplingParams
+            from vllm.lora.request import LoRARequest
+        except ImportError as e:
+            raise ImportError("The vllm backend requires vLLM: pip install vllm") from e
+
+        with open(Path(adapter_path) / "adapter_config.json") as f:
+            lora_rank = json.load(f).get("r", 16)
+
+        self.llm = LLM(
+            model=base_model_path,
+            dtype="bfloat16",
+            enable_lora=True,
+            max_lora_rank=lora_rank,
+            enable_prefix_caching=True
+        )
+        self._sampling_params = SamplingParams
+        self._lora_request = LoRARequest("sft", 1, adapter_path)
+
     def create_user_message(self, inventory: List[str], persona: Dict) -> str:
         """
         페르소나 기반 user message 생성
         """
-        inventory_str = ", ".join(inventory)
-        message = f"I have {inventory_str}."
-
-        # 페르소나 선호도 반영
-        if persona.get('preferences', {}).get('cuisine'):
-            cuisine = random.choice(persona['preferences']['cuisine'])
-            message += f" I want a {cuisine} recipe."
-
-        # 식이 제약 반영
-        if persona.get('dietary_restrictions'):
-            restriction = random.choice(persona['dietary_restrictions'])
-            phrasing = random.choice([
-                f" I want a {restriction} recipe.",
-                f" I'm {restriction}, what can I cook?",
-                f" {restriction.capitalize()} recipe please."
-            ])
-            message += phrasing
+        return self._draw_user_messages([inventory], persona)[0]
 
-        return message
+    def _draw_user_messages(self, inventories: List[List[str]], persona: Dict) -> List[str]:
+        """
+        배치 전체의 user message 생성 (cuisine/restriction/phrasing 인덱스를 한 번에 추출)
+        """
+        size = len(inventories)
+        cuisines = persona.get('preferences', {}).get('cuisine')
+        restrictions = persona.get('dietary_restrictions')
+        cuisine_idx = self.rng.integers(len(cuisines), size=size) if cuisines else None
+        restriction_idx = self.rng.integers(len(restrictions), size=size) if restrictions else None
+        phrasing_idx = self.rng.integers(3, size=size) if restrictions else None
+
+        messages = []
+        for i, inventory in enumerate(inventories):
+            inventory_str = ", ".join(inventory)
+            message = f"I have {inventory_str}."
+
+            # 페르소나 선호도 반영
+            if cuisines:
+                cuisine = cuisines[cuisine_idx[i]]
+                message += f" I want a {cuisine} recipe."
+
+            # 식이 제약 반영
+            if restrictions:
+                restriction = restrictions[restriction_idx[i]]
+                phrasing = (
+                    f" I want a {restriction} recipe.",
+                    f" I'm {restriction}, what can I cook?",
+                    f" {restriction.capitalize()} recipe please."
+                )[phrasing_idx[i]]
+                message += phrasing
+
+            messages.append(message)
+
+        return messages
 
     def create_chatml_prompt(self, user_message: str, persona: Dict,
                             enforce_constraints: bool = True) -> str:
@@ -83,6 +212,17 @@ class VariantGenerator:
         Args:
             enforce_constraints: True면 페르소나 제약 명시, False면 일반적인 프롬프트
         """
+        return self._chatml_system_block(persona, enforce_constraints) + self._chatml_user_block(user_message)
+
+    def _system_prompt(self, persona: Dict, enforce_constraints: bool) -> str:
+        """
+        페르소나별 system prompt (페르소나 + enforce_constraints 조합마다 한 번만 생성)
+        """
+        key = (persona['name'], enforce_constraints)
+        cached = self._system_prompts.get(key)
+        if cached is not None:
+            return cached
+
         # System prompt
         system_prompt = "You are a recipe generation AI that creates recipes based on user inventory and preferences."
 
@@ -114,42 +254,134 @@ class VariantGenerator:
                 forbidden = ", ".join(persona['forbidden_keywords'][:5])
                 system_prompt += f" Do NOT use these ingredients: {forbidden}."
 
-        # ChatML 형식
-        prompt = f"""<|im_start|>system
-{system_prompt}<|im_end|>
-<|im_start|>user
-{user_message}<|im_end|>
-<|im_start|>assistant
-"""
+        self._system_prompts[key] = system_prompt
+        return system_prompt
+
+    def _chatml_system_block(self, persona: Dict, enforce_constraints: bool) -> str:
+        return f"<|im_start|>system\n{self._system_prompt(persona, enforce_constraints)}<|im_end|>\n"
 
-        return prompt
+    @staticmethod
+    def _chatml_user_block(user_message: str) -> str:
+        return f"<|im_start|>user\n{user_message}<|im_end|>\n<|im_start|>assistant\n"
+
+    def _system_prefix(self, persona: Dict, enforce_constraints: bool) -> tuple:
+        """
+        System 블록 토큰 ids (CPU) + prefill된 KV cache (배치 크기 1)
+
+        System 블록은 페르소나마다 동일하므로 (persona, enforce_constraints)마다 한 번만
+        토큰화/prefill 해서 캐시
+        """
+        key = (persona['name'], enforce_constraints)
+        prefix = self._system_prefixes.get(key)
+        if prefix is None:
+            prefix_ids = self.tokenizer(
+                self._chatml_system_block(persona, enforce_constraints), return_tensors="pt"
+            ).input_ids
+            prefix_cache = None
+            # Compiled 모델은 StaticCache를 쓰므로 DynamicCache prefix 재사용은 하지 않음
+            if not self.compiled:
+                with torch.inference_mode():
+                    prefix_cache = self.model(
+                        input_ids=prefix_ids.to(self.model.device), use_cache=True
+                    ).past_key_values
+            prefix = (prefix_ids, prefix_cache)
+            self._system_prefixes[key] = prefix
+        return prefix
+
+    def _encode_chatml(self, user_messages: List[str], persona: Dict, enforce_constraints: bool):
+        """
+        ChatML 프롬프트 배치 토큰화 (CPU에서만 동작하고 producer 전용 tokenizer를 쓰므로 producer thread에서 호출 가능)
+
+        user 블록만 매번 토큰화해 left padding 후 캐시된 system 블록 뒤에 이어붙임.
+        (<|im_end|>\n 경계에서 자르므로 전체 문자열을 토큰화한 결과와 같음;
+        padding은 system 블록과 user 블록 사이에 들어가고 attention mask로 가려짐)
+
+        Returns:
+            (inputs, prefix_cache): prefix_cache는 system 블록의 KV cache
+        """
+        prefix_ids, prefix_cache = self._system_prefix(persona, enforce_constraints)
+
+        suffix = self._producer_tokenizer(
+            [self._chatml_user_block(m) for m in user_messages],
+            add_special_tokens=False, padding=True, return_tensors="pt"
+        )
+        batch_size = suffix["input_ids"].shape[0]
+
+        inputs = {
+            "input_ids": torch.cat([prefix_ids.expand(batch_size, -1), suffix["input_ids"]], dim=1),
+            "attention_mask": torch.cat(
+                [torch.ones_like(prefix_ids).expand(batch_size, -1), suffix["attention_mask"]], dim=1
+            ),
+        }
+        return inputs, prefix_cache
 
     def generate_response(self, prompt: str, temperature: float = 0.7) -> str:
         """
         레시피 생성 (JSON)
         """
-        inputs = self.tokenizer(prompt, return_tensors="pt").to(self.model.device)
+        return self.generate_responses([prompt], temperature=temperature)[0]
+
+    def generate_responses(self, prompts: List[str], temperature: float = 0.7) -> List[str]:
+        """
+        Generate recipes for several prompts in one padded batch
+
+        All rows share one temperature, so callers batch same-temperature
+        prompts together.
+        """
+        if self.backend == "vllm":
+            params = self._sampling_params(
+                temperature=temperature, top_p=0.9, max_tokens=512, stop=["<|im_end|>"]
+            )
+            outputs = self.llm.generate(prompts, params, lora_request=self._lora_request, use_tqdm=False)
+            return [output.outputs[0].text.strip() for output in outputs]
+
+        return self._generate_tokens(self.tokenizer(prompts, return_tensors="pt", padding=True), temperature)
 
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
+    def _generation_config(self, temperature: float) -> GenerationConfig:
+        """
+        Temperature별 GenerationConfig (한 번만 만들어서 재사용)
+        """
+        config = self._generation_configs.get(temperature)
+        if config is None:
+            config = GenerationConfig(
                 max_new_tokens=512,
                 temperature=temperature,
                 top_p=0.9,
                 do_sample=True,
                 pad_token_id=self.tokenizer.eos_token_id,
-                eos_token_id=self.tokenizer.convert_tokens_to_ids("<|im_end|>")
+                eos_token_id=self._im_end_id,
+                cache_implementation="static" if self.compiled else None
             )
+            self._generation_configs[temperature] = config
+        return config
 
-        # Assistant 응답 추출
-        full_response = self.tokenizer.decode(outputs[0], skip_special_tokens=False)
-
-        if "<|im_start|>assistant" in full_response:
-            assistant_response = full_response.split("<|im_start|>assistant")[-1]
-            assistant_response = assistant_response.replace("<|im_end|>", "").strip()
-            return assistant_response
+    def _generate_tokens(self, inputs, temperature: float, prefix_cache=None) -> List[str]:
+        """
+        Sample from already tokenized, left-padded inputs (HF backend)
 
-        return full_response
+        With `prefix_cache` (the KV cache of the shared leading tokens), only
+        the remaining tokens are prefilled; the cache is copied per call since
+        generate extends it in place.
+        """
+        inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        im_end_id = self._im_end_id
+
+        with torch.inference_mode():
+            if prefix_cache is not None:
+                past_key_values = copy.deepcopy(prefix_cache)
+                past_key_values.batch_repeat_interleave(inputs["input_ids"].shape[0])
+                inputs["past_key_values"] = past_key_values
+            outputs = self.model.generate(**inputs, generation_config=self._generation_config(temperature))
+
+        # Assistant 응답 추출 (generated tokens only; rows that finished early
+        # are padded after their <|im_end|>, so cut there)
+        responses = []
+        for row in outputs[:, inputs["input_ids"].shape[1]:].tolist():
+            if im_end_id in row:
+                row = row[:row.index(im_end_id)]
+            responses.append(self.tokenizer.decode(row, skip_special_tokens=False).strip())
+
+        return responses
 
     def generate_2_variants(self, user_message: str, persona: Dict) -> tuple:
         """
@@ -161,23 +393,75 @@ class VariantGenerator:
         Returns:
             (variant_a, variant_b, base_prompt)
         """
-        # Variant A: 제약 강함
-        prompt_a = self.create_chatml_prompt(user_message, persona, enforce_constraints=True)
-        variant_a = self.generate_response(prompt_a, temperature=0.7)
+        return self.generate_variants_batch([user_message], persona)[0]
 
-        # Variant B: 제약 약함 (또는 더 다양한 출력)
-        prompt_b = self.create_chatml_prompt(user_message, persona, enforce_constraints=False)
-        variant_b = self.generate_response(prompt_b, temperature=0.9)
+    def generate_variants_batch(self, user_messages: List[str], persona: Dict,
+                                encoded: tuple = None) -> List[tuple]:
+        """
+        generate_2_variants for several user messages at once
+
+        Each variant kind is one batched generate call (A prompts at 0.7,
+        B prompts at 0.9) instead of two calls per message. `encoded` is the
+        result of _encode_variants when the batch was tokenized ahead of time.
+
+        Returns:
+            [(variant_a, variant_b, base_prompt), ...] in input order
+        """
+        prompts_a = [self.create_chatml_prompt(m, persona, enforce_constraints=True) for m in user_messages]
+
+        if self.backend == "vllm":
+            # vLLM은 prefix caching으로 공통 system 블록을 재사용
+            prompts_b = [self.create_chatml_prompt(m, persona, enforce_constraints=False) for m in user_messages]
+            variants_a = self.generate_responses(prompts_a, temperature=0.7)
+            variants_b = self.generate_responses(prompts_b, temperature=0.9)
+        else:
+            if encoded is None:
+                encoded = self._encode_variants(user_messages, persona)
+            (inputs_a, prefix_cache_a), (inputs_b, prefix_cache_b) = encoded
+
+            # Variant A: 제약 강함 (페르소나 system 블록은 캐시된 KV 재사용)
+            variants_a = self._generate_tokens(inputs_a, temperature=0.7, prefix_cache=prefix_cache_a)
+
+            # Variant B: 제약 약함 (또는 더 다양한 출력)
+            variants_b = self._generate_tokens(inputs_b, temperature=0.9, prefix_cache=prefix_cache_b)
 
         # Base prompt (chosen/rejected 모두에 사용될 프롬프트)
         # Variant A의 prompt 사용 (제약이 명시된 버전)
-        base_prompt = prompt_a
+        return list(zip(variants_a, variants_b, prompts_a))
 
-        return variant_a, variant_b, base_prompt
+    def _encode_variants(self, user_messages: List[str], persona: Dict) -> tuple:
+        """
+        Variant A/B 입력을 한 번에 토큰화 (HF backend)
+        """
+        return (
+            self._encode_chatml(user_messages, persona, enforce_constraints=True),
+            self._encode_chatml(user_messages, persona, enforce_constraints=False)
+        )
 
-    def generate_for_persona(self, persona_id: str, count: int = 500):
+    def _prepare_batches(self, persona: Dict, count: int, batch_size: int, batches: queue.Queue):
         """
-        페르소나별로 500개 × 2 variants 생성
+        Producer: 재료 선택 → user message → 토큰화까지 미리 해서 queue에 넣음
+
+        GPU가 현재 배치를 생성하는 동안 CPU 전처리가 진행되도록 별도 thread에서 실행.
+        끝나면 None, 실패하면 예외 객체를 넣음.
+        """
+        try:
+            for start in range(0, count, batch_size):
+                size = min(batch_size, count - start)
+
+                # 재료 선택 + User message 생성 (배치 단위로 난수 추출)
+                inventories = self._draw_inventories(persona, self.rng.integers(5, 9, size=size))
+                user_messages = self._draw_user_messages(inventories, persona)
+                encoded = self._encode_variants(user_messages, persona) if self.backend == "hf" else None
+
+                batches.put((start, inventories, user_messages, encoded))
+            batches.put(None)
+        except Exception as e:
+            batches.put(e)
+
+    def generate_for_persona(self, persona_id: str, count: int = 500, batch_size: int = 8):
+        """
+        페르소나별로 500개 × 2 variants 생성 (batch_size개씩 묶어서 생성)
         """
         persona = self.personas[persona_id]
         samples = []
@@ -187,75 +471,101 @@ class VariantGenerator:
         print(f"Persona: {persona['name']}")
         print(f"{'='*60}\n")
 
-        for i in tqdm(range(count), desc=f"{persona_id}"):
-            # 재료 선택
-            inventory = self._get_compatible_inventory(persona, count=random.randint(5, 8))
-
-            # User message 생성
-            user_message = self.create_user_message(inventory, persona)
-
-            # 2개 variants 생성
-            try:
-                variant_a, variant_b, base_prompt = self.generate_2_variants(user_message, persona)
-
-                # 저장 (GPT-4가 나중에 chosen/rejected 결정)
-                sample = {
-                    "prompt": base_prompt,
-                    "variant_a": variant_a,
-                    "variant_b": variant_b,
-                    "metadata": {
-                        "persona": persona_id,
-                        "user_message": user_message,
-                        "inventory": inventory
-                    }
-                }
-
-                samples.append(sample)
-            except Exception as e:
-                print(f"\nError generating sample {i}: {e}")
-                continue
+        if self.backend == "hf":
+            # System 블록 prefill은 GPU를 쓰므로 producer 시작 전에 main thread에서 미리 수행
+            self._system_prefix(persona, enforce_constraints=True)
+            self._system_prefix(persona, enforce_constraints=False)
 
+        batches = queue.Queue(maxsize=2)
+        producer = threading.Thread(
+            target=self._prepare_batches, args=(persona, count, batch_size, batches), daemon=True
+        )
+        producer.start()
+
+        with tqdm(total=count, desc=f"{persona_id}") as progress:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                start, inventories, user_messages, encoded = batch
+                size = len(user_messages)
+
+                # 2개 variants 생성
+                try:
+                    variants = self.generate_variants_batch(user_messages, persona, encoded=encoded)
+                except Exception as e:
+                    print(f"\nError generating samples {start}-{start + size - 1}: {e}")
+                    progress.update(size)
+                    continue
+
+                for (variant_a, variant_b, base_prompt), user_message, inventory in zip(
+                    variants, user_messages, inventories
+                ):
+                    # 저장 (GPT-4가 나중에 chosen/rejected 결정)
+                    samples.append({
+                        "prompt": base_prompt,
+                        "variant_a": variant_a,
+                        "variant_b": variant_b,
+                        "metadata": {
+                            "persona": persona_id,
+                            "user_message": user_message,
+                            "inventory": inventory
+                        }
+                    })
+                progress.update(size)
+
+        producer.join()
         return samples
 
     def _get_compatible_inventory(self, persona: Dict, count: int) -> List[str]:
         """
         페르소나 호환 재료 선택
         """
-        all_ingredients = [
-            "tofu", "chicken", "beef", "pork", "salmon", "shrimp", "eggs",
-            "rice", "pasta", "bread", "quinoa", "couscous", "flour", "noodles",
-            "onion", "garlic", "tomato", "bell pepper", "broccoli", "carrot",
-            "spinach", "mushroom", "lettuce", "cucumber", "potato", "corn",
-            "olive oil", "butter", "cheese", "milk", "yogurt",
-            "soy sauce", "salt", "pepper", "ginger", "basil", "oregano",
-            "beans", "lentils", "chickpeas", "avocado", "lime", "cilantro",
-            "eggplant", "zucchini", "cabbage", "kale", "cauliflower",
-            "green beans", "peas", "celery", "leek", "scallion"
-        ]
+        return self._draw_inventories(persona, [count])[0]
+
+    def _draw_inventories(self, persona: Dict, counts) -> List[List[str]]:
+        """
+        배치 전체의 인벤토리 추출 (행마다 독립적인 순열을 한 번에 생성해서 앞에서 count개 사용)
+        """
+        compatible, pref_candidates = self._inventory_pools[persona['name']]
+        size = len(counts)
+
+        # 랜덤 선택 (비복원)
+        order = self.rng.permuted(np.tile(np.arange(len(compatible)), (size, 1)), axis=1)
+
+        # 선호 재료 일부 포함 (30% 확률)
+        include_pref = self.rng.random(size) < 0.3
+        pref_idx = self.rng.integers(len(pref_candidates), size=size) if pref_candidates else None
+
+        inventories = []
+        for i, count in enumerate(counts):
+            selected = [compatible[j] for j in order[i, :count]]
+            if pref_candidates and include_pref[i]:
+                pref_ing = pref_candidates[pref_idx[i]]
+                if pref_ing not in selected and len(selected) > 0:
+                    selected[0] = pref_ing
+            inventories.append(selected)
+
+        return inventories
 
+    @staticmethod
+    def _build_inventory_pool(persona: Dict) -> tuple:
+        """
+        페르소나별 호환 재료 목록 + 선호 재료 후보 (초기화 시 한 번만 계산)
+        """
         # Forbidden keywords 제외
         forbidden = [kw.lower() for kw in persona.get('forbidden_keywords', [])]
         compatible = [
-            ing for ing in all_ingredients
-            if not any(f in ing.lower() for f in forbidden)
+            ing for ing in ALL_INGREDIENTS
+            if not any(f in ing for f in forbidden)
         ]
 
-        # 랜덤 선택
-        if len(compatible) < count:
-            selected = compatible
-        else:
-            selected = random.sample(compatible, count)
-
-        # 선호 재료 일부 포함 (30% 확률)
         preferred = persona.get('preference_keywords', [])
-        if preferred and random.random() < 0.3:
-            pref_candidates = [p for p in preferred if p in all_ingredients]
-            if pref_candidates:
-                pref_ing = random.choice(pref_candidates)
-                if pref_ing not in selected and len(selected) > 0:
-                    selected[0] = pref_ing
+        pref_candidates = [p for p in preferred if p in ALL_INGREDIENTS_SET]
 
-        return selected
+        return compatible, pref_candidates
 
 
 def main():
@@ -272,13 +582,24 @@ def main():
                        help="Number of samples per persona")
     parser.add_argument("--persona", type=str, default=None,
                        help="Generate for specific persona only (optional)")
+    parser.add_argument("--batch_size", type=int, default=8,
+                       help="Samples generated per batched generate call")
+    parser.add_argument("--backend", choices=["hf", "vllm"], default="hf",
+                       help="Generation backend (vllm: CUDA only, much higher throughput)")
+    parser.add_argument("--load_in_4bit", action="store_true",
+                       help="Load the base model in 4-bit NF4 (hf backend, CUDA only)")
+    parser.add_argument("--compile", action="store_true",
+                       help="torch.compile the model with a static KV cache (hf backend)")
     args = parser.parse_args()
 
     # 생성기 초기화
     generator = VariantGenerator(
         args.base_model,
         args.adapter,
-        args.personas_config
+        args.personas_config,
+        backend=args.backend,
+        load_in_4bit=args.load_in_4bit,
+        compile_model=args.compile
     )
 
     # 출력 디렉토리
@@ -300,7 +621,7 @@ def main():
 
     # 각 페르소나별 생성
     for persona_id in personas_to_generate:
-        samples = generator.generate_for_persona(persona_id, args.count)
+        samples = generator.generate_for_persona(persona_id, args.count, args.batch_size)
 
         # 저장
         output_file = output_dir / f"{persona_id}_variants.jsonl"
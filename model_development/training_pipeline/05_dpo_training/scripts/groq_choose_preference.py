@@ -2,36 +2,125 @@
 Groq API (Llama 3.1 70B)로 페르소나 기준으로 variant A/B 중 chosen/rejected 결정
 """
 
-from groq import Groq
+from groq import AsyncGroq
+import asyncio
 import json
+import orjson
 import yaml
 from pathlib import Path
 from tqdm import tqdm
 import argparse
+import hashlib
 import os
-import time
+import re
+
+
+# ChatML prompt에서 첫 user 메시지 추출
+_USER_PAT = re.compile(r'<\|im_start\|>user(.*?)<\|im_end\|>', re.DOTALL)
+
+
+def _clean_variant(variant: str) -> str:
+    """Remove extra tokens like <|eot_id|>, <|start_header_id|>, etc."""
+    # Find the end of JSON (after the closing brace)
+    end = variant.find('}<|')
+    if end != -1:
+        variant = variant[:end + 1]
+    return variant.strip()
+
+
+def _persona_fragment(persona: dict) -> str:
+    """평가 프롬프트의 **User Persona** 블록"""
+    return "\n".join([
+        f"- Name: {persona['name']}",
+        f"- Dietary Restrictions: {persona.get('dietary_restrictions', 'None')}",
+        f"- Forbidden Ingredients: {', '.join(persona.get('forbidden_keywords', []))}",
+        f"- Preferred Cuisines: {', '.join(persona.get('preferences', {}).get('cuisine', []))}",
+        f"- Preference Keywords: {', '.join(persona.get('preference_keywords', []))}",
+    ])
+
+
+def _pair_key(prompt: str, variant_a: str, variant_b: str) -> bytes:
+    """
+    샘플 식별 키 (prompt + 정리된 두 variant의 BLAKE2b)
+
+    chosen/rejected 순서와 무관하도록 두 variant를 정렬해서 해시하므로
+    출력 파일의 (prompt, chosen, rejected)로도 같은 키를 만들 수 있음
+    """
+    first, second = sorted((_clean_variant(variant_a), _clean_variant(variant_b)))
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (prompt, first, second):
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def _processed_keys(output_file: Path, rejected_log: Path) -> set:
+    """
+    이전 실행 결과에서 이미 평가된 샘플 키 수집 (평가 실패한 샘플은 재시도 대상이라 제외)
+    """
+    seen = set()
+    if output_file.exists():
+        with open(output_file, 'rb') as f:
+            for line in f.read().split(b"\n"):
+                if line.strip():
+                    pair = orjson.loads(line)
+                    seen.add(_pair_key(pair['prompt'], pair['chosen'], pair['rejected']))
+    if rejected_log.exists():
+        with open(rejected_log, 'rb') as f:
+            for line in f.read().split(b"\n"):
+                if line.strip():
+                    entry = orjson.loads(line)
+                    if entry['reason'] != "evaluation_failed":
+                        sample = entry['sample']
+                        seen.add(_pair_key(sample['prompt'], sample['variant_a'], sample['variant_b']))
+    return seen
+
+
+class AsyncRateLimiter:
+    """
+    Evenly spaced request slots shared by concurrent coroutines
+
+    Each caller reserves the next free slot under a lock and then sleeps
+    until it, so requests leave at most once per `interval` seconds no
+    matter how many are in flight.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            slot = max(self.next_slot, loop.time())
+            self.next_slot = slot + self.interval
+        await asyncio.sleep(max(0.0, slot - loop.time()))
 
 
 class GroqChooser:
-    def __init__(self, api_key: str, personas_config: str):
-        self.client = Groq(api_key=api_key)
-        self.last_request_time = 0
+    def __init__(self, api_key: str, personas_config: str, concurrency: int = 8):
+        self.client = AsyncGroq(api_key=api_key)
         self.min_request_interval = 2.0  # 2 seconds = 30 req/min
+        self.concurrency = concurrency
+        self._rate_limiter = None  # created inside the running event loop
 
         with open(personas_config) as f:
             self.personas = yaml.safe_load(f)['personas']
 
+        # 평가 프롬프트의 페르소나 블록은 페르소나마다 고정이므로 미리 생성
+        self._persona_fragments = {
+            persona['name']: _persona_fragment(persona) for persona in self.personas.values()
+        }
+
         print(f"✅ Loaded {len(self.personas)} personas for evaluation")
-        print(f"📊 Rate limit: 30 req/min (2 sec delay between requests)")
+        print(f"📊 Rate limit: 30 req/min (2 sec delay between requests), up to {concurrency} in flight")
 
-    def _rate_limit(self):
+    async def _rate_limit(self):
         """Rate limiting: 30 requests/minute"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_request_interval:
-            time.sleep(self.min_request_interval - elapsed)
-        self.last_request_time = time.time()
+        await self._rate_limiter.acquire()
 
-    def choose_preference(self, prompt: str, variant_a: str, variant_b: str, persona: dict):
+    async def choose_preference(self, prompt: str, variant_a: str, variant_b: str, persona: dict):
         """
         Groq (Llama 3.1 70B)로 variant A와 B 중 chosen/rejected 결정
 
@@ -40,46 +129,39 @@ class GroqChooser:
         """
 
         # Clean variants (remove extra tokens)
-        def clean_variant(variant: str) -> str:
-            """Remove extra tokens like <|eot_id|>, <|start_header_id|>, etc."""
-            # Find the end of JSON (after the closing brace)
-            if '}<|' in variant:
-                variant = variant.split('}<|')[0] + '}'
-            return variant.strip()
-
-        variant_a = clean_variant(variant_a)
-        variant_b = clean_variant(variant_b)
+        variant_a = _clean_variant(variant_a)
+        variant_b = _clean_variant(variant_b)
 
-        # JSON 파싱
+        # JSON 유효성 확인만 (프롬프트에는 원본 문자열을 그대로 사용)
         try:
-            recipe_a = json.loads(variant_a)
-            recipe_b = json.loads(variant_b)
-        except json.JSONDecodeError as e:
+            orjson.loads(variant_a)
+            orjson.loads(variant_b)
+        except orjson.JSONDecodeError as e:
             return None, None, {"error": "json_decode_failed", "details": str(e)}
 
         # User message 추출
-        user_message = prompt.split('<|im_start|>user')[1].split('<|im_end|>')[0].strip()
+        user_message = _USER_PAT.search(prompt).group(1).strip()
+
+        persona_fragment = self._persona_fragments.get(persona['name'])
+        if persona_fragment is None:
+            persona_fragment = _persona_fragment(persona)
 
         evaluation_prompt = f"""You are an expert recipe evaluator. Given a user's persona and two recipe variants, determine which one better aligns with the persona.
 
 **User Persona:**
-- Name: {persona['name']}
-- Dietary Restrictions: {persona.get('dietary_restrictions', 'None')}
-- Forbidden Ingredients: {', '.join(persona.get('forbidden_keywords', []))}
-- Preferred Cuisines: {', '.join(persona.get('preferences', {}).get('cuisine', []))}
-- Preference Keywords: {', '.join(persona.get('preference_keywords', []))}
+{persona_fragment}
 
 **User Request:**
 {user_message}
 
 **Variant A:**
 ```json
-{json.dumps(recipe_a, indent=2, ensure_ascii=False)}
+{variant_a}
 ```
 
 **Variant B:**
 ```json
-{json.dumps(recipe_b, indent=2, ensure_ascii=False)}
+{variant_b}
 ```
 
 **Evaluation Task:**
@@ -132,12 +214,12 @@ IMPORTANT: You MUST respond with ONLY valid JSON. Do not include any text before
 
         try:
             # Rate limiting
-            self._rate_limit()
+            await self._rate_limit()
 
             # Groq API 호출
             # Updated model: llama-3.1-70b-versatile is decommissioned
             # Using llama-3.3-70b-versatile (newer, better model)
-            chat_completion = self.client.chat.completions.create(
+            chat_completion = await self.client.chat.completions.create(
                 model="llama-3.3-70b-versatile",
                 messages=[
                     {"role": "system", "content": "You are an expert recipe evaluator. You MUST respond with ONLY valid JSON, no additional text."},
@@ -164,77 +246,112 @@ IMPORTANT: You MUST respond with ONLY valid JSON. Do not include any text before
             print(f"\nGroq API Error: {e}")
             return None, None, {"error": str(e)}
 
-    def process_persona_variants(self, input_file: Path, output_file: Path):
+    def process_persona_variants(self, input_file: Path, output_file: Path, resume: bool = True):
         """
         페르소나별 variants를 Groq로 평가하고 chosen/rejected 결정
         """
+        return asyncio.run(self.aprocess_persona_variants(input_file, output_file, resume=resume))
+
+    async def aprocess_persona_variants(self, input_file: Path, output_file: Path, resume: bool = True):
+        """
+        Async variant of process_persona_variants
+
+        Up to `concurrency` Groq calls are in flight at once (still paced by
+        the rate limiter); results are written in input order as soon as all
+        earlier samples are done. With `resume`, samples already in the output
+        or rejected log (other than failed evaluations) are skipped, both files
+        are appended to, and the returned pairs include the earlier ones.
+        """
         # Variants 로드
-        variants = []
-        with open(input_file, encoding='utf-8') as f:
-            for line in f:
-                variants.append(json.loads(line))
+        with open(input_file, 'rb') as f:
+            variants = [orjson.loads(line) for line in f.read().split(b"\n") if line.strip()]
+
+        rejected_log = output_file.parent / f"{output_file.stem}_rejected.jsonl"
+
+        # 이전 실행에서 이미 평가된 샘플 건너뛰기
+        seen = _processed_keys(output_file, rejected_log) if resume else set()
+        total_variants = len(variants)
+        variants = [
+            sample for sample in variants
+            if _pair_key(sample['prompt'], sample['variant_a'], sample['variant_b']) not in seen
+        ]
+        if total_variants > len(variants):
+            print(f"\n⏭️  Skipping {total_variants - len(variants)} already evaluated pairs")
 
         print(f"\nProcessing {len(variants)} variant pairs...")
 
-        final_pairs = []
-        rejected_pairs = []
+        self._rate_limiter = AsyncRateLimiter(self.min_request_interval)
+        semaphore = asyncio.Semaphore(self.concurrency)
 
-        for sample in tqdm(variants, desc="Groq Choosing"):
+        async def evaluate(sample):
             persona_id = sample['metadata']['persona']
             persona = self.personas[persona_id]
 
-            chosen, rejected, evaluation = self.choose_preference(
-                sample['prompt'],
-                sample['variant_a'],
-                sample['variant_b'],
-                persona
-            )
+            async with semaphore:
+                result = await self.choose_preference(
+                    sample['prompt'],
+                    sample['variant_a'],
+                    sample['variant_b'],
+                    persona
+                )
+            return sample, result
 
-            if chosen and rejected:
-                # 품질 체크
-                if evaluation.get('recommendation') == 'use_pair':
-                    # DPO 페어로 저장
-                    final_pairs.append({
-                        "prompt": sample['prompt'],
-                        "chosen": chosen,
-                        "rejected": rejected,
-                        "metadata": {
-                            **sample['metadata'],
-                            "evaluation": evaluation
+        # 이전 실행에서 저장된 페어도 결과에 포함
+        final_pairs = []
+        if resume and output_file.exists():
+            with open(output_file, 'rb') as f:
+                final_pairs = [orjson.loads(line) for line in f.read().split(b"\n") if line.strip()]
+        previous_count = len(final_pairs)
+        rejected_count = 0
+
+        mode = 'a' if resume else 'w'
+        with open(output_file, mode, encoding='utf-8') as out_f, \
+                open(rejected_log, mode, encoding='utf-8') as rejected_f, \
+                tqdm(total=len(variants), desc="Groq Choosing") as progress:
+            # 모두 동시에 시작하되 결과는 입력 순서대로 기록 (출력 파일 순서가 실행마다 같음)
+            tasks = [asyncio.ensure_future(evaluate(sample)) for sample in variants]
+            for task in tasks:
+                sample, (chosen, rejected, evaluation) = await task
+                progress.update(1)
+
+                if chosen and rejected:
+                    # 품질 체크
+                    if evaluation.get('recommendation') == 'use_pair':
+                        # DPO 페어로 저장
+                        pair = {
+                            "prompt": sample['prompt'],
+                            "chosen": chosen,
+                            "rejected": rejected,
+                            "metadata": {
+                                **sample['metadata'],
+                                "evaluation": evaluation
+                            }
                         }
-                    })
+                        final_pairs.append(pair)
+                        out_f.write(json.dumps(pair, ensure_ascii=False) + '\n')
+                        continue
+
+                    reason = "groq_recommendation_reject"
                 else:
-                    rejected_pairs.append({
-                        "reason": "groq_recommendation_reject",
-                        "sample": sample,
-                        "evaluation": evaluation
-                    })
-            else:
-                rejected_pairs.append({
-                    "reason": "evaluation_failed",
+                    reason = "evaluation_failed"
+
+                rejected_count += 1
+                rejected_f.write(json.dumps({
+                    "reason": reason,
                     "sample": sample,
                     "evaluation": evaluation
-                })
-
-        # 저장
-        with open(output_file, 'w', encoding='utf-8') as f:
-            for pair in final_pairs:
-                f.write(json.dumps(pair, ensure_ascii=False) + '\n')
-
-        rejected_log = output_file.parent / f"{output_file.stem}_rejected.jsonl"
-        with open(rejected_log, 'w', encoding='utf-8') as f:
-            for pair in rejected_pairs:
-                f.write(json.dumps(pair, ensure_ascii=False) + '\n')
+                }, ensure_ascii=False) + '\n')
 
         print(f"\n{'='*60}")
-        print(f"✅ Final DPO pairs: {len(final_pairs)}")
-        print(f"❌ Rejected pairs: {len(rejected_pairs)}")
-        print(f"📊 Pass rate: {len(final_pairs)/len(variants)*100:.1f}%")
+        new_pairs = len(final_pairs) - previous_count
+        print(f"✅ Final DPO pairs: {len(final_pairs)} ({new_pairs} new)")
+        print(f"❌ Rejected pairs: {rejected_count}")
+        if variants:
+            print(f"📊 Pass rate: {new_pairs/len(variants)*100:.1f}%")
         print(f"{'='*60}\n")
 
         return final_pairs
 
-
 def main():
     parser = argparse.ArgumentParser(description="Groq (Llama 3.1 70B) chooses chosen/rejected from variants")
     parser.add_argument("--personas_config", default="personas.yaml",
@@ -245,6 +362,10 @@ def main():
                        help="Output directory for DPO pairs")
     parser.add_argument("--persona", type=str, default=None,
                        help="Process specific persona only (optional)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                       help="Maximum Groq requests in flight at once")
+    parser.add_argument("--restart", action="store_true",
+                       help="Ignore previous results and overwrite output files (default: resume)")
     args = parser.parse_args()
 
     # API Key 확인
@@ -257,7 +378,8 @@ def main():
 
     chooser = GroqChooser(
         api_key=api_key,
-        personas_config=args.personas_config
+        personas_config=args.personas_config,
+        concurrency=args.concurrency
     )
 
     input_dir = Path(args.input_dir)
@@ -270,8 +392,14 @@ def main():
         if not input_files[0].exists():
             print(f"Error: File not found: {input_files[0]}")
             return
+    elif input_dir.is_dir():
+        with os.scandir(input_dir) as entries:
+            input_files = sorted(
+                Path(entry.path) for entry in entries
+                if entry.is_file(follow_symlinks=False) and entry.name.endswith("_variants.jsonl")
+            )
     else:
-        input_files = list(input_dir.glob("*_variants.jsonl"))
+        input_files = []
 
     if not input_files:
         print(f"Error: No variant files found in {input_dir}")
@@ -291,7 +419,7 @@ def main():
         print(f"Processing {persona_id}")
         print(f"{'='*60}")
 
-        final_pairs = chooser.process_persona_variants(input_file, output_file)
+        final_pairs = chooser.process_persona_variants(input_file, output_file, resume=not args.restart)
 
         total_final += len(final_pairs)
 
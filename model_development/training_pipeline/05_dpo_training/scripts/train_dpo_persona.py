@@ -3,15 +3,95 @@ DPO (Direct Preference Optimization) 학습 스크립트
 """
 
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig, TrainerCallback
 from peft import PeftModel, LoraConfig, get_peft_model
 from trl import DPOTrainer, DPOConfig
 from datasets import load_dataset
 import yaml
 import argparse
+import hashlib
+import importlib.util
+import numpy as np
+import os
 from pathlib import Path
 
 
+REF_LOGP_COLUMNS = ("ref_chosen_logps", "ref_rejected_logps")
+
+# Gradient checkpointing을 끌 decoder layer 수 (앞/뒤): activation이 작아 recompute 비용만 큼
+CHECKPOINT_SKIP_FIRST = 4
+CHECKPOINT_SKIP_LAST = 2
+
+
+class SelectiveCheckpointingCallback(TrainerCallback):
+    """
+    앞쪽/뒤쪽 decoder layer는 gradient checkpointing 없이 학습 (중간 layer만 recompute)
+
+    Trainer가 학습 시작 직전에 모든 layer에 checkpointing을 켜므로 on_train_begin에서 다시 끔
+    """
+
+    def __init__(self, skip_first: int = CHECKPOINT_SKIP_FIRST, skip_last: int = CHECKPOINT_SKIP_LAST):
+        self.skip_first = skip_first
+        self.skip_last = skip_last
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        layers = model.get_base_model().model.layers
+        skipped = [*layers[:self.skip_first], *layers[len(layers) - self.skip_last:]]
+        for layer in skipped:
+            layer.gradient_checkpointing = False
+        print(f"Gradient checkpointing: {len(layers) - len(skipped)}/{len(layers)} layers")
+
+
+def _ref_logps_cache_file(base_model_path: str, adapter_path: str, train_file: str,
+                          output_dir: str, training_args: DPOConfig) -> Path:
+    """
+    Reference log-prob 캐시 파일 경로
+
+    (base model, adapter, 학습 데이터 내용, 길이 설정)이 같으면 같은 키
+    """
+    digest = hashlib.sha256()
+    for part in (base_model_path, str(Path(adapter_path).resolve()),
+                 training_args.max_length, training_args.max_prompt_length):
+        digest.update(f"{part}\0".encode())
+    digest.update(Path(train_file).read_bytes())
+    return Path(output_dir).parent / ".ref_logps" / f"{digest.hexdigest()[:16]}.npz"
+
+
+def _load_ref_logps(cache_file: Path, dataset):
+    """
+    캐시된 reference log-prob을 train/test split에 컬럼으로 추가 (없거나 크기가 다르면 None)
+    """
+    if not cache_file.exists():
+        return None
+    cached = np.load(cache_file)
+    for split in ("train", "test"):
+        for column in REF_LOGP_COLUMNS:
+            if len(cached[f"{split}_{column}"]) != len(dataset[split]):
+                return None
+
+    for split in ("train", "test"):
+        for column in REF_LOGP_COLUMNS:
+            dataset[split] = dataset[split].add_column(column, cached[f"{split}_{column}"].tolist())
+    return dataset
+
+
+def _save_ref_logps(cache_file: Path, dpo_trainer: DPOTrainer):
+    """
+    학습 중 계산된 reference log-prob 저장 (다음 실행에서 precompute 단계 생략)
+    """
+    splits = {"train": dpo_trainer.train_dataset, "test": dpo_trainer.eval_dataset}
+    if not all(column in data.column_names for data in splits.values() for column in REF_LOGP_COLUMNS):
+        return
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(cache_file, **{
+        f"{split}_{column}": np.asarray(data[column], dtype=np.float32)
+        for split, data in splits.items()
+        for column in REF_LOGP_COLUMNS
+    })
+    print(f"Saved reference log-probs to {cache_file}")
+
+
 def train_dpo_persona(
     base_model_path: str,
     adapter_path: str,
@@ -31,29 +111,30 @@ def train_dpo_persona(
     tokenizer = AutoTokenizer.from_pretrained(base_model_path)
     tokenizer.pad_token = tokenizer.eos_token
 
-    # 4-bit 양자화 설정
+    # 4-bit 양자화 설정 (compute dtype은 학습과 같은 BF16: FP16↔BF16 변환 제거, 넓은 지수 범위)
     bnb_config = BitsAndBytesConfig(
         load_in_4bit=True,
         bnb_4bit_quant_type="nf4",
-        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_compute_dtype=torch.bfloat16,
         bnb_4bit_use_double_quant=True
     )
 
+    # Fused attention: FlashAttention-2가 설치돼 있으면 사용, 없으면 PyTorch SDPA
+    attn_implementation = "flash_attention_2" if importlib.util.find_spec("flash_attn") else "sdpa"
+    print(f"Attention implementation: {attn_implementation}")
+
     base_model = AutoModelForCausalLM.from_pretrained(
         base_model_path,
         quantization_config=bnb_config,
-        torch_dtype=torch.float16,
+        torch_dtype=torch.bfloat16,
+        attn_implementation=attn_implementation,
         device_map={"": 0}  # 모든 레이어를 GPU 0에 배치
     )
+    base_model.config.use_cache = False  # gradient checkpointing과 함께 사용 불가
 
-    # 기존 LoRA adapter 로드
-    model = PeftModel.from_pretrained(base_model, adapter_path)
-
-    # LoRA 파라미터를 학습 가능하게 설정
+    # 기존 LoRA adapter 로드 (is_trainable=True: adapter 파라미터만 requires_grad=True)
+    model = PeftModel.from_pretrained(base_model, adapter_path, is_trainable=True)
     model.print_trainable_parameters()  # 디버깅용
-    for name, param in model.named_parameters():
-        if 'lora' in name.lower():
-            param.requires_grad = True
 
     # 2. 데이터셋 로드
     print(f"Loading dataset from {train_file}...")
@@ -66,12 +147,25 @@ def train_dpo_persona(
     print(f"Eval samples: {len(dataset['test'])}")
 
     # 3. DPO 학습 설정
+    num_train_epochs = 3
+    # BF16 + fused attention + selective checkpointing로 L4에서 micro-batch 2까지 들어감
+    # (OOM이면 max_length를 384로 줄이기: DPO prompt는 대부분 256 토큰 미만)
+    per_device_batch_size = 2
+    gradient_accumulation_steps = 4  # Effective batch = 8
+
+    # 페르소나당 수백 페어라 전체 step 수가 작음(~100-200) → 고정 step 대신 실행당 약 5번 eval/save
+    # (save_steps가 전체 step보다 크면 checkpoint가 없어 load_best_model_at_end가 무의미)
+    micro_batches = -(-len(dataset['train']) // per_device_batch_size)
+    total_steps = num_train_epochs * max(1, micro_batches // gradient_accumulation_steps)
+    eval_steps = max(1, total_steps // 5)
+    print(f"Total steps: {total_steps} (eval/save every {eval_steps})")
+
     training_args = DPOConfig(
         output_dir=output_dir,
-        num_train_epochs=3,
-        per_device_train_batch_size=1,  # Reduced for L4 GPU memory
-        per_device_eval_batch_size=1,   # Reduced for L4 GPU memory
-        gradient_accumulation_steps=8,  # Effective batch = 8
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=per_device_batch_size,
+        per_device_eval_batch_size=per_device_batch_size,
+        gradient_accumulation_steps=gradient_accumulation_steps,
 
         learning_rate=5e-5,  # DPO는 일반적으로 낮은 LR
         weight_decay=0.01,
@@ -83,10 +177,10 @@ def train_dpo_persona(
         gradient_checkpointing_kwargs={"use_reentrant": False},  # Required for DPO
         logging_steps=10,
         eval_strategy="steps",
-        eval_steps=50,
+        eval_steps=eval_steps,
         save_strategy="steps",
-        save_steps=100,
-        save_total_limit=3,
+        save_steps=eval_steps,  # load_best_model_at_end는 save_steps가 eval_steps의 배수여야 함
+        save_total_limit=1,  # load_best_model_at_end면 best checkpoint는 별도로 보존됨
 
         load_best_model_at_end=True,
         metric_for_best_model="eval_loss",
@@ -95,8 +189,31 @@ def train_dpo_persona(
         report_to="none",  # MLflow 연동 시 변경
         max_length=512,  # Limit sequence length to save memory
         max_prompt_length=256,
+        # DPOTrainer가 prompt/chosen/rejected를 학습 전에 한 번 토크나이즈 → 여러 프로세스로 병렬 처리
+        dataset_num_proc=max(1, (os.cpu_count() or 1) // 2),
+
+        # DataLoader: worker에서 collation + pinned memory로 H2D 전송을 GPU 연산과 겹침
+        dataloader_num_workers=4,
+        dataloader_pin_memory=True,
+        dataloader_prefetch_factor=4,
+        dataloader_persistent_workers=True,
+        accelerator_config={"non_blocking": True},  # pinned batch → GPU 비동기 복사
+
+        # Reference model log-prob은 데이터셋에만 의존하므로 학습 시작 시 한 번만 계산
+        # (매 step마다 reference forward를 돌리지 않음)
+        precompute_ref_log_probs=True,
     )
 
+    # 이전 실행에서 계산한 reference log-prob이 있으면 재사용
+    ref_cache_file = _ref_logps_cache_file(base_model_path, adapter_path, train_file, output_dir, training_args)
+    cached_ref_logps = _load_ref_logps(ref_cache_file, dataset)
+    if cached_ref_logps:
+        print(f"Reusing reference log-probs from {ref_cache_file}")
+        dataset = cached_ref_logps
+        # ref_chosen_logps/ref_rejected_logps 컬럼이 이미 있으므로 precompute 단계 생략
+        # (DPOTrainer는 batch에 이 컬럼이 있으면 reference forward 대신 그대로 사용)
+        training_args.precompute_ref_log_probs = False
+
     # 4. DPO Trainer 초기화
     print("Initializing DPO Trainer...")
     dpo_trainer = DPOTrainer(
@@ -105,6 +222,7 @@ def train_dpo_persona(
         train_dataset=dataset['train'],
         eval_dataset=dataset['test'],
         processing_class=tokenizer,  # 최신 버전에서는 tokenizer 대신 processing_class 사용
+        callbacks=[SelectiveCheckpointingCallback()],
     )
 
     # 5. 학습 실행
@@ -116,6 +234,9 @@ def train_dpo_persona(
     dpo_trainer.save_model(output_dir)
     tokenizer.save_pretrained(output_dir)
 
+    if not cached_ref_logps:
+        _save_ref_logps(ref_cache_file, dpo_trainer)
+
     print(f"\n✅ Training complete for {persona_id}!")
 
     return model
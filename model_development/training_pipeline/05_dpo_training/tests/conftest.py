@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Evaluation scripts import each other as top-level modules (see evaluate_dpo_personas.py)
+EVALUATION_DIR = Path(__file__).resolve().parents[1] / "evaluation"
+if str(EVALUATION_DIR) not in sys.path:
+    sys.path.insert(0, str(EVALUATION_DIR))
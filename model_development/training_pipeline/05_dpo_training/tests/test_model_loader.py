@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("peft")
+
+from model_loader import RecipeModelLoader
+
+
+@pytest.fixture
+def loader():
+    # _extract_assistant_response uses no loader state; skip loading any model
+    return object.__new__(RecipeModelLoader)
+
+
+def test_extract_terminated_fence(loader):
+    response = 'Here you go:\n```json\n{"name": "Soup", "steps": {"1": "Boil"}}\n```\nEnjoy!'
+    assert json.loads(loader._extract_assistant_response(response)) == {"name": "Soup", "steps": {"1": "Boil"}}
+
+
+def test_extract_unterminated_fence(loader):
+    # JsonBraceStoppingCriteria stops at the closing brace, before the closing fence
+    response = '```json\n{"name": "Soup", "time": "20 mins"}'
+    assert json.loads(loader._extract_assistant_response(response)) == {"name": "Soup", "time": "20 mins"}
+
+
+def test_extract_bare_object(loader):
+    response = 'Recipe: {"name": "Soup"} done'
+    assert loader._extract_assistant_response(response) == '{"name": "Soup"}'
+
+
+def test_personas_cache_is_per_file(tmp_path):
+    from model_loader import load_personas
+
+    first = tmp_path / "personas.yaml"
+    second = tmp_path / "personas_v2.yaml"
+    first.write_text("personas:\n  a: {name: A}\n")
+    second.write_text("personas:\n  b: {name: B}\n")
+
+    assert load_personas(first) == {"a": {"name": "A"}}
+    assert load_personas(second) == {"b": {"name": "B"}}
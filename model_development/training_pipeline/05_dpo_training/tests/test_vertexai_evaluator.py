@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+from vertexai_evaluator import VertexAIEvaluator
+
+
+@pytest.fixture
+def evaluator():
+    # Parsing uses no model or cache state
+    evaluator = object.__new__(VertexAIEvaluator)
+    evaluator.evaluator_name = "test"
+    return evaluator
+
+
+def test_batch_parse_accepts_string_pair_ids(evaluator):
+    response = json.dumps({"results": [
+        {"pair_id": "2", "winner": "A", "recipe_a_scores": {"taste": 8}, "recipe_b_scores": {"taste": 6}},
+        {"pair_id": "1", "winner": "B", "recipe_a_scores": {"taste": 5}, "recipe_b_scores": {"taste": 9}},
+    ]})
+
+    first, second = evaluator._parse_batch_evaluation(response, num_pairs=2)
+
+    assert first["winner"] == "dpo" and first["dpo_score"] == 9
+    assert second["winner"] == "sft" and second["sft_score"] == 8
+    assert "parse_error" not in first and "parse_error" not in second
+
+
+def test_batch_evaluate_rejects_running_event_loop(evaluator):
+    async def call_sync_api():
+        evaluator.batch_evaluate([], persona_config={})
+
+    with pytest.raises(RuntimeError, match="abatch_evaluate"):
+        asyncio.run(call_sync_api())
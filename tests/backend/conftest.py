@@ -5,60 +5,174 @@ Provides test database, FastAPI client, and common mocks.
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
 from unittest.mock import Mock, patch
+import orjson
+import os
 import sys
 from pathlib import Path
+from passlib.context import CryptContext
 
 # Add backend to path
 backend_path = Path(__file__).parent.parent.parent / "model_deployment" / "backend"
 sys.path.insert(0, str(backend_path))
 
+# The app's own engine is only used by main's create_all (get_db is overridden below).
+# Keep it in memory so parallel xdist workers don't race on a shared ./test.db file.
+if not os.environ.get("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+
 from main import app
 from database import get_db
 from models import Base, User, UserProfile, InventoryItem, RecipeHistory
-from auth_utils import create_access_token
+import auth_utils
+from auth_utils import create_access_token, pwd_context
+
+@pytest.fixture(scope="session", autouse=True)
+def _fast_hash():
+    """Make password hashing cheap for the whole test session.
+
+    Passwords are stored in plaintext by default; PYTEST_FAST_HASH=0 keeps the
+    production schemes at their minimum cost instead. Either way auth_utils.pwd_context
+    is swapped (never mutated), and get_password_hash/verify_password look it up on
+    every call, so routers that imported those functions by name are covered too.
+    """
+    if os.environ.get("PYTEST_FAST_HASH", "1") == "1":
+        context = CryptContext(schemes=["plaintext"])
+    else:
+        context = pwd_context.copy(pbkdf2_sha256__rounds=1000, bcrypt__rounds=4)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(auth_utils, "pwd_context", context)
+        yield
 
 # In-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
 
-@pytest.fixture(scope="function")
-def test_db():
-    """Create a fresh test database for each test."""
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Enforce @pytest.mark.query_budget(n): at most n SQL statements in the test body.
+
+    Only the test call is counted, not fixture setup (user, inventory rows, ...).
+    """
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        yield
+        return
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")):
+            statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", _count)
+    try:
+        outcome = yield
+    finally:
+        event.remove(Engine, "before_cursor_execute", _count)
+    if outcome.excinfo is None:
+        budget = marker.args[0]
+        assert len(statements) <= budget, (
+            f"{len(statements)} SQL statements, budget {budget}:\n" + "\n".join(statements)
+        )
+
+@pytest.fixture(scope="session")
+def test_engine():
+    """Create the test database schema once for the whole session."""
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        # Single shared connection so the TestClient thread sees the same in-memory DB
+        poolclass=StaticPool,
     )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    
-    # Create all tables
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        # pysqlite's own transaction handling breaks SAVEPOINT; let SQLAlchemy emit BEGIN itself
+        dbapi_connection.isolation_level = None
+        # Throwaway DB: no durability needed
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA journal_mode=MEMORY")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
     Base.metadata.create_all(bind=engine)
-    
-    db = TestingSessionLocal()
     try:
-        yield db
+        yield engine
     finally:
-        db.close()
-        # Drop all tables after test
         Base.metadata.drop_all(bind=engine)
+        engine.dispose()
 
 @pytest.fixture(scope="function")
-def client(test_db):
-    """FastAPI test client with overridden database."""
+def test_db(test_engine):
+    """Session inside a transaction that is rolled back after each test.
+
+    commit()/rollback() in tests and endpoints only touch a SAVEPOINT, so
+    nothing outlives the test.
+    """
+    connection = test_engine.connect()
+    trans = connection.begin()
+    db = Session(bind=connection, autoflush=False, join_transaction_mode="create_savepoint")
+    try:
+        yield db
+    finally:
+        db.close()
+        trans.rollback()
+        connection.close()
+
+# Session used by the get_db override; set per test by the client fixture.
+# (A ContextVar would not reach the thread TestClient runs the app in.)
+_current_db = {}
+
+@pytest.fixture(scope="session")
+def app_client():
+    """One TestClient (and one app startup/shutdown) for the whole session."""
     def override_get_db():
-        try:
-            yield test_db
-        finally:
-            pass
-    
+        # Resolves to whichever test_db session the running test is using
+        yield _current_db["session"]
+
     app.dependency_overrides[get_db] = override_get_db
-    
     with TestClient(app) as test_client:
         yield test_client
-    
+
     app.dependency_overrides.clear()
 
+@pytest.fixture(scope="function")
+def client(app_client, test_db):
+    """FastAPI test client with overridden database."""
+    _current_db["session"] = test_db
+    # Tests swap in mock model services; restore the startup one afterwards
+    model_service = app.state.model_service
+    try:
+        yield app_client
+    finally:
+        app.state.model_service = model_service
+        _current_db.pop("session", None)
+        app_client.cookies.clear()
+
+@pytest.fixture
+def bulk_create(test_db):
+    """Insert many rows of a model with one Core executemany and a single commit."""
+    def _bulk_create(model, rows):
+        test_db.execute(insert(model), rows)
+        test_db.commit()
+    return _bulk_create
+
+@pytest.fixture(scope="session")
+def json_of():
+    """Decode a response body with orjson instead of httpx's stdlib json."""
+    def _json_of(response):
+        return orjson.loads(response.content)
+    return _json_of
+
 @pytest.fixture
 def mock_model_service():
     """Mock external LLM service."""
@@ -81,38 +195,61 @@ def mock_model_service():
         mock.return_value = mock_instance
         yield mock_instance
 
-@pytest.fixture
-def test_user(test_db):
-    """Create a test user in the database."""
+@pytest.fixture(scope="module")
+def module_user(test_engine):
+    """Create the test user once per module, committed outside the per-test rollback.
+
+    Tests only read the user row, and anything they change is rolled back with test_db.
+    """
     from auth_utils import get_password_hash
-    
-    user = User(
-        username="testuser",
-        email="test@example.com",
-        hashed_password=get_password_hash("testpass123")
-    )
-    test_db.add(user)
-    test_db.commit()
-    test_db.refresh(user)
-    
-    # Create profile
-    profile = UserProfile(
-        user_id=user.id,
-        dietary_restrictions=["vegan"],
-        allergies=["peanuts"],
-        favorite_cuisines=["Italian", "Chinese"]
-    )
-    test_db.add(profile)
-    test_db.commit()
-    
-    return user
+
+    with Session(test_engine, expire_on_commit=False) as db:
+        user = User(
+            username="testuser",
+            email="test@example.com",
+            hashed_password=get_password_hash("testpass123")
+        )
+        db.add(user)
+        db.flush()
+
+        # Create profile
+        db.add(UserProfile(
+            user_id=user.id,
+            dietary_restrictions=["vegan"],
+            allergies=["peanuts"],
+            favorite_cuisines=["Italian", "Chinese"]
+        ))
+        db.commit()
+
+    yield user
+
+    with Session(test_engine) as db:
+        db.query(UserProfile).filter_by(user_id=user.id).delete()
+        db.query(User).filter_by(id=user.id).delete()
+        db.commit()
 
 @pytest.fixture
-def auth_token(test_user):
+def test_user(module_user):
+    """The module's shared test user."""
+    return module_user
+
+@pytest.fixture(scope="session")
+def token_for():
+    """JWT for a username, signed once per session and reused."""
+    cache = {}
+
+    def _token_for(username):
+        if username not in cache:
+            cache[username] = create_access_token(data={"sub": username})
+        return cache[username]
+    return _token_for
+
+@pytest.fixture(scope="module")
+def auth_token(module_user):
     """Generate JWT token for test user."""
-    return create_access_token(data={"sub": test_user.username})
+    return create_access_token(data={"sub": module_user.username})
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def auth_headers(auth_token):
     """Headers with Bearer token for authenticated requests."""
     return {"Authorization": f"Bearer {auth_token}"}
@@ -163,11 +300,8 @@ def mock_ocr_response():
     }
 
 @pytest.fixture
-def mock_requests(mock_ocr_response):
-    """Mock external HTTP requests."""
-    with patch('requests.post') as mock_post:
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = mock_ocr_response
-        mock_post.return_value = mock_response
-        yield mock_post
+def mock_ocr(monkeypatch, mock_ocr_response):
+    """Mock the OCR API client used by /inventory/upload."""
+    mock_extract = Mock(return_value=mock_ocr_response)
+    monkeypatch.setattr("routers.inventory.ocr_extract", mock_extract)
+    return mock_extract
@@ -12,7 +12,7 @@ def test_admin_metrics_access_denied_for_non_admin(client: TestClient, test_db:
         hashed_password=get_password_hash("password123")
     )
     test_db.add(non_admin_user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(non_admin_user)
     
     # Generate token
@@ -32,7 +32,7 @@ def test_admin_metrics_access_success_for_admin(client: TestClient, test_db: Ses
     }
     admin = User(**admin_data)
     test_db.add(admin)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(admin)
     
     # Login to get token
@@ -52,7 +52,7 @@ def test_admin_metrics_access_success_for_admin(client: TestClient, test_db: Ses
 def test_seed_admin_user(client: TestClient, test_db: Session):
     # Ensure admin doesn't exist
     test_db.query(User).filter(User.username == "admin").delete()
-    test_db.commit()
+    test_db.flush()
     
     response = client.post("/admin/seed")
     assert response.status_code == 200
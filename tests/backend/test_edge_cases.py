@@ -71,7 +71,7 @@ def test_cooked_invalid_servings(client, auth_headers, test_db, test_user):
         servings=0  # Invalid servings
     )
     test_db.add(history)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(history)
     
     # Should still process
@@ -90,7 +90,7 @@ def test_feedback_invalid_score(client, auth_headers, test_db, test_user):
         servings=2
     )
     test_db.add(history)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(history)
     
     # Invalid score (not 1 or 2)
@@ -138,9 +138,14 @@ def test_add_inventory_duplicate_name(client, auth_headers, test_inventory_items
     assert response.status_code == 200
 
 @pytest.mark.api
-def test_ocr_upload_invalid_file(client, auth_headers):
+def test_ocr_upload_invalid_file(client, auth_headers, monkeypatch):
     """Test OCR upload with invalid file type."""
     from io import BytesIO
+    from routers.inventory import OCRAPIError
+    
+    def reject(content, content_type):
+        raise OCRAPIError("unsupported file type")
+    monkeypatch.setattr("routers.inventory.ocr_extract", reject)
     
     fake_file = BytesIO(b"not an image")
     
@@ -4,6 +4,7 @@ Tests for inventory endpoints (CRUD operations, OCR upload).
 
 import pytest
 from io import BytesIO
+from models import InventoryItem
 
 @pytest.mark.api
 def test_get_inventory_empty(client, auth_headers):
@@ -14,18 +15,19 @@ def test_get_inventory_empty(client, auth_headers):
     assert response.json() == []
 
 @pytest.mark.api
-def test_get_inventory_with_items(client, auth_headers, test_inventory_items):
+@pytest.mark.query_budget(2)  # current user + inventory rows
+def test_get_inventory_with_items(client, auth_headers, test_inventory_items, json_of):
     """Test getting inventory returns user's items."""
     response = client.get("/inventory/", headers=auth_headers)
     
     assert response.status_code == 200
-    data = response.json()
+    data = json_of(response)
     assert len(data) == 3
     assert any(item["item_name"] == "Chicken Breast" for item in data)
     assert any(item["item_name"] == "Rice" for item in data)
 
 @pytest.mark.api
-def test_add_inventory_item(client, auth_headers):
+def test_add_inventory_item(client, auth_headers, test_db, test_user):
     """Test adding new inventory item."""
     response = client.post("/inventory/", 
         headers=auth_headers,
@@ -43,9 +45,9 @@ def test_add_inventory_item(client, auth_headers):
     assert "item_id" in data
     
     # Verify item was added
-    get_response = client.get("/inventory/", headers=auth_headers)
-    items = get_response.json()
-    assert any(item["item_name"] == "Olive Oil" for item in items)
+    test_db.expire_all()
+    items = test_db.query(InventoryItem).filter_by(user_id=test_user.id).all()
+    assert any(item.item_name == "Olive Oil" for item in items)
 
 @pytest.mark.api
 def test_update_inventory_item(client, auth_headers, test_inventory_items):
@@ -83,7 +85,7 @@ def test_update_nonexistent_item(client, auth_headers):
     assert response.status_code == 404
 
 @pytest.mark.api
-def test_delete_inventory_item(client, auth_headers, test_inventory_items):
+def test_delete_inventory_item(client, auth_headers, test_db, test_user, test_inventory_items):
     """Test deleting inventory item."""
     item_id = test_inventory_items[0].id
     
@@ -93,10 +95,10 @@ def test_delete_inventory_item(client, auth_headers, test_inventory_items):
     assert response.json()["status"] == "success"
     
     # Verify item was deleted
-    get_response = client.get("/inventory/", headers=auth_headers)
-    items = get_response.json()
+    test_db.expire_all()
+    items = test_db.query(InventoryItem).filter_by(user_id=test_user.id).all()
     assert len(items) == 2  # Originally had 3
-    assert not any(item["id"] == item_id for item in items)
+    assert not any(item.id == item_id for item in items)
 
 @pytest.mark.api
 def test_delete_nonexistent_item(client, auth_headers):
@@ -105,7 +107,8 @@ def test_delete_nonexistent_item(client, auth_headers):
     assert response.status_code == 404
 
 @pytest.mark.integration
-def test_ocr_upload_success(client, auth_headers, mock_requests):
+@pytest.mark.slow
+def test_ocr_upload_success(client, auth_headers, mock_ocr):
     """Test OCR receipt upload with successful detection."""
     # Create fake image file
     fake_image = BytesIO(b"fake image data")
@@ -122,8 +125,67 @@ def test_ocr_upload_success(client, auth_headers, mock_requests):
     assert "detected_items" in data
     assert len(data["detected_items"]) > 0
 
+@pytest.mark.unit
+def test_ocr_extract_posts_to_ocr_api():
+    """Test OCR client returns the decoded payload on success."""
+    from unittest.mock import Mock, patch
+    from routers.inventory import OCR_API_URL, ocr_extract
+    
+    payload = [{"item": "Milk", "quantity": "1 L"}]
+    with patch('requests.post') as mock_post:
+        mock_post.return_value = Mock(status_code=200, json=Mock(return_value=payload))
+        assert ocr_extract(b"img", "image/jpeg") == payload
+    
+    assert mock_post.call_args.args[0] == OCR_API_URL
+    assert mock_post.call_args.kwargs["files"]["file"] == ("receipt.jpg", b"img", "image/jpeg")
+
+@pytest.mark.unit
+def test_ocr_extract_raises_on_error_status():
+    """Test OCR client raises OCRAPIError with the API's error text."""
+    from unittest.mock import Mock, patch
+    from routers.inventory import OCRAPIError, ocr_extract
+    
+    with patch('requests.post') as mock_post:
+        mock_post.return_value = Mock(status_code=503, text="unavailable")
+        with pytest.raises(OCRAPIError, match="unavailable"):
+            ocr_extract(b"img", "image/jpeg")
+
+@pytest.mark.integration
+def test_ocr_upload_api_error(client, auth_headers, monkeypatch):
+    """Test OCR API failures are reported, not raised."""
+    from routers.inventory import OCRAPIError
+    
+    def fail(content, content_type):
+        raise OCRAPIError("unavailable")
+    monkeypatch.setattr("routers.inventory.ocr_extract", fail)
+    
+    response = client.post("/inventory/upload",
+        headers=auth_headers,
+        files={"file": ("receipt.jpg", BytesIO(b"fake image data"), "image/jpeg")}
+    )
+    
+    assert response.status_code == 200
+    assert response.json() == {"status": "error", "message": "OCR API failed: unavailable"}
+
+@pytest.mark.integration
+def test_ocr_upload_parses_item_list(client, auth_headers, monkeypatch):
+    """Test raw OCR item lists are mapped to name/quantity/unit/category."""
+    monkeypatch.setattr("routers.inventory.ocr_extract",
+        lambda content, content_type: [{"item": "Milk", "quantity": "2 L"}, "noise", {"name": "Rice"}])
+    
+    response = client.post("/inventory/upload",
+        headers=auth_headers,
+        files={"file": ("receipt.jpg", BytesIO(b"fake image data"), "image/jpeg")}
+    )
+    
+    items = response.json()["detected_items"]
+    assert items[0] == {"item_name": "Milk", "quantity": 2.0, "unit": "L", "category": "dairy"}
+    assert items[1]["item_name"] == "Rice"
+    assert items[1]["quantity"] == 1.0
+    assert items[1]["unit"] == "pcs"
+
 @pytest.mark.integration
-def test_confirm_upload(client, auth_headers):
+def test_confirm_upload(client, auth_headers, test_db, test_user, json_of):
     """Test bulk confirmation of OCR detected items."""
     items_to_add = [
         {"item_name": "Milk", "quantity": 1, "unit": "L", "category": "dairy"},
@@ -136,20 +198,19 @@ def test_confirm_upload(client, auth_headers):
     )
     
     assert response.status_code == 200
-    data = response.json()
+    data = json_of(response)
     assert data["status"] == "success"
     assert data["count"] == 2
     
     # Verify items were added
-    get_response = client.get("/inventory/", headers=auth_headers)
-    items = get_response.json()
-    assert any(item["item_name"] == "Milk" for item in items)
-    assert any(item["item_name"] == "Bread" for item in items)
+    test_db.expire_all()
+    item_names = {item.item_name for item in test_db.query(InventoryItem).filter_by(user_id=test_user.id)}
+    assert {"Milk", "Bread"} <= item_names
 
 @pytest.mark.api
-def test_inventory_isolation_between_users(client, test_db):
+def test_inventory_isolation_between_users(client, test_db, token_for):
     """Test that users can only see their own inventory."""
-    from auth_utils import get_password_hash, create_access_token
+    from auth_utils import get_password_hash
     from models import User, InventoryItem
     
     # Create second user
@@ -159,7 +220,7 @@ def test_inventory_isolation_between_users(client, test_db):
         hashed_password=get_password_hash("pass123")
     )
     test_db.add(user2)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user2)
     
     # Add item for user2
@@ -171,10 +232,10 @@ def test_inventory_isolation_between_users(client, test_db):
         category="pantry"
     )
     test_db.add(item)
-    test_db.commit()
+    test_db.flush()
     
     # Try to access with user2's token
-    token2 = create_access_token(data={"sub": "user2"})
+    token2 = token_for("user2")
     headers2 = {"Authorization": f"Bearer {token2}"}
     
     response = client.get("/inventory/", headers=headers2)
@@ -18,7 +18,7 @@ def test_create_user(test_db):
     )
     
     test_db.add(user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user)
     
     assert user.id is not None
@@ -37,7 +37,7 @@ def test_user_profile_relationship(test_db):
         hashed_password=get_password_hash("pass")
     )
     test_db.add(user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user)
     
     profile = UserProfile(
@@ -47,7 +47,7 @@ def test_user_profile_relationship(test_db):
         favorite_cuisines=["Italian"]
     )
     test_db.add(profile)
-    test_db.commit()
+    test_db.flush()
     
     # Access via relationship
     assert user.profile is not None
@@ -69,7 +69,7 @@ def test_inventory_item_model(test_db, test_user):
     )
     
     test_db.add(item)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(item)
     
     assert item.id is not None
@@ -91,7 +91,7 @@ def test_recipe_history_model(test_db, test_user):
     )
     
     test_db.add(recipe)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(recipe)
     
     assert recipe.id is not None
@@ -112,7 +112,7 @@ def test_user_cascade_delete(test_db):
         hashed_password=get_password_hash("pass")
     )
     test_db.add(user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user)
     
     profile = UserProfile(user_id=user.id)
@@ -120,11 +120,11 @@ def test_user_cascade_delete(test_db):
     recipe = RecipeHistory(user_id=user.id, recipe_json={}, user_query="Query", servings=2)
     
     test_db.add_all([profile, item, recipe])
-    test_db.commit()
+    test_db.flush()
     
     # Delete user
     test_db.delete(user)
-    test_db.commit()
+    test_db.flush()
     
     # Verify related records are deleted
     assert test_db.query(UserProfile).filter_by(user_id=user.id).first() is None
@@ -147,10 +147,29 @@ def test_json_field_serialization(test_db, test_user):
         **complex_data
     )
     test_db.add(profile)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(profile)
     
     # Verify JSON fields are properly serialized
     assert isinstance(profile.dietary_restrictions, list)
     assert len(profile.dietary_restrictions) == 2
     assert "vegan" in profile.dietary_restrictions
+
+@pytest.mark.unit
+def test_missing_indexes_created_on_existing_tables():
+    """Indexes added to a model reach databases whose tables already exist."""
+    from sqlalchemy import create_engine, inspect
+    from models import Base, RecipePreference
+    from main import _create_missing_indexes
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    index = next(i for i in RecipePreference.__table__.indexes
+                 if i.name == "ix_recipe_preferences_user_answered")
+    index.drop(bind=engine)
+
+    _create_missing_indexes(engine)
+    _create_missing_indexes(engine)  # already present: no-op
+
+    names = {i["name"] for i in inspect(engine).get_indexes("recipe_preferences")}
+    assert "ix_recipe_preferences_user_answered" in names
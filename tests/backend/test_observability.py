@@ -2,15 +2,27 @@
 Tests for observability endpoints and middleware.
 """
 
+import pytest
 from sqlalchemy import create_engine
 
 
-def test_healthz_ok(monkeypatch, client):
-    # Patch the global engine used by /healthz to a lightweight SQLite engine.
-    test_engine = create_engine("sqlite://")
-    monkeypatch.setattr("main.engine", test_engine)
-    monkeypatch.setattr("database.engine", test_engine)
+@pytest.fixture(scope="module")
+def obs_engine():
+    """Lightweight SQLite engine shared by the /healthz checks in this module."""
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
 
+
+@pytest.fixture
+def patched_engine(monkeypatch, obs_engine):
+    # Patch the global engine used by /healthz to the shared SQLite engine.
+    monkeypatch.setattr("main.engine", obs_engine)
+    monkeypatch.setattr("database.engine", obs_engine)
+    return obs_engine
+
+
+def test_healthz_ok(patched_engine, client):
     resp = client.get("/healthz")
     assert resp.status_code == 200
     data = resp.json()
@@ -19,12 +31,8 @@ def test_healthz_ok(monkeypatch, client):
     assert data["db_latency_ms"] is None or data["db_latency_ms"] >= 0
 
 
-def test_metrics_and_request_id(monkeypatch, client):
+def test_metrics_and_request_id(patched_engine, client):
     # Ensure health and root requests are recorded and return request_id headers.
-    test_engine = create_engine("sqlite://")
-    monkeypatch.setattr("main.engine", test_engine)
-    monkeypatch.setattr("database.engine", test_engine)
-
     # Trigger a couple of requests to populate metrics
     r1 = client.get("/")
     r2 = client.get("/healthz")
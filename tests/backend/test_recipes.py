@@ -5,13 +5,22 @@ Tests for recipe endpoints (generation, cooked, feedback, warmup).
 import pytest
 import json
 from unittest.mock import patch, Mock
+from sqlalchemy import bindparam, select
+from models import InventoryItem
+
+# A user's inventory rows by name; built once so SQLAlchemy reuses the compiled SQL
+_INVENTORY_BY_NAME = select(InventoryItem).where(
+    InventoryItem.user_id == bindparam("uid"),
+    InventoryItem.item_name.in_(bindparam("names", expanding=True)),
+)
 
 @pytest.mark.api
 def test_generate_recipe_success(client, auth_headers, test_inventory_items):
     """Test successful recipe generation."""
     # Mock the model_service in app.state
     mock_service = Mock()
-    mock_service.generate_recipe.return_value = '''{
+    # Already-parsed payload: the route accepts dicts as well as raw model text
+    mock_service.generate_recipe.return_value = {
         "status": "ok",
         "missing_ingredients": ["salt"],
         "recipe": {
@@ -21,10 +30,10 @@ def test_generate_recipe_success(client, auth_headers, test_inventory_items):
             "time": "30 mins",
             "main_ingredients": ["pasta", "tomato"],
             "steps": "Step 1. Boil water. Step 2. Cook pasta.",
-            "note": null
+            "note": None
         },
         "shopping_list": ["salt"]
-    }'''
+    }
     
     # Inject mock into client's app
     client.app.state.model_service = mock_service
@@ -47,6 +56,7 @@ def test_generate_recipe_success(client, auth_headers, test_inventory_items):
 def test_generate_recipe_saves_history(client, auth_headers, test_db, test_user):
     """Test recipe generation saves to history."""
     mock_service = Mock()
+    # Raw model text: exercises the route's JSON parsing outside the slow tests
     mock_service.generate_recipe.return_value = '''{
         "status": "ok",
         "missing_ingredients": [],
@@ -71,6 +81,8 @@ def test_generate_recipe_saves_history(client, auth_headers, test_db, test_user)
         }
     )
     
+    assert response.status_code == 200
+    assert response.json()["data"]["recipe"]["recipe"]["name"] == "Italian Dinner"
     history_id = response.json()["history_id"]
     
     # Verify history entry exists
@@ -105,15 +117,10 @@ def test_mark_recipe_cooked(client, auth_headers, test_db, test_user, test_inven
     test_db.refresh(history)
     
     # Get initial quantities
-    from models import InventoryItem
-    chicken = test_db.query(InventoryItem).filter_by(
-        user_id=test_user.id, 
-        item_name="Chicken Breast"
-    ).first()
-    rice = test_db.query(InventoryItem).filter_by(
-        user_id=test_user.id,
-        item_name="Rice"
-    ).first()
+    items = test_db.execute(
+        _INVENTORY_BY_NAME, {"uid": test_user.id, "names": ["Chicken Breast", "Rice"]}
+    ).scalars().all()
+    chicken, rice = sorted(items, key=lambda item: item.item_name)
     
     initial_chicken = chicken.quantity
     initial_rice = rice.quantity
@@ -124,10 +131,15 @@ def test_mark_recipe_cooked(client, auth_headers, test_db, test_user, test_inven
     assert response.status_code == 200
     assert response.json()["status"] == "success"
     
-    # Refresh from DB
-    test_db.refresh(chicken)
-    test_db.refresh(rice)
-    test_db.refresh(history)
+    # Re-read from DB: both inventory rows in one select, only is_cooked on the history row
+    test_db.expire(history, ["is_cooked"])
+    chicken, rice = sorted(
+        test_db.execute(
+            select(InventoryItem).where(InventoryItem.id.in_([chicken.id, rice.id]))
+            .execution_options(populate_existing=True)
+        ).scalars(),
+        key=lambda item: item.item_name,
+    )
     
     # Verify quantities decreased
     assert chicken.quantity < initial_chicken
@@ -152,7 +164,7 @@ def test_submit_feedback_like(client, auth_headers, test_db, test_user):
         servings=2
     )
     test_db.add(history)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(history)
     
     response = client.post(f"/recipes/{history.id}/feedback",
@@ -163,7 +175,7 @@ def test_submit_feedback_like(client, auth_headers, test_db, test_user):
     assert response.status_code == 200
     
     # Verify feedback saved
-    test_db.refresh(history)
+    test_db.expire(history, ["feedback_score"])
     assert history.feedback_score == 2
 
 @pytest.mark.api
@@ -178,7 +190,7 @@ def test_submit_feedback_dislike(client, auth_headers, test_db, test_user):
         servings=2
     )
     test_db.add(history)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(history)
     
     response = client.post(f"/recipes/{history.id}/feedback",
@@ -187,10 +199,11 @@ def test_submit_feedback_dislike(client, auth_headers, test_db, test_user):
     )
     
     assert response.status_code == 200
-    test_db.refresh(history)
+    test_db.expire(history, ["feedback_score"])
     assert history.feedback_score == 1
 
 @pytest.mark.api
+@pytest.mark.slow
 def test_generate_recipe_comparison_on_seventh_request(client, auth_headers, test_db, test_user):
     """Every 7th generation should return two variants for preference collection."""
     mock_service = Mock()
@@ -204,7 +217,7 @@ def test_generate_recipe_comparison_on_seventh_request(client, auth_headers, tes
 
     profile = test_db.query(UserProfile).filter_by(user_id=test_user.id).first()
     profile.recipe_generation_count = 6  # Pretend the user has already generated 6 recipes
-    test_db.commit()
+    test_db.flush()
 
     response = client.post("/recipes/generate",
         headers=auth_headers,
@@ -231,28 +244,34 @@ def test_generate_recipe_comparison_on_seventh_request(client, auth_headers, tes
     assert preference.prompt == "DPO comparison request"
     assert test_db.query(RecipeHistory).count() == 0
 
-@pytest.mark.api
-def test_choose_preference_adds_history(client, auth_headers, test_db, test_user):
-    """Choosing a variant should write to history and mark preference."""
-    mock_service = Mock()
-    mock_service.generate_recipe.side_effect = [
-        json.dumps({"recipe": {"name": "Variant A"}}),
-        json.dumps({"recipe": {"name": "Variant B"}}),
-    ]
-    client.app.state.model_service = mock_service
+@pytest.fixture
+def comparison_pref(test_db, test_user):
+    """Pending A/B preference as /recipes/generate stores it on a 7th request; returns its id."""
+    from models import RecipePreference
 
-    from models import UserProfile, RecipePreference, RecipeHistory
+    variant_a = {"recipe": {"name": "Variant A"}}
+    variant_b = {"recipe": {"name": "Variant B"}}
+    pref = RecipePreference(
+        user_id=test_user.id,
+        prompt="choose test",
+        user_query="choose test",
+        servings=2,
+        generation_number=7,
+        variant_a=variant_a,
+        variant_b=variant_b,
+        variant_a_raw=json.dumps(variant_a),
+        variant_b_raw=json.dumps(variant_b),
+    )
+    test_db.add(pref)
+    test_db.flush()
+    return pref.id
 
-    profile = test_db.query(UserProfile).filter_by(user_id=test_user.id).first()
-    profile.recipe_generation_count = 6
-    test_db.commit()
+@pytest.mark.api
+def test_choose_preference_adds_history(client, auth_headers, test_db, comparison_pref):
+    """Choosing a variant should write to history and mark preference."""
+    from models import RecipePreference, RecipeHistory
 
-    # Trigger comparison
-    compare_res = client.post("/recipes/generate",
-        headers=auth_headers,
-        json={"user_request": "choose test", "servings": 2}
-    )
-    pref_id = compare_res.json()["preference_id"]
+    pref_id = comparison_pref
 
     # Choose variant A
     choose_res = client.post(f"/recipes/preference/{pref_id}/choose",
@@ -263,7 +282,7 @@ def test_choose_preference_adds_history(client, auth_headers, test_db, test_user
     data = choose_res.json()
     assert data["history_id"] is not None
 
-    test_db.refresh(profile)
+    test_db.expire_all()
     pref = test_db.query(RecipePreference).filter_by(id=pref_id).first()
     assert pref.chosen_variant == "A"
     assert pref.rejected_variant == "B"
@@ -275,31 +294,28 @@ def test_choose_preference_adds_history(client, auth_headers, test_db, test_user
     assert history.recipe_json["recipe"]["name"] == "Variant A"
 
 @pytest.mark.api
-def test_get_recipe_history(client, auth_headers, test_db, test_user):
+@pytest.mark.query_budget(3)  # bulk seed insert + current user + history rows
+def test_get_recipe_history(client, auth_headers, bulk_create, test_user, json_of):
     """Test retrieving recipe history."""
     from models import RecipeHistory
     from datetime import datetime, timedelta
     
     # Create multiple history entries
-    recipes = [
-        RecipeHistory(
-            user_id=test_user.id,
-            recipe_json={"recipe": {"name": f"Recipe {i}"}},
-            user_query=f"Query {i}",
-            servings=2,
-            created_at=datetime.utcnow() - timedelta(days=i)
-        )
+    bulk_create(RecipeHistory, [
+        {
+            "user_id": test_user.id,
+            "recipe_json": {"recipe": {"name": f"Recipe {i}"}},
+            "user_query": f"Query {i}",
+            "servings": 2,
+            "created_at": datetime.utcnow() - timedelta(days=i),
+        }
         for i in range(3)
-    ]
-    
-    for recipe in recipes:
-        test_db.add(recipe)
-    test_db.commit()
+    ])
     
     response = client.get("/recipes/history", headers=auth_headers)
     
     assert response.status_code == 200
-    data = response.json()
+    data = json_of(response)
     assert len(data) == 3
     # Should be sorted newest first
     assert "Recipe 0" in str(data[0]["recipe_json"])
@@ -318,13 +334,16 @@ def test_warmup_endpoint(client, auth_headers):
     assert "message" in data
 
 @pytest.mark.api
+@pytest.mark.slow
 def test_warmup_does_not_block(client, auth_headers):
     """Test warmup endpoint is non-blocking."""
+    import threading
     import time
     
-    # Mock slow LLM service
+    # Mock slow LLM service: blocks until the test releases it
+    release = threading.Event()
     def slow_generate(*args, **kwargs):
-        time.sleep(2)  # Simulate slow call
+        release.wait(5)  # Simulate slow call
         return "{}"
     
     mock_service = Mock()
@@ -335,36 +354,34 @@ def test_warmup_does_not_block(client, auth_headers):
     response = client.post("/recipes/warmup", headers=auth_headers)
     elapsed = time.time() - start
     
-    # Should return in < 0.5s even though LLM takes 2s
+    # Should return in < 0.5s even though the LLM call is still blocked
+    release.set()
     assert elapsed < 0.5
     assert response.status_code == 200
 
 @pytest.mark.api
-def test_recipe_history_user_isolation(client, test_db):
+def test_recipe_history_user_isolation(client, test_db, bulk_create, token_for):
     """Test users can only see their own recipe history."""
-    from auth_utils import get_password_hash, create_access_token
+    from auth_utils import get_password_hash
     from models import User, RecipeHistory
     
     # Create two users
-    user1 = User(username="user1", email="u1@test.com", 
-                 hashed_password=get_password_hash("pass"))
-    user2 = User(username="user2", email="u2@test.com",
-                 hashed_password=get_password_hash("pass"))
-    test_db.add_all([user1, user2])
-    test_db.commit()
-    test_db.refresh(user1)
-    test_db.refresh(user2)
+    hashed_password = get_password_hash("pass")
+    bulk_create(User, [
+        {"username": "user1", "email": "u1@test.com", "hashed_password": hashed_password},
+        {"username": "user2", "email": "u2@test.com", "hashed_password": hashed_password},
+    ])
+    user1 = test_db.query(User).filter_by(username="user1").first()
+    user2 = test_db.query(User).filter_by(username="user2").first()
     
     # Create recipes for each
-    recipe1 = RecipeHistory(user_id=user1.id, recipe_json={}, 
-                           user_query="User1 recipe", servings=2)
-    recipe2 = RecipeHistory(user_id=user2.id, recipe_json={},
-                           user_query="User2 recipe", servings=2)
-    test_db.add_all([recipe1, recipe2])
-    test_db.commit()
+    bulk_create(RecipeHistory, [
+        {"user_id": user1.id, "recipe_json": {}, "user_query": "User1 recipe", "servings": 2},
+        {"user_id": user2.id, "recipe_json": {}, "user_query": "User2 recipe", "servings": 2},
+    ])
     
     # User1 should only see their recipe
-    token1 = create_access_token(data={"sub": "user1"})
+    token1 = token_for("user1")
     response = client.get("/recipes/history", 
                          headers={"Authorization": f"Bearer {token1}"})
     
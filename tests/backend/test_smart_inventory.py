@@ -15,6 +15,8 @@ from utils.smart_inventory import (
     parse_ingredient,
     convert_unit,
     find_best_inventory_match,
+    find_best_inventory_matches,
+    InventoryIndex,
     similarity,
     is_match
 )
@@ -198,6 +200,43 @@ class TestFuzzyMatching:
         assert match is None
         assert score == 0.0
     
+    def test_find_best_match_ignores_blank_names(self):
+        """Test punctuation-only names never match."""
+        class MockItem:
+            def __init__(self, name):
+                self.item_name = name
+        
+        assert find_best_inventory_match([MockItem("Rice")], "!!") == (None, 0.0)
+        assert find_best_inventory_match([MockItem("--")], "rice") == (None, 0.0)
+    
+    def test_find_best_match_with_index(self):
+        """Test a prebuilt InventoryIndex gives the same matches as a plain list."""
+        class MockItem:
+            def __init__(self, name):
+                self.item_name = name
+        
+        inventory = [MockItem("Chicken Breast"), MockItem("Rice"), MockItem("Tomatoes")]
+        index = InventoryIndex(inventory)
+        
+        for query in ["chicken", "rice", "tomato", "pasta"]:
+            assert find_best_inventory_match(index, query) == find_best_inventory_match(inventory, query)
+        assert find_best_inventory_match(InventoryIndex([]), "rice") == (None, 0.0)
+    
+    def test_find_best_matches_batch(self):
+        """Test batch matching agrees with one find_best_inventory_match call per ingredient."""
+        class MockItem:
+            def __init__(self, name):
+                self.item_name = name
+        
+        inventory = [MockItem("Chicken Breast"), MockItem("Rice"), MockItem("Tomatoes")]
+        queries = ["chicken", "rice", "tomato", "pasta", "!!"]
+        
+        assert find_best_inventory_matches(inventory, queries) == [
+            find_best_inventory_match(inventory, q) for q in queries
+        ]
+        assert find_best_inventory_matches([], ["rice"]) == [(None, 0.0)]
+        assert find_best_inventory_matches(inventory, []) == []
+    
     def test_find_best_match_below_threshold(self):
         """Test no match when similarity below threshold."""
         from models import InventoryItem
@@ -10,6 +10,22 @@ from models import User, RecipePreference
 from auth_utils import get_password_hash, create_access_token
 
 
+def _chosen_preference_rows(user_id, count):
+    """Rows for bulk_create: answered A/B preferences (variant A chosen)."""
+    return [
+        {
+            "user_id": user_id,
+            "prompt": f"prompt {i}",
+            "variant_a": {"recipe": {"name": f"A{i}"}},
+            "variant_b": {"recipe": {"name": f"B{i}"}},
+            "chosen_variant": "A",
+            "rejected_variant": "B",
+            "skipped": False,
+        }
+        for i in range(count)
+    ]
+
+
 def test_pending_retraining_requires_admin(client: TestClient, test_user, auth_headers):
     """Non-admin users cannot access pending retraining list."""
     response = client.get("/training/pending", headers=auth_headers)
@@ -26,7 +42,7 @@ def test_pending_retraining_as_admin(client: TestClient, test_db: Session):
         hashed_password=get_password_hash("adminpass")
     )
     test_db.add(admin)
-    test_db.commit()
+    test_db.flush()
     
     token = create_access_token(data={"sub": "admin"})
     headers = {"Authorization": f"Bearer {token}"}
@@ -39,6 +55,30 @@ def test_pending_retraining_as_admin(client: TestClient, test_db: Session):
     assert "users" in data
 
 
+def test_pending_retraining_lists_eligible_users(client: TestClient, test_db: Session, bulk_create):
+    """Only users at the preference threshold are listed as pending."""
+    admin = User(username="admin", email="admin@example.com", hashed_password=get_password_hash("adminpass"))
+    ready = User(username="ready_user", email="ready@example.com", hashed_password=get_password_hash("pass123"))
+    almost = User(username="almost_user", email="almost@example.com", hashed_password=get_password_hash("pass123"))
+    test_db.add_all([admin, ready, almost])
+    test_db.flush()
+    
+    bulk_create(RecipePreference, _chosen_preference_rows(ready.id, 50) + _chosen_preference_rows(almost.id, 49))
+    
+    token = create_access_token(data={"sub": "admin"})
+    response = client.get("/training/pending", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pending_count"] == 1
+    assert data["users"] == [{
+        "user_id": ready.id,
+        "username": "ready_user",
+        "email": "ready@example.com",
+        "preference_count": 50,
+        "status": "pending"
+    }]
+
+
 def test_approve_retraining_user_not_found(client: TestClient, test_db: Session):
     """Approve retraining fails for non-existent user."""
     response = client.get("/training/approve/99999")  # GET, not POST
@@ -55,7 +95,7 @@ def test_approve_retraining_insufficient_preferences(client: TestClient, test_db
         hashed_password=get_password_hash("pass123")
     )
     test_db.add(user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user)
     
     response = client.get(f"/training/approve/{user.id}")  # GET, not POST
@@ -79,7 +119,7 @@ def test_export_user_not_found(client: TestClient, test_db: Session):
         hashed_password=get_password_hash("adminpass")
     )
     test_db.add(admin)
-    test_db.commit()
+    test_db.flush()
     
     token = create_access_token(data={"sub": "admin"})
     headers = {"Authorization": f"Bearer {token}"}
@@ -97,7 +137,7 @@ def test_export_preferences_success(client: TestClient, test_db: Session):
         hashed_password=get_password_hash("adminpass")
     )
     test_db.add(admin)
-    test_db.commit()
+    test_db.flush()
     
     # Create regular user
     user = User(
@@ -106,7 +146,7 @@ def test_export_preferences_success(client: TestClient, test_db: Session):
         hashed_password=get_password_hash("pass123")
     )
     test_db.add(user)
-    test_db.commit()
+    test_db.flush()
     test_db.refresh(user)
     
     token = create_access_token(data={"sub": "admin"})
@@ -120,6 +160,30 @@ def test_export_preferences_success(client: TestClient, test_db: Session):
     assert "dpo_pairs" in data
 
 
+def test_approve_retraining_triggers_training_job(client: TestClient, test_db: Session, bulk_create):
+    """Approve retraining sends the user's preference pairs to the training job."""
+    user = User(
+        username="ready_user",
+        email="ready@example.com",
+        hashed_password=get_password_hash("pass123")
+    )
+    test_db.add(user)
+    test_db.flush()
+    
+    # Seed threshold-many chosen preferences in one executemany
+    bulk_create(RecipePreference, _chosen_preference_rows(user.id, 50))
+    
+    with patch('services.dpo_training_service.trigger_dpo_lambda') as mock_trigger:
+        mock_trigger.return_value = {"status": "success", "message": "started"}
+        response = client.get(f"/training/approve/{user.id}")
+    
+    assert response.status_code == 200
+    assert "Retraining Initiated" in response.text
+    _, _, training_data = mock_trigger.call_args.args
+    assert len(training_data) == 50
+    assert all(pair["chosen"]["recipe"]["name"].startswith("A") for pair in training_data)
+
+
 # Notification service tests
 def test_notification_service_no_webhook():
     """Notification logs alert when webhook not configured."""
@@ -168,11 +232,32 @@ def test_notification_threshold_reached():
     mock_send.assert_called_once()
 
 
+def test_notification_threshold_reached_in_background():
+    """Notification is queued, not sent inline, when background tasks are given."""
+    from fastapi import BackgroundTasks
+    from services.notification_service import check_and_notify_threshold
+    
+    background = BackgroundTasks()
+    with patch('services.notification_service.send_slack_alert') as mock_send:
+        result = check_and_notify_threshold(
+            user_id=1,
+            username="testuser",
+            preference_count=50,
+            base_url="http://localhost:8000",
+            background=background
+        )
+        mock_send.assert_not_called()
+    
+    assert result == True
+    assert len(background.tasks) == 1
+    assert background.tasks[0].kwargs["approval_url"] == "http://localhost:8000/training/approve/1"
+
+
 def test_slack_alert_success():
     """Slack alert sends successfully with webhook configured."""
     from services.notification_service import send_slack_alert
     
-    with patch('requests.post') as mock_post:
+    with patch('services.notification_service._session.post') as mock_post:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_post.return_value = mock_response